@@ -2,29 +2,44 @@
 Ingest docs.atlan.com and developer.atlan.com into a persistent Chroma DB.
 
 Usage:
-  python knowledge_base/ingest_chromadb.py
+  python backend/knowledge_base/atlan_info.py                # full rebuild
+  python backend/knowledge_base/atlan_info.py --incremental  # refresh changed pages only
 
 Notes:
-- Tune SEED_URLS / MAX_PAGES_PER_DOMAIN / CHUNK_SIZE_WORDS as desired.
-- Requires chromadb, sentence-transformers, requests, beautifulsoup4, tqdm, python-dotenv
+- Tune SEED_URLS / MAX_PAGES_PER_DOMAIN as desired; chunk sizing lives in chunker.py.
+- Requires chromadb, sentence-transformers, httpx, beautifulsoup4, tqdm, python-dotenv
+- Also (re)builds the BM25 index used for hybrid retrieval (sagents/bm25_index.py)
+  and the int8 vector index (sagents/quantized_index.py).
 """
 
 import os
+import sys
 import time
 import json
+import queue
+import asyncio
 import hashlib
+import itertools
+import threading
 from urllib.parse import urljoin, urlparse
-from collections import deque
 
-import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import numpy as np
 
-from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 
+from crawler import AsyncCrawler
+from embedding_engine import EmbeddingEngine, EMBEDDING_WORKERS
+from manifest import IngestManifest, content_hash
+from chunker import get_chunker
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.embedder import EMBEDDING_MODEL_NAME
+from sagents.bm25_index import build_from_collection
+from sagents.quantized_index import export_from_collection
+
 # -------- CONFIG --------
 PERSIST_DIR = os.path.join("backend/knowledge_base", "vectorstore_chroma")
 os.makedirs(PERSIST_DIR, exist_ok=True)
@@ -42,44 +57,47 @@ HEADERS = {
 
 # Crawl limits
 MAX_PAGES_PER_DOMAIN = 200         # keep small for initial run
-REQUEST_DELAY = 0.5                # seconds between requests
+REQUEST_DELAY = 0.25               # min seconds between request starts, per domain
+MAX_CONCURRENCY_PER_DOMAIN = 4     # requests in flight per domain
 
-# Chunking
-CHUNK_SIZE_WORDS = 400             # approx chunk length
-CHUNK_OVERLAP_WORDS = 80
-
-# Embedding model
-EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L12-v2"
+# Embedding model: EMBEDDING_MODEL_NAME, shared with the query side (sagents/embedder.py)
 
 # Chroma collection name
 CHROMA_COLLECTION_NAME = "atlan_docs"
 
-# ------------------------
+# Touched after every ingest; the RAG agent drops cached answers when it changes
+KB_VERSION_FILE = os.path.join(PERSIST_DIR, "kb_version.txt")
 
-def fetch_page(url):
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=12)
-        r.raise_for_status()
-        return r.text
-    except Exception as e:
-        print(f"[fetch_page] Failed {url}: {e}")
-        return None
+# Per-URL validators and content/chunk hashes for incremental ingest
+MANIFEST_FILE = os.path.join(PERSIST_DIR, "ingest_manifest.json")
+
+# Streaming pipeline: bounded queues between crawl -> chunk/embed -> upsert
+PAGE_QUEUE_SIZE = 32               # parsed pages waiting to be chunked
+EMBED_BATCH_SIZE = 64              # chunks per upsert, per embedding worker
+WRITE_QUEUE_SIZE = 4               # embedded batches waiting to be written
+CHECKPOINT_EVERY_PAGES = 25        # manifest flush interval (resume granularity)
+
+# ------------------------
 
 def extract_text(html, base_url):
     """
     Extract main textual content from a page.
     Strategy: join text from <article>, or if not present, <main>, else <p> tags.
+    Headings, list items and code blocks are kept as light markdown for the chunker.
     Also grab the page title.
     """
     soup = BeautifulSoup(html, "html.parser")
+    return _extract_from_soup(soup, base_url)
 
+def _extract_from_soup(soup, base_url):
     title_tag = soup.find("title")
     title = title_tag.get_text(strip=True) if title_tag else base_url
 
     # Prefer semantic containers
     container = soup.find("article") or soup.find("main")
     if container:
-        texts = [p.get_text(" ", strip=True) for p in container.find_all(["p","h1","h2","h3","li"])]
+        texts = [_block_text(el) for el in container.find_all(["p","h1","h2","h3","li","pre"])
+                 if not el.find_parent(["p","li","pre"])]  # nested blocks are part of their parent
     else:
         # fallback: all paragraphs
         texts = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
@@ -88,30 +106,43 @@ def extract_text(html, base_url):
     if not texts:
         texts = [soup.get_text(" ", strip=True)]
 
-    # Join and normalize whitespace
-    full_text = "\n\n".join(t for t in texts if t and len(t.strip())>20)
+    # Join and normalize whitespace; short headings and code are kept
+    full_text = "\n\n".join(t for t in texts if t and (len(t.strip())>20 or t[0] in "#`"))
     return title, full_text
 
-def chunk_text(text, size_words=CHUNK_SIZE_WORDS, overlap=CHUNK_OVERLAP_WORDS):
+def _block_text(el):
+    if el.name == "pre":
+        return "```\n" + el.get_text().strip("\n") + "\n```"
+    text = el.get_text(" ", strip=True)
+    if not text:
+        return ""
+    if el.name in ("h1", "h2", "h3"):
+        return "#" * int(el.name[1]) + " " + text
+    if el.name == "li":
+        return "- " + text
+    return text
+
+def parse_page(html, base_url):
     """
-    Simple word-based chunker with overlap.
-    Returns list of chunks (strings).
+    Parse a page once and return (title, text, absolute links).
     """
-    words = text.split()
-    if len(words) <= size_words:
-        return [text]
+    soup = BeautifulSoup(html, "html.parser")
+    title, text = _extract_from_soup(soup, base_url)
 
-    chunks = []
-    start = 0
-    while start < len(words):
-        end = start + size_words
-        chunk_words = words[start:end]
-        chunk = " ".join(chunk_words)
-        chunks.append(chunk)
-        if end >= len(words):
-            break
-        start = end - overlap
-    return chunks
+    links = []
+    for a in soup.find_all("a", href=True):
+        try:
+            links.append(urljoin(base_url, a["href"].strip()))
+        except Exception:
+            continue
+    return title, text, links
+
+def chunk_text(text, title="", model_name=EMBEDDING_MODEL_NAME):
+    """
+    Heading-aware chunks sized to the window of the embedding model `model_name` (see chunker.py).
+    Returns list of chunker.Chunk (text, section, n_tokens).
+    """
+    return get_chunker(model_name).chunk_page(title, text)
 
 def url_domain(url):
     parsed = urlparse(url)
@@ -128,119 +159,336 @@ def canonical_id(url, chunk_idx):
     key = f"{url}|||{chunk_idx}"
     return hashlib.sha1(key.encode()).hexdigest()
 
-def crawl(seed_urls, max_pages_per_domain=MAX_PAGES_PER_DOMAIN):
+def make_crawler(max_pages_per_domain=MAX_PAGES_PER_DOMAIN, allowed_domains=ALLOWED_DOMAINS, known_pages=None):
+    return AsyncCrawler(
+        allowed_domains=allowed_domains,
+        parse_page=parse_page,
+        max_pages_per_domain=max_pages_per_domain,
+        per_domain_concurrency=MAX_CONCURRENCY_PER_DOMAIN,
+        request_interval=REQUEST_DELAY,
+        headers=HEADERS,
+        known_pages=known_pages,
+    )
+
+def stream_pages(crawler, seed_urls, maxsize=PAGE_QUEUE_SIZE):
     """
-    Basic BFS crawler constrained to allowed domains.
+    Run the async crawler on a background thread and yield (url, page) as
+    pages are parsed. The bounded queue applies backpressure: the crawler
+    pauses when chunking/embedding falls behind.
+    """
+    pages = queue.Queue(maxsize=maxsize)
+    done = object()
+    errors = []
+
+    def run():
+        async def pump():
+            async for item in crawler.iter_pages(seed_urls):
+                await asyncio.to_thread(pages.put, item)
+        try:
+            asyncio.run(pump())
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            pages.put(done)
+
+    start = time.time()
+    thread = threading.Thread(target=run, name="crawler", daemon=True)
+    thread.start()
+    while True:
+        item = pages.get()
+        if item is done:
+            break
+        yield item
+    thread.join()
+    if errors:
+        raise errors[0]
+    print(f"[crawl] {crawler.stats} in {time.time() - start:.1f}s")
+
+def crawl(seed_urls, max_pages_per_domain=MAX_PAGES_PER_DOMAIN, allowed_domains=ALLOWED_DOMAINS):
+    """
+    Concurrent crawler constrained to allowed domains (see crawler.AsyncCrawler).
     Returns dict: url -> page_text
     """
-    visited = set()
-    to_visit = deque(seed_urls)
-    results = {}
-    domain_counts = {}
+    crawler = make_crawler(max_pages_per_domain, allowed_domains)
+    return dict(stream_pages(crawler, seed_urls))
+
+def get_or_create_collection(client, reset=False):
+    if reset:
+        try:
+            client.delete_collection(CHROMA_COLLECTION_NAME)
+        except Exception:
+            pass
+    try:
+        return client.get_collection(CHROMA_COLLECTION_NAME)
+    except Exception:
+        return client.create_collection(name=CHROMA_COLLECTION_NAME)
 
-    while to_visit:
-        url = to_visit.popleft()
-        if url in visited:
-            continue
-        domain = url_domain(url)
-        domain_counts.setdefault(domain, 0)
-        if domain not in ALLOWED_DOMAINS:
-            continue
-        if domain_counts[domain] >= max_pages_per_domain:
-            continue
+def chunk_ids(url, n_chunks, start=0):
+    return [canonical_id(url, idx) for idx in range(start, n_chunks)]
 
-        time.sleep(REQUEST_DELAY)
-        html = fetch_page(url)
-        visited.add(url)
-        if not html:
+def pages_to_prune(manifest, seen_urls, crawler):
+    """
+    Manifest URLs whose chunks should be deleted: pages that returned 404/410,
+    plus pages not reached by a crawl that covered their whole domain
+    (removed, unlinked or now too short). Pages that failed transiently, or
+    sit in a domain where the page cap stopped the crawl, are kept.
+    """
+    stale = []
+    for url in manifest.urls():
+        if url in seen_urls or url in crawler.failed:
             continue
+        if url in crawler.gone or not crawler.domain_exhausted(url_domain(url)):
+            stale.append(url)
+    return stale
 
-        title, text = extract_text(html, url)
-        if text and len(text.split()) > 50:
-            results[url] = {"title": title, "text": text}
-            domain_counts[domain] += 1
-            print(f"[crawl] saved {url} ({domain_counts[domain]} pages for {domain})")
-        else:
-            print(f"[crawl] skipped (short) {url}")
+class ChromaWriter:
+    """
+    Applies upserts, deletes and manifest commits in order on a background
+    thread, fed through a bounded queue. A page's manifest entry is committed
+    only after all of its chunks have been written, and the manifest is
+    flushed every CHECKPOINT_EVERY_PAGES commits, so an interrupted run can be
+    resumed with --incremental without re-embedding finished pages.
+    """
 
-        # parse links and enqueue same-domain links
-        soup = BeautifulSoup(html, "html.parser")
-        for a in soup.find_all("a", href=True):
-            href = a["href"].strip()
-            # make absolute
+    def __init__(self, collection, manifest, maxsize=WRITE_QUEUE_SIZE):
+        self.collection = collection
+        self.manifest = manifest
+        self.ops = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.stats = {"upserted": 0, "deleted": 0, "pages": 0}
+        self._since_checkpoint = 0
+        self._thread = threading.Thread(target=self._run, name="chroma-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            op = self.ops.get()
+            if op is None:
+                break
+            if self.error is not None:
+                continue  # drain after a failure so producers never block
             try:
-                full = urljoin(url, href)
-            except:
-                continue
-            parsed = urlparse(full)
-            if parsed.scheme not in ("http", "https"):
-                continue
-            if parsed.netloc in ALLOWED_DOMAINS and full not in visited:
-                to_visit.append(full)
+                kind = op[0]
+                if kind == "upsert":
+                    _, ids, documents, metadatas, embeddings = op
+                    # chromadb 0.4.x validates embeddings as lists; convert the
+                    # whole batch in one C-level call at the storage boundary
+                    self.collection.upsert(
+                        ids=ids,
+                        documents=documents,
+                        metadatas=metadatas,
+                        embeddings=embeddings.tolist(),
+                    )
+                    self.stats["upserted"] += len(ids)
+                elif kind == "delete":
+                    self.collection.delete(ids=op[1])
+                    self.stats["deleted"] += len(op[1])
+                elif kind == "commit":
+                    _, url, entry = op
+                    if entry is None:
+                        self.manifest.remove(url)
+                    else:
+                        self.manifest.set(url, entry)
+                    self.stats["pages"] += 1
+                    self._since_checkpoint += 1
+                    if self._since_checkpoint >= CHECKPOINT_EVERY_PAGES:
+                        self.manifest.save()
+                        self._since_checkpoint = 0
+            except BaseException as e:
+                self.error = e
+
+    def put(self, *op):
+        if self.error is not None:
+            raise self.error
+        self.ops.put(op)
+
+    def close(self):
+        self.ops.put(None)
+        self._thread.join()
+        self.manifest.save()
+        if self.error is not None:
+            raise self.error
+
+def ingest(pages, embedding_model_name=EMBEDDING_MODEL_NAME, persist_dir=PERSIST_DIR,
+           incremental=False, manifest=None, stale_urls=None, workers=EMBEDDING_WORKERS):
+    """
+    Streaming chunk -> embed -> upsert over an iterable of (url, page).
 
-    return results
+    Chunks are embedded EMBED_BATCH_SIZE * workers at a time as pages arrive
+    (sharded across `workers` processes by the EmbeddingEngine), and each
+    batch is handed to a ChromaWriter as a numpy array, so memory is bounded
+    by the queue sizes rather than the corpus size.
 
-def embed_and_persist(pages, embedding_model_name=EMBEDDING_MODEL_NAME, persist_dir=PERSIST_DIR):
-    # load embedding model
-    print("[embed] loading embedding model:", embedding_model_name)
-    embed_model = SentenceTransformer(embedding_model_name)
+    Full mode rebuilds the collection from scratch. Incremental mode re-embeds
+    only chunks whose hash changed, deletes chunks past a page's new length,
+    and removes every chunk of the URLs returned by `stale_urls(seen_urls)`
+    (called once the page stream is exhausted).
+    """
+    manifest = manifest or IngestManifest(MANIFEST_FILE)
 
-    # init chroma client (persistent)
-    client = chromadb.PersistentClient(path=PERSIST_DIR)
-    # create or get collection
-    try:
-        collection = client.get_collection(CHROMA_COLLECTION_NAME)
-    except Exception:
-        collection = client.create_collection(name=CHROMA_COLLECTION_NAME)
+    # Don't touch (or, in full mode, wipe) the store if the crawl produced nothing
+    pages = iter(pages)
+    first = next(pages, None)
+    if first is None:
+        print("[main] no pages fetched; exiting")
+        return
+    pages = itertools.chain([first], pages)
 
-    ids, metadatas, documents, embeddings = [], [], [], []
+    # init chroma client (persistent)
+    client = chromadb.PersistentClient(path=persist_dir)
+    collection = get_or_create_collection(client, reset=not incremental)
+    if not incremental:
+        manifest.clear()
+        manifest.save()
+
+    writer = ChromaWriter(collection, manifest)
+    engine = None
+    flush_size = EMBED_BATCH_SIZE * max(1, workers)
+
+    batch = []           # [(url, id, document, metadata)]
+    remaining = {}       # url -> chunks of that page not yet flushed
+    staged = {}          # url -> (manifest entry, ids to delete once its chunks are written)
+    seen_urls = set()
+    counts = {"pages": 0, "unchanged": 0, "chunks": 0}
+
+    def commit_page(url):
+        entry, delete_ids = staged.pop(url)
+        if delete_ids:
+            writer.put("delete", delete_ids)
+        writer.put("commit", url, entry)
+
+    def flush():
+        nonlocal engine
+        if not batch:
+            return
+        if engine is None:
+            # load embedding model (once per worker process)
+            print(f"[embed] loading embedding model: {embedding_model_name} ({workers} worker(s))")
+            engine = EmbeddingEngine(embedding_model_name, workers=workers)
+        emb = engine.encode([b[2] for b in batch])
+        writer.put("upsert", [b[1] for b in batch], [b[2] for b in batch], [b[3] for b in batch], emb)
+        counts["chunks"] += len(batch)
+        finished = []
+        for url, *_ in batch:
+            remaining[url] -= 1
+            if remaining[url] == 0:
+                finished.append(url)
+        batch.clear()
+        for url in finished:
+            del remaining[url]
+            commit_page(url)
+
+    for url, page in tqdm(pages, desc="Pages"):
+        seen_urls.add(url)
+        counts["pages"] += 1
+        known = manifest.get(url) or {}
+        if page.get("not_modified"):
+            counts["unchanged"] += 1
+            continue
 
-    for url, page in tqdm(pages.items(), desc="Pages"):
         title = page["title"]
         text = page["text"]
-        chunks = chunk_text(text)
+        entry = {
+            "etag": page.get("etag"),
+            "last_modified": page.get("last_modified"),
+            "links": page.get("links", []),
+            "title": title,
+            "content_hash": content_hash(title, text),
+        }
+        if incremental and known.get("content_hash") == entry["content_hash"]:
+            # Same content under new validators: nothing to re-embed
+            entry["chunk_hashes"] = known.get("chunk_hashes", [])
+            writer.put("commit", url, entry)
+            counts["unchanged"] += 1
+            continue
 
+        chunks = chunk_text(text, title, embedding_model_name)
+        old_hashes = known.get("chunk_hashes", []) if incremental else []
+        entry["chunk_hashes"] = [content_hash(title, chunk.section, chunk.text) for chunk in chunks]
+
+        # Page shrank: drop its trailing chunks once the new ones are in
+        staged[url] = (entry, chunk_ids(url, len(old_hashes), start=len(chunks)))
+        changed = 0
         for idx, chunk in enumerate(chunks):
-            cid = canonical_id(url, idx)
-            ids.append(cid)
-            documents.append(chunk)
-            metadatas.append({
+            if idx < len(old_hashes) and old_hashes[idx] == entry["chunk_hashes"][idx]:
+                continue
+            batch.append((url, canonical_id(url, idx), chunk.text, {
                 "source": url,
                 "title": title,
+                "section": chunk.section,
                 "chunk_idx": idx,
-                "length_words": len(chunk.split())
-            })
-
-    print(f"[embed] computing embeddings for {len(documents)} chunks...")
-    # compute in batches
-    B = 64
-    for i in tqdm(range(0, len(documents), B), desc="Embedding batches"):
-        batch_docs = documents[i:i+B]
-        emb = embed_model.encode(batch_docs, show_progress_bar=False, convert_to_numpy=True)
-        for e in emb:
-            embeddings.append(e.tolist())
-
-    print("[embed] upserting into Chroma...")
-    # Upsert (add) into collection
-        # Upsert (add) into collection
-    collection.add(
-        ids=ids,
-        documents=documents,
-        metadatas=metadatas,
-        embeddings=embeddings
-    )
-
+                "length_words": len(chunk.text.split()),
+                "length_tokens": chunk.n_tokens,
+            }))
+            changed += 1
+
+        if changed:
+            remaining[url] = changed
+            if len(batch) >= flush_size:
+                flush()
+        else:
+            commit_page(url)
+
+    flush()
+    if engine is not None:
+        engine.close()
+        print(f"[embed] engine: {engine.stats['encoded']}/{engine.stats['chunks']} chunks encoded "
+              f"(rest deduplicated) in {engine.stats['seconds']:.1f}s")
+
+    stale = stale_urls(seen_urls) if (incremental and stale_urls) else []
+    for url in stale:
+        known = manifest.get(url) or {}
+        writer.put("delete", chunk_ids(url, len(known.get("chunk_hashes", []))))
+        writer.put("commit", url, None)
+
+    writer.close()
+    print(f"[embed] {counts['pages']} pages ({counts['unchanged']} unchanged), "
+          f"{writer.stats['upserted']} chunks embedded, {writer.stats['deleted']} chunks deleted, "
+          f"{len(stale)} pages pruned")
+
+    if writer.stats["upserted"] or writer.stats["deleted"] or not incremental:
+        # Lexical index for hybrid retrieval and the int8 dense index (RAG_INDEX=int8),
+        # both rebuilt from the final collection
+        build_from_collection(collection)
+        export_from_collection(collection)
+        write_kb_version()
     print("[embed] done. Chroma persisted at:", persist_dir)
 
+def embed_and_persist(pages, embedding_model_name=EMBEDDING_MODEL_NAME, persist_dir=PERSIST_DIR,
+                      incremental=False, manifest=None, stale_urls=None, workers=EMBEDDING_WORKERS):
+    """Ingest an in-memory {url: page} dict (see ingest())."""
+    ingest(pages.items(), embedding_model_name, persist_dir, incremental, manifest, stale_urls, workers)
+
+
+def write_kb_version():
+    with open(KB_VERSION_FILE, "w", encoding="utf-8") as f:
+        f.write(f"{time.time()}\n")
+
 
 def main():
-    print("[main] starting crawl + ingest")
-    pages = crawl(SEED_URLS)
-    print(f"[main] pages fetched: {len(pages)}")
-    if not pages:
-        print("[main] no pages fetched; exiting")
-        return
-    embed_and_persist(pages)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Crawl the Atlan docs into Chroma")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-embed changed pages; uses conditional GETs and the ingest manifest. "
+                             "Also resumes an interrupted run.")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES_PER_DOMAIN,
+                        help="Max pages per domain")
+    parser.add_argument("--workers", type=int, default=EMBEDDING_WORKERS,
+                        help="Embedding worker processes (see embedding_engine.py --bench)")
+    args = parser.parse_args()
+
+    manifest = IngestManifest(MANIFEST_FILE)
+    crawler = make_crawler(args.max_pages, known_pages=manifest.pages if args.incremental else None)
+
+    print("[main] starting crawl + ingest" + (" (incremental)" if args.incremental else ""))
+    ingest(
+        stream_pages(crawler, SEED_URLS),
+        incremental=args.incremental,
+        manifest=manifest,
+        stale_urls=lambda seen: pages_to_prune(manifest, seen, crawler),
+        workers=args.workers,
+    )
 
 if __name__ == "__main__":
     main()
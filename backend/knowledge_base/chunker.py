@@ -0,0 +1,225 @@
+"""
+Structure-aware chunker for ingest.
+
+atlan_info.extract_text keeps page structure as light markdown: "#", "##",
+"###" headings, "- " list items and ``` fenced code blocks, separated by
+blank lines. The chunker:
+
+- splits a page into sections at headings and records each chunk's section
+  path ("Page title > Heading > Subheading") in its metadata, and starts the
+  chunk text with that path so the embedding and BM25 both see the headings
+- packs whole blocks into chunks by counting tokens with the embedding
+  model's own tokenizer, so every chunk fits the model window exactly
+  (nothing is silently truncated at encode time)
+- splits an oversized block at sentence boundaries (prose) or line
+  boundaries (code), and only as a last resort at token boundaries
+- repeats up to CHUNK_OVERLAP_TOKENS of trailing sentences at the start of
+  the next chunk in the same section
+"""
+
+import os
+import re
+import sys
+import json
+import threading
+from dataclasses import dataclass
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.embedder import EMBEDDING_MODEL_NAME
+
+# Model window in tokens, including [CLS]/[SEP]; read from the model config when cached
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 0)) or None
+DEFAULT_MAX_TOKENS = 128
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 16))
+SPECIAL_TOKENS = 2
+HEADER_MAX_FRACTION = 4   # a section header may take up to 1/4 of the chunk budget
+
+HEADING_RE = re.compile(r"^(#{1,3}) (.+)$")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+
+
+@dataclass
+class Chunk:
+    text: str
+    section: str
+    n_tokens: int
+
+
+class TokenCounter:
+    """Counts tokens with the model's tokenizer; falls back to ~4 chars/token without transformers."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+        try:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        except Exception as e:
+            print(f"[chunker] tokenizer unavailable ({e}); estimating tokens from characters")
+            self.tokenizer = None
+
+    def count(self, texts: list) -> list:
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [len(t) // 4 + 1 for t in texts]
+        encoded = self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def split(self, text: str, max_tokens: int) -> list:
+        """Cut `text` into pieces of at most `max_tokens` tokens, at token boundaries."""
+        if self.tokenizer is None:
+            step = max_tokens * 4
+            return [text[i:i + step] for i in range(0, len(text), step)]
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        pieces = []
+        for start in range(0, len(offsets), max_tokens):
+            window = offsets[start:start + max_tokens]
+            end = offsets[start + max_tokens][0] if start + max_tokens < len(offsets) else len(text)
+            pieces.append(text[window[0][0]:end].strip())
+        return [p for p in pieces if p]
+
+
+def model_max_tokens(model_name=EMBEDDING_MODEL_NAME) -> int:
+    """The sentence-transformers max_seq_length of `model_name` (CHUNK_MAX_TOKENS overrides)."""
+    if CHUNK_MAX_TOKENS:
+        return CHUNK_MAX_TOKENS
+    try:
+        from huggingface_hub import hf_hub_download
+        path = hf_hub_download(model_name, "sentence_bert_config.json")
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f)["max_seq_length"])
+    except Exception:
+        return DEFAULT_MAX_TOKENS
+
+
+def parse_blocks(text: str) -> list:
+    """Split extracted text into blocks, keeping fenced code blocks whole."""
+    blocks, fence = [], None
+    for part in text.split("\n\n"):
+        if fence is not None:
+            fence.append(part)
+            if part.rstrip().endswith("```"):
+                blocks.append("\n\n".join(fence))
+                fence = None
+        elif part.startswith("```") and not (len(part) > 3 and part.rstrip().endswith("```")):
+            fence = [part]
+        elif part.strip():
+            blocks.append(part)
+    if fence is not None:
+        blocks.append("\n\n".join(fence))
+    return blocks
+
+
+def sections(title: str, text: str):
+    """Yield (section_path, blocks) per heading-delimited section."""
+    path, blocks = [], []
+    for block in parse_blocks(text):
+        m = HEADING_RE.match(block)
+        if not m:
+            blocks.append(block)
+            continue
+        if blocks:
+            yield _section_name(title, path), blocks
+            blocks = []
+        level = len(m.group(1))
+        path = path[:level - 1] + [""] * (level - 1 - len(path)) + [m.group(2).strip()]
+    if blocks:
+        yield _section_name(title, path), blocks
+
+
+def _section_name(title, path):
+    parts = [p for p in path if p]
+    if parts and title and parts[0] == title:
+        parts = parts[1:]  # the page h1 usually repeats the title
+    return " > ".join(([title] if title else []) + parts)
+
+
+def _units(block: str, counter: TokenCounter, budget: int) -> list:
+    """Split a block into units that fit `budget`: the block itself, sentences, lines, then token windows."""
+    if counter.count([block])[0] <= budget:
+        return [block]
+    if block.startswith("```"):
+        parts = block.split("\n")
+    else:
+        parts = SENTENCE_RE.split(block)
+    units = []
+    for part, n in zip(parts, counter.count(parts)):
+        if not part.strip():
+            continue
+        units.extend([part] if n <= budget else counter.split(part, budget))
+    return units
+
+
+class Chunker:
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, max_tokens=None, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        self.counter = TokenCounter(model_name)
+        self.max_tokens = max_tokens or model_max_tokens(model_name)
+        self.budget = self.max_tokens - SPECIAL_TOKENS
+        self.overlap_tokens = overlap_tokens
+
+    def chunk_page(self, title: str, text: str) -> list:
+        chunks = []
+        for section, blocks in sections(title, text):
+            chunks.extend(self._pack(section, blocks))
+        return chunks
+
+    def _header(self, section):
+        """(header line, tokens) put at the start of every chunk of `section`."""
+        limit = self.budget // HEADER_MAX_FRACTION
+        header = section
+        n = self.counter.count([header])[0] if header else 0
+        if n > limit:
+            # long paths keep only the nearest heading
+            header = section.rsplit(" > ", 1)[-1]
+            n = self.counter.count([header])[0]
+        if n > limit:
+            header = self.counter.split(header, limit)[0]
+            n = self.counter.count([header])[0]
+        return header, n
+
+    def _pack(self, section, blocks):
+        header, header_tokens = self._header(section)
+        budget = self.budget - header_tokens
+        units = [u for block in blocks for u in _units(block, self.counter, budget)]
+        sizes = self.counter.count(units)
+
+        def chunk(current, used):
+            # joining with "\n" adds no tokens for a WordPiece tokenizer
+            text = "\n".join([header] * bool(header) + [u for u, _ in current])
+            return Chunk(text, section, header_tokens + used)
+
+        chunks, current, used = [], [], 0
+        for unit, n in zip(units, sizes):
+            if current and used + n > budget:
+                chunks.append(chunk(current, used))
+                # carry trailing units into the next chunk, within the overlap budget
+                carried, carried_tokens = [], 0
+                for u, m in reversed(current):
+                    if carried_tokens + m > self.overlap_tokens or carried_tokens + m + n > budget:
+                        break
+                    carried.insert(0, (u, m))
+                    carried_tokens += m
+                current, used = carried, carried_tokens
+            current.append((unit, n))
+            used += n
+        if current:
+            chunks.append(chunk(current, used))
+        return chunks
+
+
+_chunkers = {}  # model name -> Chunker
+_chunker_lock = threading.Lock()
+
+
+def get_chunker(model_name=EMBEDDING_MODEL_NAME) -> Chunker:
+    """Shared chunker sized for `model_name`, the model the chunks will be embedded with."""
+    chunker = _chunkers.get(model_name)
+    if chunker is None:
+        with _chunker_lock:
+            chunker = _chunkers.get(model_name)
+            if chunker is None:
+                chunker = _chunkers[model_name] = Chunker(model_name)
+                print(f"[chunker] {model_name}: {chunker.max_tokens}-token chunks "
+                      f"({'tokenizer' if chunker.counter.tokenizer else 'estimated'}), "
+                      f"{chunker.overlap_tokens}-token overlap")
+    return chunker
@@ -0,0 +1,263 @@
+"""
+Asyncio crawler used by atlan_info.py.
+
+- one pooled httpx.AsyncClient (keep-alive) for every request
+- per-domain concurrency cap and minimum interval between request starts
+- deduplicated frontier: a URL (fragment stripped) is queued at most once
+- each page is parsed once, by the `parse_page(html, url) -> (title, text, links)`
+  callable supplied by the caller
+- conditional GETs: with `known_pages` ({url: {"etag", "last_modified", "links"}})
+  unchanged pages come back 304 and are yielded as {"not_modified": True};
+  their stored links keep the crawl going
+- robots.txt is fetched once per domain before crawling it: disallowed URLs
+  are never queued, and a Crawl-delay longer than `request_interval` wins
+
+Domains are compared on `netloc`, so a local fixture server such as
+"127.0.0.1:8001" can be crawled by listing it in `allowed_domains`.
+"""
+
+import asyncio
+from urllib.parse import urldefrag, urlparse
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+
+class DomainLimiter:
+    """Limits in-flight requests and request start rate for one domain."""
+
+    def __init__(self, max_concurrency: int, min_interval: float):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.min_interval = min_interval
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            start = max(now, self._next_start)
+            self._next_start = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used for de-duplication (no fragment)."""
+    return urldefrag(url)[0]
+
+
+class AsyncCrawler:
+    def __init__(
+        self,
+        allowed_domains,
+        parse_page,
+        max_pages_per_domain: int = 200,
+        per_domain_concurrency: int = 4,
+        request_interval: float = 0.25,
+        headers: dict = None,
+        timeout: float = 12.0,
+        min_words: int = 50,
+        output_buffer: int = 64,
+        known_pages: dict = None,
+        respect_robots: bool = True,
+    ):
+        self.allowed_domains = set(allowed_domains)
+        self.parse_page = parse_page
+        self.max_pages_per_domain = max_pages_per_domain
+        self.per_domain_concurrency = per_domain_concurrency
+        self.request_interval = request_interval
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.min_words = min_words
+        self.output_buffer = output_buffer
+        self.known_pages = known_pages or {}
+        self.respect_robots = respect_robots
+        self.robots = {}  # domain -> RobotFileParser
+
+        self.seen = set()
+        self.gone = set()    # 404/410: the page was removed
+        self.failed = set()  # transient errors: state unknown, keep what we have
+        self.domain_counts = {d: 0 for d in self.allowed_domains}
+        self.stats = {"fetched": 0, "not_modified": 0, "saved": 0, "skipped": 0, "failed": 0, "disallowed": 0}
+
+    def domain_exhausted(self, domain: str) -> bool:
+        """True if the crawl stopped at the page cap, i.e. it may not have seen every page."""
+        return self._domain_full(domain)
+
+    def _domain_full(self, domain: str) -> bool:
+        return self.domain_counts.get(domain, 0) >= self.max_pages_per_domain
+
+    def _enqueue(self, frontier: asyncio.Queue, url: str):
+        url = normalize_url(url)
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            return
+        if parsed.netloc not in self.allowed_domains or self._domain_full(parsed.netloc):
+            return
+        if url in self.seen:
+            return
+        self.seen.add(url)
+        robots = self.robots.get(parsed.netloc)
+        if robots is not None and not robots.can_fetch(self.headers.get("User-Agent", "*"), url):
+            self.stats["disallowed"] += 1
+            return
+        frontier.put_nowait(url)
+
+    def _conditional_headers(self, url: str) -> dict:
+        known = self.known_pages.get(url) or {}
+        headers = {}
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+        return headers
+
+    async def _load_robots(self, client: httpx.AsyncClient, domain: str, scheme: str) -> RobotFileParser:
+        """Parsed robots.txt for `domain`. As in urllib.robotparser, 401/403 disallow everything, other errors nothing."""
+        robots = RobotFileParser(f"{scheme}://{domain}/robots.txt")
+        try:
+            r = await client.get(robots.url)
+            if r.status_code in (401, 403):
+                robots.disallow_all = True
+            elif r.status_code < 400:
+                robots.parse(r.text.splitlines())
+            else:
+                robots.allow_all = True
+        except Exception as e:
+            print(f"[crawl] robots.txt unavailable for {domain}: {e}")
+            robots.allow_all = True
+        return robots
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str):
+        """Returns the response, or None if the page is gone/failed/not HTML."""
+        try:
+            r = await client.get(url, headers=self._conditional_headers(url))
+            if r.status_code == 304:
+                return r
+            if r.status_code in (404, 410):
+                self.gone.add(url)
+                return None
+            r.raise_for_status()
+            if "html" not in r.headers.get("content-type", "text/html"):
+                return None
+            return r
+        except Exception as e:
+            print(f"[crawl] failed {url}: {e}")
+            self.failed.add(url)
+            self.stats["failed"] += 1
+            return None
+
+    async def _worker(self, client, limiters, frontier, output):
+        while True:
+            url = await frontier.get()
+            try:
+                domain = urlparse(url).netloc
+                if self._domain_full(domain):
+                    continue
+                async with limiters[domain]:
+                    r = await self._fetch(client, url)
+                if r is None:
+                    continue
+
+                if r.status_code == 304:
+                    self.stats["not_modified"] += 1
+                    if not self._domain_full(domain):
+                        self.domain_counts[domain] += 1
+                        await output.put((url, {"not_modified": True}))
+                    for link in self.known_pages.get(url, {}).get("links", []):
+                        self._enqueue(frontier, link)
+                    continue
+
+                self.stats["fetched"] += 1
+
+                # BeautifulSoup is CPU-bound; keep the event loop free for I/O
+                title, text, links = await asyncio.to_thread(self.parse_page, r.text, str(r.url))
+                links = [normalize_url(l) for l in links if urlparse(l).netloc in self.allowed_domains]
+
+                if text and len(text.split()) > self.min_words and not self._domain_full(domain):
+                    self.domain_counts[domain] += 1
+                    self.stats["saved"] += 1
+                    print(f"[crawl] saved {url} ({self.domain_counts[domain]} pages for {domain})")
+                    await output.put((url, {
+                        "title": title,
+                        "text": text,
+                        "etag": r.headers.get("etag"),
+                        "last_modified": r.headers.get("last-modified"),
+                        "links": list(dict.fromkeys(links)),
+                    }))
+                else:
+                    self.stats["skipped"] += 1
+
+                for link in links:
+                    self._enqueue(frontier, link)
+            except Exception as e:
+                print(f"[crawl] error on {url}: {e}")
+                self.failed.add(url)
+                self.stats["failed"] += 1
+            finally:
+                frontier.task_done()
+
+    async def iter_pages(self, seed_urls):
+        """
+        Async generator of (url, page) as pages are saved, where page is
+        {"title", "text", "etag", "last_modified", "links"} or {"not_modified": True}.
+        """
+        frontier = asyncio.Queue()
+        output = asyncio.Queue(maxsize=self.output_buffer)
+        done = object()
+
+        limits = httpx.Limits(
+            max_connections=self.per_domain_concurrency * len(self.allowed_domains),
+            max_keepalive_connections=self.per_domain_concurrency * len(self.allowed_domains),
+        )
+
+        async with httpx.AsyncClient(
+            headers=self.headers, timeout=self.timeout, limits=limits, follow_redirects=True
+        ) as client:
+            intervals = {d: self.request_interval for d in self.allowed_domains}
+            if self.respect_robots:
+                schemes = {urlparse(u).netloc: urlparse(u).scheme for u in reversed(seed_urls)}
+                for d in self.allowed_domains:
+                    self.robots[d] = await self._load_robots(client, d, schemes.get(d, "https"))
+                    delay = self.robots[d].crawl_delay(self.headers.get("User-Agent", "*"))
+                    intervals[d] = max(self.request_interval, float(delay or 0))
+            limiters = {d: DomainLimiter(self.per_domain_concurrency, intervals[d]) for d in self.allowed_domains}
+
+            for url in seed_urls:
+                self._enqueue(frontier, url)
+
+            n_workers = self.per_domain_concurrency * len(self.allowed_domains)
+            workers = [
+                asyncio.create_task(self._worker(client, limiters, frontier, output))
+                for _ in range(n_workers)
+            ]
+
+            async def finish():
+                await frontier.join()
+                await output.put(done)
+
+            finisher = asyncio.create_task(finish())
+            try:
+                while True:
+                    item = await output.get()
+                    if item is done:
+                        break
+                    yield item
+            finally:
+                finisher.cancel()
+                for w in workers:
+                    w.cancel()
+                await asyncio.gather(finisher, *workers, return_exceptions=True)
+
+    async def crawl(self, seed_urls) -> dict:
+        """Crawl to completion; returns {url: page} (see iter_pages)."""
+        results = {}
+        async for url, page in self.iter_pages(seed_urls):
+            results[url] = page
+        return results
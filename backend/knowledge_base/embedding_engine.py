@@ -0,0 +1,197 @@
+"""
+Multi-process embedding engine for ingest.
+
+- shards chunks across a process pool; every worker holds its own model and
+  uses cpu_count // workers torch threads
+- sorts chunks by length so each batch pads to similar lengths
+- sizes batches adaptively: about TOKENS_PER_BATCH padded tokens per batch,
+  and never fewer batches than workers
+- optionally embeds identical chunks only once
+
+Benchmark (chunks/sec per worker count):
+  python backend/knowledge_base/embedding_engine.py --bench --workers 1 2 4
+"""
+
+import os
+import sys
+import math
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.embedder import EMBEDDING_MODEL_NAME
+
+# Worker processes for ingest embedding (1 = encode in-process)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", 1))
+
+TOKENS_PER_BATCH = 16384           # padded tokens per encode() call
+MAX_SEQ_TOKENS = 256               # longer inputs are truncated by the model anyway
+MIN_BATCH_SIZE = 4
+MAX_BATCH_SIZE = 256
+
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_batch(texts):
+    return _worker_model.encode(
+        texts, batch_size=len(texts), show_progress_bar=False, convert_to_numpy=True
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars/token), capped at the model window."""
+    return min(MAX_SEQ_TOKENS, len(text) // 4 + 2)
+
+
+class EmbeddingEngine:
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, workers=EMBEDDING_WORKERS,
+                 tokens_per_batch=TOKENS_PER_BATCH, dedupe=True):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.tokens_per_batch = tokens_per_batch
+        self.dedupe = dedupe
+        self.stats = {"chunks": 0, "encoded": 0, "batches": 0, "seconds": 0.0}
+
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        if self.workers > 1:
+            # spawn: forked torch/tokenizer state is not safe to reuse
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model_name, threads),
+            )
+        else:
+            self._pool = None
+            _init_worker(model_name, threads)
+
+    def _make_batches(self, texts, order):
+        """Split length-sorted indices into batches of ~tokens_per_batch padded tokens."""
+        max_batch = MAX_BATCH_SIZE
+        if self.workers > 1:
+            # keep every worker busy even for small inputs
+            max_batch = max(MIN_BATCH_SIZE, min(max_batch, math.ceil(len(order) / self.workers)))
+
+        batches, current, longest = [], [], 0
+        for i in order:
+            n = estimate_tokens(texts[i])
+            # padded cost of the batch if this text joins it
+            if current and (max(longest, n) * (len(current) + 1) > self.tokens_per_batch
+                            or len(current) >= max_batch):
+                batches.append(current)
+                current, longest = [], 0
+            current.append(i)
+            longest = max(longest, n)
+        if current:
+            batches.append(current)
+        return batches
+
+    def encode(self, texts) -> np.ndarray:
+        """Embed texts; returns a float32 array aligned with the input order."""
+        start = time.perf_counter()
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        if self.dedupe:
+            unique = list(dict.fromkeys(texts))
+            position = {t: i for i, t in enumerate(unique)}
+            inverse = np.fromiter((position[t] for t in texts), dtype=np.int64, count=len(texts))
+        else:
+            unique, inverse = texts, None
+
+        order = sorted(range(len(unique)), key=lambda i: len(unique[i]))
+        batches = self._make_batches(unique, order)
+        payloads = [[unique[i] for i in batch] for batch in batches]
+
+        if self._pool is not None:
+            results = list(self._pool.map(_encode_batch, payloads))
+        else:
+            results = [_encode_batch(p) for p in payloads]
+
+        out = np.empty((len(unique), results[0].shape[1]), dtype=np.float32)
+        for batch, emb in zip(batches, results):
+            out[batch] = emb
+
+        self.stats["chunks"] += len(texts)
+        self.stats["encoded"] += len(unique)
+        self.stats["batches"] += len(batches)
+        self.stats["seconds"] += time.perf_counter() - start
+        return out[inverse] if inverse is not None else out
+
+    def warm_up(self):
+        """Make sure every worker has loaded its model (for fair benchmarks)."""
+        if self._pool is not None:
+            list(self._pool.map(_encode_batch, [["warm up"]] * (self.workers * 2)))
+        else:
+            _encode_batch(["warm up"])
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def synthetic_chunks(n, seed=0):
+    """Chunks of varied length for benchmarking when no corpus is given."""
+    rng = np.random.default_rng(seed)
+    vocab = ("atlan lineage connector snowflake glossary asset metadata policy "
+             "tableau dbt fivetran column table workflow api sdk sso persona").split()
+    return [" ".join(rng.choice(vocab, size=int(rng.integers(20, 400)))) for _ in range(n)]
+
+
+def bench(texts, worker_counts, model_name=EMBEDDING_MODEL_NAME, dedupe=True):
+    print(f"[bench] {len(texts)} chunks, {os.cpu_count()} CPUs, model {model_name}")
+    report = []
+    for workers in worker_counts:
+        engine = EmbeddingEngine(model_name, workers=workers, dedupe=dedupe)
+        try:
+            engine.warm_up()
+            start = time.perf_counter()
+            engine.encode(texts)
+            elapsed = time.perf_counter() - start
+        finally:
+            engine.close()
+        rate = len(texts) / elapsed
+        report.append({"workers": workers, "seconds": round(elapsed, 2), "chunks_per_sec": round(rate, 1)})
+        print(f"[bench] workers={workers:<3} {elapsed:8.2f}s  {rate:8.1f} chunks/s")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Embedding engine benchmark")
+    parser.add_argument("--bench", action="store_true", help="Run the throughput benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunks", type=int, default=2000, help="Synthetic chunk count")
+    parser.add_argument("--texts-file", type=str, help="JSON list of chunk strings to embed instead")
+    parser.add_argument("--no-dedupe", action="store_true")
+    parser.add_argument("--output", type=str, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.bench:
+        if args.texts_file:
+            with open(args.texts_file, "r", encoding="utf-8") as f:
+                texts = json.load(f)
+        else:
+            texts = synthetic_chunks(args.chunks)
+        report = bench(texts, args.workers, dedupe=not args.no_dedupe)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+    else:
+        parser.print_help()
@@ -0,0 +1,55 @@
+"""
+Per-URL ingest state used by incremental runs of atlan_info.py.
+
+For every ingested page the manifest keeps the HTTP validators (ETag /
+Last-Modified) for conditional GETs, a hash of the page content, one hash per
+chunk (so only changed chunks are re-embedded) and the page's outgoing links
+(so a 304 response can still extend the crawl frontier).
+"""
+
+import hashlib
+import json
+import os
+
+
+def content_hash(*parts) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class IngestManifest:
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.pages = data.get("pages", {})
+
+    def get(self, url: str) -> dict:
+        return self.pages.get(url)
+
+    def set(self, url: str, entry: dict):
+        self.pages[url] = entry
+
+    def remove(self, url: str):
+        self.pages.pop(url, None)
+
+    def urls(self):
+        return list(self.pages)
+
+    def clear(self):
+        self.pages = {}
+
+    def save(self):
+        """Atomic write, so an interrupted run never leaves a truncated manifest."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "pages": self.pages}, f)
+        os.replace(tmp, self.path)
@@ -1,9 +1,13 @@
 import os,sys
+import time
 import logging
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
+from starlette.responses import StreamingResponse
 from pathlib import Path
 from dotenv import load_dotenv
 
+_server_start = time.perf_counter()
+
 # Load env variables
 load_dotenv()
 import sys
@@ -21,11 +25,20 @@ else:
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-from sagents.classification_agent import classify_ticket
-from sagents.rag_qna_agent import generate_answer
+from sagents.classification_agent import classify_ticket, classify_batch, CLASSIFY_BATCH_SIZE, classification_cache
+from sagents.rag_qna_agent import generate_answer, generate_answers_batch, RAG_BATCH_CONCURRENCY, warm_up as warm_up_rag
+from sagents import rag_qna_agent
+from sagents import embedder
+from sagents import reranker
+from sagents import fast_classifier
+from sagents.llm_client import get_llm_client
 from sagents.routing_agent import route_ticket
-from sagents.STT import transcribe_audio
+from sagents.orchestrator import process_ticket, speculation_stats
+from sagents.STT import transcribe_audio, transcribe_many, stream_transcript, audio_content_type, STT_WORKERS
+from sagents.audio_spool import AudioSpool
 from sagents.live_converse import TicketExtractionAgent
+from sagents.session_store import create_session_store
+from sagents import metrics
 
 # Import SupportMCPClient from common
 from common.mcp_client import SupportMCPClient
@@ -35,69 +48,335 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-mcp = FastMCP(name="customer_support_server")
+# Load the embedding model and open Chroma in the background so startup isn't blocked
+RAG_PREWARM = os.getenv("RAG_PREWARM", "1") == "1"
+
+class TracedFastMCP(FastMCP):
+    """FastMCP that runs every tool call in a metrics trace; clients may set the id via _meta.trace_id."""
+
+    async def call_tool(self, name, arguments):
+        try:
+            meta = self._mcp_server.request_context.meta
+        except LookupError:
+            meta = None
+        with metrics.trace(f"tool:{name}", getattr(meta, "trace_id", None)):
+            return await super().call_tool(name, arguments)
+
+
+mcp = TracedFastMCP(name="customer_support_server")
+startup_metrics = {}
+
+
+def _warm_rag():
+    start = time.perf_counter()
+    warm_up_rag()
+    startup_metrics["rag_warm_seconds"] = round(time.perf_counter() - start, 3)
+
+
+def _token_forwarder(ctx: Context):
+    """
+    on_token callback that sends each token to the client as a progress
+    notification (message=token). Clients that didn't ask for progress
+    simply get the final result.
+    """
+    sent = 0
+
+    async def on_token(delta):
+        nonlocal sent
+        sent += 1
+        await ctx.report_progress(sent, None, delta)
+
+    return on_token
+
 
 @mcp.tool()
-async def classification_tool(ticket_text: str) -> dict:
-    """Classify a support ticket into a topic (How-to, Product, API, etc.)."""
+async def classification_tool(ticket_text: str, use_cache: bool = True, use_fast: bool = True) -> dict:
+    """Classify a support ticket into a topic (How-to, Product, API, etc.); use_fast=False always asks the LLM."""
     ticket = {
         "id": "TICKET-001",
         "subject": ticket_text,
         "body": ticket_text
     }
-    result = await asyncio.to_thread(classify_ticket, ticket)
+    result = await classify_ticket(ticket, use_cache, use_fast)
     return result
 
 
 @mcp.tool()
-async def rag_tool(ticket_id: str, topic: str, query: str) -> dict:
-    """Retrieve knowledge base info and generate an answer with RAG."""
-    result = await asyncio.to_thread(generate_answer, ticket_id, topic, query)
+async def classify_batch_tool(tickets: list[dict], batch_size: int = CLASSIFY_BATCH_SIZE, use_cache: bool = True,
+                              use_fast: bool = True) -> dict:
+    """
+    Classify many tickets at once. Each ticket is {"id", "subject", "body"};
+    confident tickets are answered by the embedding fast path, the rest are
+    packed several per LLM request.
+    Returns {"results": [{"id", "category"}, ...]} in input order.
+    """
+    results = await classify_batch(tickets, batch_size, use_cache, use_fast)
+    return {"results": results}
+
+
+@mcp.tool()
+async def cache_stats_tool() -> dict:
+    """Hit/miss statistics for the server-side caches."""
+    return {
+        "classification": classification_cache.stats(),
+        "rag": rag_qna_agent.cache_stats(),
+        "speculative_retrieval": speculation_stats,
+        "fast_classifier": fast_classifier.stats(),
+    }
+
+
+@mcp.tool()
+async def invalidate_rag_cache_tool() -> dict:
+    """Drop cached RAG answers, e.g. right after re-ingesting the knowledge base."""
+    rag_qna_agent.invalidate_answer_cache()
+    return {"status": "ok"}
+
+
+@metrics.register_collector
+def _collect_stats():
+    """Counters kept by the agents themselves, exported on every /metrics scrape."""
+    caches = {
+        "classification": classification_cache.memory.stats(),
+        "query_embedding": rag_qna_agent.query_embedding_cache.stats(),
+        "rag_answer": rag_qna_agent.answer_cache.stats(),
+    }
+    if classification_cache.disk is not None:
+        caches["classification_disk"] = classification_cache.disk.stats()
+    values = []
+    for cache, stats in caches.items():
+        values += [("cache_hits_total", {"cache": cache}, stats["hits"]),
+                   ("cache_misses_total", {"cache": cache}, stats["misses"]),
+                   ("cache_hit_rate", {"cache": cache}, stats["hit_rate"])]
+    llm = get_llm_client().stats
+    values += [(f"llm_{k}_total", {}, llm[k]) for k in ("requests", "retries", "failures")]
+    values.append(("llm_in_flight", {}, llm["in_flight"]))
+    values += [("speculative_retrieval_total", {"outcome": k}, v) for k, v in speculation_stats.items()]
+    values += [("fast_classify_total", {"path": k}, fast_classifier.fast_classify_stats[k]) for k in ("fast", "llm")]
+    values += [("rerank_calls_total", {}, reranker.rerank_stats["calls"]),
+               ("rerank_fallbacks_total", {}, reranker.rerank_stats["fallbacks"])]
+    values.append(("embedder_loaded", {}, int(embedder.is_loaded())))
+    return values
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    """Prometheus text exposition: per-stage latency histograms, request/token counters, cache hit rates."""
+    from starlette.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request):
+    """Startup timings and whether the RAG stack is warm."""
+    from starlette.responses import JSONResponse
+    return JSONResponse({
+        "status": "ok",
+        "startup": startup_metrics,
+        "embedder": embedder.load_metrics,
+        "embedder_loaded": embedder.is_loaded(),
+        "llm": get_llm_client().stats,
+        "rerank": reranker.stats(),
+        "sessions": session_store.stats(),
+    })
+
+
+@mcp.tool()
+async def rag_tool(ticket_id: str, topic: str, query: str, use_cache: bool = True,
+                   stream: bool = False, dense_weight: float = None, bm25_weight: float = None,
+                   ctx: Context = None) -> dict:
+    """
+    Retrieve knowledge base info and generate an answer with RAG.
+    With stream=True, answer tokens are sent as progress notifications first.
+    dense_weight / bm25_weight override the hybrid retrieval fusion weights (0 disables a retriever).
+    """
+    on_token = _token_forwarder(ctx) if stream and ctx is not None else None
+    weights = {k: w for k, w in (("dense", dense_weight), ("bm25", bm25_weight)) if w is not None}
+    result = await generate_answer(ticket_id, topic, query, use_cache=use_cache, on_token=on_token,
+                                   weights=weights)
     return result
 
 
+@mcp.tool()
+async def rag_batch_tool(tickets: list[dict], top_k: int = 5, use_cache: bool = True, generate: bool = True,
+                         concurrency: int = RAG_BATCH_CONCURRENCY) -> dict:
+    """
+    RAG for many tickets at once. Each ticket is {"ticket_id", "topic", "query"};
+    all queries share one embedding pass and one vector search, then up to
+    `concurrency` answers are generated in parallel. With generate=False only the
+    retrieved context is returned per ticket.
+    Returns {"results": [...]} in input order.
+    """
+    results = await generate_answers_batch(tickets, top_k, use_cache, generate, concurrency)
+    return {"results": results}
+
+
+@mcp.tool()
+async def process_ticket_tool(ticket_id: str, ticket_text: str, use_cache: bool = True,
+                              stream: bool = False, ctx: Context = None) -> dict:
+    """
+    Classify a ticket, then answer it with RAG or route it, in one call.
+    Retrieval starts while classification runs and is dropped if the ticket routes away.
+    With stream=True, RAG answer tokens are sent as progress notifications first.
+    Returns {"ticket_id", "classification", "final_response"}.
+    """
+    on_token = _token_forwarder(ctx) if stream and ctx is not None else None
+    return await process_ticket(ticket_id, ticket_text, use_cache=use_cache, on_token=on_token)
+
+
 @mcp.tool()
 async def routing_tool(ticket_id: str, topic: str) -> dict:
     """Route tickets outside RAG scope (e.g., Connector, Sensitive Data)."""
-    result = await asyncio.to_thread(route_ticket, ticket_id, topic)
+    result = route_ticket(ticket_id, topic)
     return result
 
 @mcp.tool()
-async def stt_tool(audio_path: str) -> str:
-    """Transcribe an audio file into text using Whisper."""
-    result = await asyncio.to_thread(transcribe_audio, audio_path)
+async def stt_tool(audio_path: str, stream: bool = False, ctx: Context = None) -> str:
+    """
+    Transcribe an audio file into text using Whisper (STT_BACKEND=hf|local).
+    With stream=True, partial transcript segments are sent as progress notifications first.
+    """
+    on_segment = None
+    if stream and ctx is not None:
+        forward = _token_forwarder(ctx)
+
+        async def on_segment(segment):
+            await forward(segment["text"] + " ")
+
+    result = await transcribe_audio(audio_path, on_segment=on_segment)
     return result
 
+
+STT_MAX_UPLOAD_BYTES = int(os.getenv("STT_MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that doesn't read `receive` while it streams.
+    Starlette's version listens for http.disconnect on ASGI < 2.4, which
+    would swallow the request body the handler is still reading.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@mcp.custom_route("/stt/upload", methods=["POST"])
+async def stt_upload(request):
+    """
+    Streamed audio upload, for clients that don't share a filesystem with
+    the backend. Send the raw audio as the body (chunked is fine) with an
+    audio Content-Type or ?filename=<name.ext>. Transcription reads the
+    upload while it is still arriving, and segments are sent back as soon as
+    they are transcribed, before the upload has finished. Responds with
+    NDJSON: one {"start", "end", "text"} line per segment, then
+    {"done": true, "text"} (or {"done": true, "error"}).
+    """
+    from starlette.responses import JSONResponse
+
+    if int(request.headers.get("content-length") or 0) > STT_MAX_UPLOAD_BYTES:
+        return JSONResponse({"error": f"upload larger than {STT_MAX_UPLOAD_BYTES} bytes"}, status_code=413)
+
+    filename = request.query_params.get("filename", "upload")
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if not content_type.startswith("audio/"):
+        content_type = audio_content_type(filename)
+    spool = AudioSpool(content_type=content_type, name=filename)
+
+    segments = asyncio.Queue()
+
+    async def receive_upload():
+        try:
+            async for chunk in request.stream():
+                if spool.size + len(chunk) > STT_MAX_UPLOAD_BYTES:
+                    raise ValueError(f"upload larger than {STT_MAX_UPLOAD_BYTES} bytes")
+                spool.write(chunk)
+            spool.finish()
+        except Exception as e:
+            # too large or the client went away: the transcription reading this upload fails with it
+            spool.abort(e)
+
+    async def transcribe():
+        try:
+            async for segment in stream_transcript(spool):
+                segments.put_nowait(segment)
+            segments.put_nowait(None)
+        except Exception as e:
+            segments.put_nowait(e)
+
+    async def body():
+        # producer (the upload) and consumer (transcription) both run while segments are sent
+        upload = asyncio.create_task(receive_upload())
+        task = asyncio.create_task(transcribe())
+        parts = []
+        try:
+            while (segment := await segments.get()) is not None:
+                if isinstance(segment, Exception):
+                    yield json.dumps({"done": True, "error": f"{type(segment).__name__}: {segment}"}) + "\n"
+                    return
+                parts.append(segment["text"])
+                yield json.dumps(segment) + "\n"
+            yield json.dumps({"done": True, "text": " ".join(p for p in parts if p)}) + "\n"
+        finally:
+            if not task.done():  # client disconnected mid-response
+                spool.abort(ConnectionError("client disconnected"))
+                task.cancel()
+            upload.cancel()
+            # the transcription's worker thread may still be reading the spool; let it stop first
+            await asyncio.gather(task, upload, return_exceptions=True)
+            spool.close()
+
+    return UploadStreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@mcp.tool()
+async def stt_batch_tool(audio_paths: list[str], concurrency: int = STT_WORKERS) -> list:
+    """Transcribe several audio files in parallel; returns [{"audio_path", "text" | "error"}]."""
+    return await transcribe_many(audio_paths, concurrency=concurrency)
+
 # -------------------------------
 # New Live QnA tool (single)
 # -------------------------------
-ticket_agents = {}  # track per-session agents
+# Per-session agent state: idle TTL, LRU cap, history cap (SESSION_* env vars)
+session_store = create_session_store()
 
 @mcp.tool()
-async def live_qna_tool(session_id: str, user_input: str) -> dict:
+async def live_qna_tool(session_id: str, user_input: str, stream: bool = False, ctx: Context = None) -> dict:
     """
     Converse with the Live QnA agent to gather ticket details.
     - If user_input is a description, returns assistant reply.
     - If user_input is 'done'/'exit'/'quit', returns ticket JSON.
+    - With stream=True, reply tokens are sent as progress notifications first.
     """
-    if session_id not in ticket_agents:
-        ticket_agents[session_id] = TicketExtractionAgent()
-
-    agent = ticket_agents[session_id]
+    state = await metrics.run_in_thread("session_get", session_store.get, session_id)
+    # Turns over max_messages are folded into the running summary, not dropped
+    limits = {"max_turns": session_store.max_messages}
+    agent = TicketExtractionAgent.from_state(state, **limits) if state else TicketExtractionAgent(**limits)
 
     if user_input.lower() in ["done", "exit", "quit"]:
-        ticket = await asyncio.to_thread(agent.extract_ticket)
+        ticket = await agent.extract_ticket()
         # cleanup session
-        del ticket_agents[session_id]
+        await metrics.run_in_thread("session_delete", session_store.delete, session_id)
         return {"status": "completed", "ticket": ticket}
 
-    reply = await asyncio.to_thread(agent.converse, user_input)
+    on_token = _token_forwarder(ctx) if stream and ctx is not None else None
+    reply = await agent.converse(user_input, on_token=on_token)
+    await metrics.run_in_thread("session_put", session_store.put, session_id, agent.to_state(), state is None)
     return {"status": "in_progress", "reply": reply}
 
 
+@mcp.tool()
+async def session_stats_tool() -> dict:
+    """Active Live QnA sessions, their stored size and expiry/eviction counters."""
+    return await metrics.run_in_thread("session_stats", session_store.stats)
+
+
 # 5. Run server
 # Change the host to listen on all interfaces
 if __name__ == "__main__":
     import uvicorn
+    if RAG_PREWARM:
+        embedder.warm_up_in_background(_warm_rag)
+    startup_metrics["import_seconds"] = round(time.perf_counter() - _server_start, 3)
+    print(f"[server] ready to serve after {startup_metrics['import_seconds']}s")
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(mcp.sse_app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -1,37 +1,307 @@
+"""
+Speech-to-text with pluggable backends (STT_BACKEND):
+
+- hf:    HF inference API (Whisper large-v3). The file is streamed to the API
+         in chunks with a content type matching its extension.
+- local: offline faster-whisper (CTranslate2, int8 on CPU). The recording is
+         decoded incrementally with PyAV into overlapping windows, so memory
+         stays bounded and partial transcripts are available per window.
+         Optional dependencies (faster-whisper, av), installed with
+         `pip install -r backend/requirements-stt-local.txt`.
+
+Sources are file paths or an AudioSpool (an upload still in progress, see
+audio_spool.py), so transcription can start before the upload finishes.
+Every backend yields segments {"start", "end", "text"} (seconds) through
+`stream_transcript`; `transcribe_audio` joins them and `transcribe_many`
+handles several files concurrently.
+"""
 import os
-import requests
+import sys
+import asyncio
+import itertools
+import mimetypes
+import threading
 from dotenv import load_dotenv
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.llm_client import LLMClient
+from sagents.metrics import span
+from sagents.audio_spool import AudioSpool
+
 # Load env variables
 load_dotenv()
 
-HF_TOKEN = os.getenv("HF_TOKEN")
-API_URL = "https://api-inference.huggingface.co/models/openai/whisper-large-v3"
+STT_BACKEND = os.getenv("STT_BACKEND", "hf")  # hf | local
+API_URL = os.getenv("STT_API_URL", "https://api-inference.huggingface.co/models/openai/whisper-large-v3")
+
+# Local engine
+STT_MODEL = os.getenv("STT_MODEL", "small")            # faster-whisper size or path
+STT_COMPUTE_TYPE = os.getenv("STT_COMPUTE_TYPE", "int8")
+STT_LANGUAGE = os.getenv("STT_LANGUAGE") or None       # None = detect per window
+STT_WORKERS = int(os.getenv("STT_WORKERS", 2))         # files transcribed in parallel
+STT_WINDOW_SECONDS = float(os.getenv("STT_WINDOW_SECONDS", 30))
+STT_OVERLAP_SECONDS = float(os.getenv("STT_OVERLAP_SECONDS", 2))
+STT_BEAM_SIZE = int(os.getenv("STT_BEAM_SIZE", 1))
+
+SAMPLE_RATE = 16000
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+# mimetypes doesn't know every container on every platform
+AUDIO_CONTENT_TYPES = {
+    ".m4a": "audio/mp4",
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+    ".webm": "audio/webm",
+}
+# Containers whose index may sit at the end of the file; every other format is decoded as a stream
+SEEKABLE_CONTENT_TYPES = {"audio/mp4", "audio/x-m4a", "video/mp4", "video/quicktime"}
+
+
+def audio_content_type(file_path: str) -> str:
+    if isinstance(file_path, AudioSpool):
+        return file_path.content_type
+    ext = os.path.splitext(file_path)[1].lower()
+    return AUDIO_CONTENT_TYPES.get(ext) or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+
+async def _iterate_in_thread(make_iter):
+    """Run a blocking iterator on a worker thread, yielding its items on the event loop."""
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def run():
+        try:
+            for item in make_iter():
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(items.put_nowait, item)
+        except BaseException as e:
+            loop.call_soon_threadsafe(items.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(items.put_nowait, done)
+
+    worker = loop.run_in_executor(None, run)
+    try:
+        while (item := await items.get()) is not done:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()  # an abandoned stream stops its thread after the current item
+        # wait for it even when cancelled, so the caller can release what the thread reads
+        # (an AudioSpool is aborted first, which ends any blocked read)
+        await asyncio.gather(worker, return_exceptions=True)
+
+
+# -----------------------------
+# HF inference API
+# -----------------------------
+class HFInferenceSTT:
+    name = "hf"
+
+    def __init__(self):
+        # Its own client, so uploads stay out of the LLM request counters on /metrics
+        self.client = LLMClient(api_url=API_URL)
+
+    async def stream(self, source):
+        def chunks():
+            # An upload in progress is forwarded as it arrives
+            if isinstance(source, AudioSpool):
+                return source.achunks(UPLOAD_CHUNK_BYTES)
+
+            async def read():
+                with open(source, "rb") as f:
+                    while chunk := await asyncio.to_thread(f.read, UPLOAD_CHUNK_BYTES):
+                        yield chunk
+            return read()
+
+        # Auth header, pooling, timeouts and retries (the upload is replayed)
+        response = await self.client.post(
+            API_URL,
+            headers={"Content-Type": audio_content_type(source)},
+            content=chunks,
+        )
+        output = response.json()
+        text = output.get("text", "") if isinstance(output, dict) else str(output)
+        # The API returns the whole transcript at once
+        yield {"start": 0.0, "end": None, "text": text.strip()}
+
+
+# -----------------------------
+# Local faster-whisper
+# -----------------------------
+def _open_audio(source):
+    import av
+    if isinstance(source, AudioSpool):
+        return av.open(source.reader(seekable=source.content_type in SEEKABLE_CONTENT_TYPES))
+    return av.open(source)
 
-headers = {"Authorization": f"Bearer {HF_TOKEN}"}
 
-def transcribe_audio(file_path: str) -> str:
-    with open(file_path, "rb") as f:
-        audio_bytes = f.read()
+def iter_audio_windows(source, window_seconds: float = STT_WINDOW_SECONDS,
+                       overlap_seconds: float = STT_OVERLAP_SECONDS):
+    """
+    Decode audio incrementally into 16 kHz mono float32 windows.
+    Yields (start_seconds, samples, is_last); consecutive windows overlap by
+    `overlap_seconds`. At most two windows are held in memory.
+    """
+    import av
+    import numpy as np
 
-    audio_headers = headers.copy()
-    audio_headers["Content-Type"] = "audio/mpeg"  # for mp3 files
+    window = int(window_seconds * SAMPLE_RATE)
+    step = window - int(overlap_seconds * SAMPLE_RATE)
+    buffered, offset = [], 0   # pending PCM chunks; sample index of their start
+    size = 0
+    pending = None             # window held back until we know whether it is the last
 
-    response = requests.post(
-        API_URL,
-        headers=audio_headers,
-        data=audio_bytes
-    )
+    def pcm(frames):
+        for out in frames:
+            yield out.to_ndarray().reshape(-1).astype(np.float32) / 32768.0
 
-    if response.status_code != 200:
-        raise Exception(f"HF API Error: {response.status_code}, {response.text}")
+    with _open_audio(source) as container:
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+        decoded = (resampler.resample(frame) for frame in container.decode(audio=0))
+        for frames in itertools.chain(decoded, [resampler.resample(None)]):  # None flushes
+            for samples in pcm(frames):
+                buffered.append(samples)
+                size += len(samples)
+                while size >= window:
+                    data = np.concatenate(buffered)
+                    if pending is not None:
+                        yield (*pending, False)
+                    pending = (offset / SAMPLE_RATE, data[:window])
+                    buffered, size, offset = [data[step:]], len(data) - step, offset + step
+
+    tail = np.concatenate(buffered) if buffered else np.zeros(0, dtype=np.float32)
+    # The tail is only the overlap already covered by the pending window
+    if pending is not None and len(tail) <= window - step:
+        yield (*pending, True)
+        return
+    if pending is not None:
+        yield (*pending, False)
+    yield (offset / SAMPLE_RATE, tail, True)
+
+
+class LocalWhisperSTT:
+    name = "local"
+
+    def __init__(self, model_name=STT_MODEL, compute_type=STT_COMPUTE_TYPE, workers=STT_WORKERS):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("STT_BACKEND=local needs `pip install -r backend/requirements-stt-local.txt`") from e
+        cpu_threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+        # num_workers lets `workers` files be transcribed in parallel by one model
+        self.model = WhisperModel(model_name, device="cpu", compute_type=compute_type,
+                                  cpu_threads=cpu_threads, num_workers=max(1, workers))
+        print(f"[stt] loaded faster-whisper {model_name} ({compute_type}, {workers} workers)")
+
+    def iter_segments(self, source):
+        """Blocking generator of segments with absolute timestamps, one window at a time."""
+        half_overlap = STT_OVERLAP_SECONDS / 2
+        emitted_until = 0.0
+        previous_text = ""
+        for start, samples, is_last in iter_audio_windows(source):
+            if len(samples) == 0:
+                continue
+            segments, _ = self.model.transcribe(
+                samples,
+                language=STT_LANGUAGE,
+                beam_size=STT_BEAM_SIZE,
+                vad_filter=True,
+                condition_on_previous_text=False,
+                initial_prompt=previous_text[-200:] or None,
+            )
+            window_end = start + len(samples) / SAMPLE_RATE
+            for seg in segments:
+                seg_start, seg_end = start + seg.start, start + seg.end
+                midpoint = (seg_start + seg_end) / 2
+                # Overlap regions are transcribed twice: the earlier window owns
+                # its first half, the later window the second half
+                if midpoint < emitted_until:
+                    continue
+                if not is_last and midpoint > window_end - half_overlap:
+                    break
+                text = seg.text.strip()
+                if text:
+                    previous_text += " " + text
+                    yield {"start": round(seg_start, 2), "end": round(seg_end, 2), "text": text}
+                emitted_until = max(emitted_until, seg_end)
+            if not is_last:
+                emitted_until = max(emitted_until, window_end - half_overlap)
+
+    async def stream(self, source):
+        async for segment in _iterate_in_thread(lambda: self.iter_segments(source)):
+            yield segment
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_stt_backend():
+    """The STT_BACKEND engine, created (and for local, loaded) once per process."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STT_BACKEND == "local":
+                    _backend = LocalWhisperSTT()
+                elif STT_BACKEND == "hf":
+                    _backend = HFInferenceSTT()
+                else:
+                    raise ValueError(f"Unknown STT_BACKEND: {STT_BACKEND!r} (expected 'hf' or 'local')")
+    return _backend
+
+
+async def stream_transcript(source):
+    """Async iterator of partial transcript segments {"start", "end", "text"} for a path or AudioSpool."""
+    backend = await asyncio.to_thread(get_stt_backend)
+    async for segment in backend.stream(source):
+        yield segment
+
+
+async def transcribe_audio(source, on_segment=None) -> str:
+    """Full transcript; `on_segment` (async callable) receives each partial segment."""
+    parts = []
+    with span("stt", backend=STT_BACKEND):
+        async for segment in stream_transcript(source):
+            parts.append(segment["text"])
+            if on_segment is not None:
+                await on_segment(segment)
+    return " ".join(p for p in parts if p)
+
+
+async def transcribe_many(file_paths: list, concurrency: int = STT_WORKERS) -> list:
+    """Transcribe several files, `concurrency` at a time; failures are returned, not raised."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(path):
+        async with semaphore:
+            try:
+                return {"audio_path": path, "text": await transcribe_audio(path)}
+            except Exception as e:
+                return {"audio_path": path, "error": f"{type(e).__name__}: {e}"}
+
+    return await asyncio.gather(*(one(p) for p in file_paths))
 
-    output = response.json()
-    return output.get("text", output)  # return transcription text if available
 
 if __name__ == "__main__":
-    audio_file = "D:/anushka/Atlan_Project/data/Recording.mp3"
-    print(f"Transcribing {audio_file} ...")
-    result = transcribe_audio(audio_file)
-    print("Transcription Result:\n", result)
-    
+    audio_files = sys.argv[1:] or ["data/Recording.m4a"]
+
+    async def main():
+        if len(audio_files) == 1:
+            print(f"Transcribing {audio_files[0]} ({STT_BACKEND}) ...")
+            async for segment in stream_transcript(audio_files[0]):
+                print(f"[{segment['start']}s] {segment['text']}")
+        else:
+            for result in await transcribe_many(audio_files):
+                print(result)
+
+    asyncio.run(main())
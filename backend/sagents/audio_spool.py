@@ -0,0 +1,128 @@
+# audio_spool.py
+"""
+Spool for audio that is still being uploaded.
+
+The upload handler `write`s chunks as they arrive; STT backends read the same
+bytes concurrently through `reader()` (a blocking, seekable file object that
+PyAV can decode from) or `achunks()` (async, for forwarding to the HF API).
+Reads past the received data wait for more, so transcription starts with the
+first chunk instead of after the whole file. Audio is kept in memory up to
+STT_SPOOL_MEMORY_BYTES, then rolls over to a temp file; it is never copied a
+second time.
+"""
+import asyncio
+import io
+import os
+import tempfile
+import threading
+
+STT_SPOOL_MEMORY_BYTES = int(os.getenv("STT_SPOOL_MEMORY_BYTES", 8 * 1024 * 1024))
+SPOOL_CHUNK_BYTES = 64 * 1024
+
+
+class UploadAborted(Exception):
+    pass
+
+
+class AudioSpool:
+    def __init__(self, content_type: str = "application/octet-stream", name: str = "upload",
+                 max_memory: int = STT_SPOOL_MEMORY_BYTES):
+        self.content_type = content_type
+        self.name = name
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self._cond = threading.Condition()
+        self.size = 0
+        self.complete = False
+        self.error = None
+
+    # --- writer side (the upload handler) ---
+    def write(self, chunk: bytes):
+        with self._cond:
+            self._file.seek(0, io.SEEK_END)
+            self._file.write(chunk)
+            self.size += len(chunk)
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self.complete = True
+            self._cond.notify_all()
+
+    def abort(self, error: Exception):
+        """Wake every reader with `error`, e.g. when the client disconnects."""
+        with self._cond:
+            self.error = error
+            self.complete = True
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._file.close()
+
+    # --- reader side ---
+    def read_at(self, position: int, n: int) -> bytes:
+        """Up to `n` bytes at `position`, waiting until they arrive; b"" only at the end of a finished upload."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.size > position or self.complete)
+            if self.error is not None:
+                raise UploadAborted(str(self.error))
+            self._file.seek(position)
+            return self._file.read(min(n, self.size - position)) if self.size > position else b""
+
+    def wait_complete(self) -> int:
+        """Block until the upload is finished; returns its size."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.complete)
+            if self.error is not None:
+                raise UploadAborted(str(self.error))
+            return self.size
+
+    def reader(self, seekable: bool = True) -> "SpoolReader":
+        """
+        Blocking file object over the upload. Pass seekable=False for
+        streamable formats (mp3, wav, ogg, webm, flac): demuxers then read
+        forward only instead of asking for the total size, which is unknown
+        until the upload finishes.
+        """
+        return SpoolReader(self, seekable)
+
+    async def achunks(self, chunk_size: int = SPOOL_CHUNK_BYTES):
+        """Async iterator over the upload from the start, following it as it grows."""
+        position = 0
+        while chunk := await asyncio.to_thread(self.read_at, position, chunk_size):
+            position += len(chunk)
+            yield chunk
+
+
+class SpoolReader(io.RawIOBase):
+    """Independent read position over an AudioSpool; blocks instead of hitting a premature EOF."""
+
+    def __init__(self, spool: AudioSpool, seekable: bool = True):
+        self.spool = spool
+        self.position = 0
+        self._seekable = seekable
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._seekable
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            # The end is only known once the upload is finished (e.g. MP4 with the index at the end)
+            self.position = self.spool.wait_complete() + offset
+        return self.position
+
+    def readinto(self, buffer):
+        data = self.spool.read_at(self.position, len(buffer))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
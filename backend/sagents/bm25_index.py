@@ -0,0 +1,214 @@
+# bm25_index.py
+"""
+Lexical (BM25) index over the knowledge-base chunks, for hybrid retrieval.
+
+Dense MiniLM retrieval ranks exact identifiers (Snowflake, Fivetran, dbt,
+connector names) poorly; BM25 catches them. The index is built from the
+Chroma collection at the end of every ingest (see atlan_info.py) and stored
+next to it as flat numpy arrays:
+
+  vocab.json        term -> term id, plus the chunk ids in index order
+  offsets.npy       int64[V + 1]  CSR offsets into the postings
+  postings.npy      int32[P]      doc index per posting
+  weights.npy       float32[P]    precomputed BM25 weight of the term in that doc
+
+Weights fold in idf and length normalisation, so a query is a sum of
+posting weights. The arrays are memory-mapped on load: opening is instant,
+and the OS page cache is shared by every worker process.
+
+Rebuild from an existing store with:
+  python backend/sagents/bm25_index.py --build
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import time
+
+import numpy as np
+
+BM25_DIR = os.path.join("backend/knowledge_base", "bm25_index")
+BM25_K1 = 1.2
+BM25_B = 0.75
+BUILD_READ_BATCH = 1000  # chunks read from Chroma per call
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in into is it its me my no not of on or "
+    "our so that the their then there these this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+# -----------------------------
+# Build
+# -----------------------------
+def _page_postings(documents, vocab, first_doc):
+    """(term ids, doc indexes, term frequencies, doc lengths) arrays for one page of documents."""
+    term_ids, doc_idx, tfs = [], [], []
+    doc_lengths = np.zeros(len(documents), dtype=np.float32)
+    for d, text in enumerate(documents):
+        tokens = tokenize(text)
+        doc_lengths[d] = len(tokens)
+        counts = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for t, tf in counts.items():
+            term_ids.append(vocab.setdefault(t, len(vocab)))
+            doc_idx.append(first_doc + d)
+            tfs.append(tf)
+    return (np.asarray(term_ids, dtype=np.int64), np.asarray(doc_idx, dtype=np.int32),
+            np.asarray(tfs, dtype=np.float32), doc_lengths)
+
+
+def build_bm25_index(pages, out_dir=BM25_DIR, k1=BM25_K1, b=BM25_B):
+    """Build the index from (chunk ids, documents) pages and publish it atomically at `out_dir`.
+
+    Each page is tokenized as it arrives and only its postings arrays are
+    kept, so a single page of chunk texts is in memory at a time.
+    """
+    start = time.time()
+    vocab, ids, parts = {}, [], []
+    for page_ids, documents in pages:
+        parts.append(_page_postings(documents, vocab, len(ids)))
+        ids.extend(page_ids)
+
+    term_ids, doc_idx, tfs, doc_lengths = (
+        np.concatenate([p[i] for p in parts]) if parts else np.zeros(0, dtype=dtype)
+        for i, dtype in enumerate((np.int64, np.int32, np.float32, np.float32))
+    )
+    del parts
+
+    # Group postings by term (CSR)
+    order = np.argsort(term_ids, kind="stable")
+    term_ids, doc_idx, tfs = term_ids[order], doc_idx[order], tfs[order]
+    df = np.bincount(term_ids, minlength=len(vocab))
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df, out=offsets[1:])
+
+    n_docs = max(1, len(ids))
+    avgdl = float(doc_lengths.mean()) if len(ids) else 1.0
+    idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+    norm = k1 * (1.0 - b + b * doc_lengths[doc_idx] / max(avgdl, 1e-9))
+    weights = (idf[term_ids] * tfs * (k1 + 1.0) / (tfs + norm)).astype(np.float32)
+
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "postings.npy"), doc_idx)
+    np.save(os.path.join(tmp_dir, "weights.npy"), weights)
+    with open(os.path.join(tmp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump({"vocab": vocab, "ids": ids, "k1": k1, "b": b, "avgdl": avgdl}, f)
+
+    # Swap directories so readers never see a half-written index
+    old_dir = f"{out_dir}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"[bm25] indexed {len(ids)} chunks, {len(vocab)} terms, {len(weights)} postings "
+          f"in {time.time() - start:.1f}s -> {out_dir}")
+
+
+def _collection_pages(collection):
+    offset = 0
+    while True:
+        page = collection.get(include=["documents"], limit=BUILD_READ_BATCH, offset=offset)
+        if not page["ids"]:
+            return
+        yield page["ids"], page["documents"]
+        offset += len(page["ids"])
+
+
+def build_from_collection(collection, out_dir=BM25_DIR):
+    """Rebuild the index from every chunk currently in the Chroma collection, one page at a time."""
+    build_bm25_index(_collection_pages(collection), out_dir)
+
+
+# -----------------------------
+# Query
+# -----------------------------
+class BM25Index:
+    def __init__(self, index_dir=BM25_DIR):
+        with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.vocab = meta["vocab"]
+        self.ids = meta["ids"]
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode="r")
+        self.postings = np.load(os.path.join(index_dir, "postings.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(index_dir, "weights.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query: str, top_k: int = 20) -> list:
+        """[(chunk_id, score)] for the best `top_k` chunks containing any query term."""
+        scores = None
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            if scores is None:
+                scores = np.zeros(len(self.ids), dtype=np.float32)
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            # a term appears at most once per doc, so plain fancy-index add is safe
+            scores[self.postings[lo:hi]] += self.weights[lo:hi]
+        if scores is None:
+            return []
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in hits]
+
+
+def load_bm25_index(index_dir=BM25_DIR):
+    """The index at `index_dir`, or None if it hasn't been built yet."""
+    if not os.path.exists(os.path.join(index_dir, "vocab.json")):
+        return None
+    return BM25Index(index_dir)
+
+
+# -----------------------------
+# Fusion
+# -----------------------------
+def reciprocal_rank_fusion(rankings: dict, weights: dict, k: int = 60) -> list:
+    """
+    Fuse ranked id lists: score(d) = sum over rankers r of weights[r] / (k + rank_r(d)).
+    `rankings` maps ranker name -> ids, best first. Returns ids, best first.
+    """
+    fused = {}
+    for name, ids in rankings.items():
+        weight = weights.get(name, 1.0)
+        if weight <= 0:
+            continue
+        for rank, doc_id in enumerate(ids, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the BM25 index")
+    parser.add_argument("--build", action="store_true", help="Rebuild from the Chroma collection")
+    parser.add_argument("--query", help="Print the top hits for a query")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.build:
+        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+        from sagents.rag_qna_agent import get_collection
+        build_from_collection(get_collection())
+    if args.query:
+        index = load_bm25_index()
+        if index is None:
+            sys.exit(f"No BM25 index at {BM25_DIR}; run with --build first")
+        for chunk_id, score in index.search(args.query, args.top_k):
+            print(f"{score:8.3f}  {chunk_id}")
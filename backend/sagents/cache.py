@@ -0,0 +1,274 @@
+# cache.py
+"""
+Small caches shared by the agents.
+
+- LRUCache:    in-process, thread-safe, size-bounded with optional TTL
+- SQLiteCache: optional on-disk tier (JSON values) with TTL, shared by processes
+- TieredCache: LRU in front of SQLite, promoting disk hits into memory
+- SemanticCache: nearest-neighbour lookup by embedding similarity
+
+All caches report hit/miss counters through `stats()`.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+import numpy as np
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class SQLiteCache:
+    def __init__(self, path: str, ttl: Optional[float] = None, table: str = "cache"):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is not None and (row[1] is None or row[1] > time.time()):
+            self.hits += 1
+            return json.loads(row[0])
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (time.time(),),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class TieredCache:
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key, default=MISSING):
+        value = self.memory.get(key)
+        if value is not MISSING:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not MISSING:
+                self.memory.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache keyed by embedding.
+
+    `lookup` returns the stored value whose embedding has the highest cosine
+    similarity with the query, provided it is >= `threshold` and was stored
+    under the same `tag`. Least-recently-used entries are evicted when full.
+    """
+
+    def __init__(self, maxsize: int = 512, threshold: float = 0.95, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors = None  # (maxsize, dim) float32, rows are unit vectors
+        self._tags = [None] * maxsize
+        self._values = [None] * maxsize
+        self._last_used = [0.0] * maxsize
+        self._expires = [None] * maxsize
+        self._used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(embedding):
+        v = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, embedding, tag=None):
+        """Return (value, similarity) for the best match, or None on a miss."""
+        q = self._unit(embedding)
+        now = time.time()
+        with self._lock:
+            if self._used:
+                sims = self._vectors[:self._used] @ q
+                for i in sims.argsort()[::-1]:
+                    if sims[i] < self.threshold:
+                        break
+                    if self._tags[i] != tag:
+                        continue
+                    if self._expires[i] is not None and self._expires[i] <= now:
+                        continue
+                    self._last_used[i] = now
+                    self.hits += 1
+                    return self._values[i], float(sims[i])
+            self.misses += 1
+            return None
+
+    def add(self, embedding, value, tag=None):
+        v = self._unit(embedding)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, v.shape[0]), dtype=np.float32)
+            if self._used < self.maxsize:
+                i = self._used
+                self._used += 1
+            else:
+                i = min(range(self.maxsize), key=self._last_used.__getitem__)
+                self.evictions += 1
+            self._vectors[i] = v
+            self._tags[i] = tag
+            self._values[i] = value
+            self._last_used[i] = now
+            self._expires[i] = now + self.ttl if self.ttl else None
+
+    def clear(self):
+        with self._lock:
+            self._used = 0
+            self._tags = [None] * self.maxsize
+            self._values = [None] * self.maxsize
+            self._last_used = [0.0] * self.maxsize
+            self._expires = [None] * self.maxsize
+
+    def __len__(self):
+        return self._used
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": self._used,
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,111 @@
+# chat_history.py
+"""
+Token-budgeted chat history.
+
+Keeps the system prompt, a running summary of older turns and a rolling
+window of recent turns. Once the estimated size goes over `token_budget`,
+the oldest turns are folded into the summary until the total is back under
+`low_water` * budget. The margin means a summarization call happens every
+few turns rather than on every turn, so per-turn cost stays flat however
+long the conversation gets.
+
+Token counts are estimated as chars / 4, plus a small per-message overhead.
+"""
+import os
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 2000))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", 300))
+HISTORY_LOW_WATER = 0.6   # compact down to this fraction of the budget
+HISTORY_MIN_TURNS = 2     # always keep at least the latest exchange verbatim
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the tail of `text` (the newest facts) within roughly `max_tokens`."""
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else "..." + text[-max_chars:]
+
+
+class HistoryManager:
+    def __init__(self, system_prompt: str, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 summarize=None, summary_max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS, max_turns: int = 0):
+        """
+        `await summarize(previous_summary, messages) -> str` folds `messages`
+        into the summary (typically an LLM call). Without it, or if it fails,
+        older turns are appended to the summary as clipped plain text.
+        `max_turns` (0 = no cap) also bounds the verbatim turns; the overflow
+        is folded into the summary like any other old turn.
+        """
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.summary_max_tokens = summary_max_tokens
+        self.max_turns = max_turns
+        self.summary = ""
+        self.turns = []
+        self.folded_turns = 0
+
+    def add(self, role: str, content: str):
+        self.turns.append({"role": role, "content": content})
+
+    def over_budget(self) -> bool:
+        return self.token_count() > self.token_budget
+
+    def _over_max_turns(self) -> bool:
+        return bool(self.max_turns) and len(self.turns) > self.max_turns
+
+    def _summary_message(self):
+        if not self.summary:
+            return []
+        return [{"role": "system", "content": f"Summary of the conversation so far: {self.summary}"}]
+
+    def messages(self, extra=None) -> list:
+        """Messages to send: system prompt, summary, recent turns, then `extra` (not stored)."""
+        return ([{"role": "system", "content": self.system_prompt}]
+                + self._summary_message() + list(self.turns) + list(extra or []))
+
+    def token_count(self) -> int:
+        return sum(estimate_tokens(m["content"]) for m in self.messages())
+
+    async def compact(self):
+        """
+        If over budget, fold the oldest turns into the summary until under the
+        low-water mark; if over `max_turns`, until at most `max_turns` remain.
+        """
+        over_budget = self.over_budget()
+        if not over_budget and not self._over_max_turns():
+            return
+        target = int(self.token_budget * HISTORY_LOW_WATER) if over_budget else None
+        total = self.token_count()
+        folded = []
+        while len(self.turns) > HISTORY_MIN_TURNS and (
+                (target is not None and total > target) or self._over_max_turns()):
+            message = self.turns.pop(0)
+            total -= estimate_tokens(message["content"])
+            folded.append(message)
+        if not folded:
+            return
+
+        summary = None
+        if self.summarize is not None:
+            try:
+                summary = await self.summarize(self.summary, folded)
+            except Exception as e:
+                print(f"[history] summarization failed, keeping plain text: {e}")
+        if not summary:
+            lines = [f"{m['role']}: {m['content']}" for m in folded]
+            summary = " ".join(filter(None, [self.summary, *lines]))
+        self.summary = clip_to_tokens(summary.strip(), self.summary_max_tokens)
+        self.folded_turns += len(folded)
+
+    def to_state(self) -> dict:
+        return {"summary": self.summary, "turns": self.turns, "folded_turns": self.folded_turns}
+
+    def load_state(self, state: dict):
+        self.summary = state.get("summary", "")
+        self.turns = list(state.get("turns", []))
+        self.folded_turns = state.get("folded_turns", 0)
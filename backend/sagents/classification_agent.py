@@ -1,23 +1,106 @@
 import os
+import sys
+import copy
 import json
-import requests
+import asyncio
+import hashlib
 from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.cache import LRUCache, SQLiteCache, TieredCache, MISSING
+from sagents.llm_client import get_llm_client
+from sagents.fast_classifier import fast_classify_batch, get_fast_classifier
+from sagents.metrics import span, run_in_thread
+
 # Load env variables
 load_dotenv()
-HF_TOKEN = os.getenv("HF_TOKEN")
 HF_MODEL = os.getenv("HF_MODEL")
 
-API_URL = "https://router.huggingface.co/v1/chat/completions"
-headers = {
-    "Authorization": f"Bearer {HF_TOKEN}",
-}
+# Batch classification: tickets packed per LLM request / requests in flight
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", 10))
+CLASSIFY_BATCH_CONCURRENCY = int(os.getenv("CLASSIFY_BATCH_CONCURRENCY", 4))
+CATEGORY_KEYS = ("topic_tags", "sentiment", "priority")
+
+# Bump whenever the classification prompts change, so cached labels are not reused
+CLASSIFY_PROMPT_VERSION = "v1"
+
+# Classification cache: in-memory LRU, plus an optional SQLite tier shared across restarts/workers
+CLASSIFY_CACHE_SIZE = int(os.getenv("CLASSIFY_CACHE_SIZE", 4096))
+CLASSIFY_CACHE_TTL = float(os.getenv("CLASSIFY_CACHE_TTL", 7 * 24 * 3600))
+CLASSIFY_CACHE_DB = os.getenv("CLASSIFY_CACHE_DB")  # e.g. backend/classification_cache.sqlite
+
+classification_cache = TieredCache(
+    LRUCache(maxsize=CLASSIFY_CACHE_SIZE, ttl=CLASSIFY_CACHE_TTL),
+    SQLiteCache(CLASSIFY_CACHE_DB, ttl=CLASSIFY_CACHE_TTL) if CLASSIFY_CACHE_DB else None,
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split()).casefold()
+
+
+def classification_cache_key(ticket: dict) -> str:
+    """Content address of a ticket: normalized subject + body, model and prompt version."""
+    key = json.dumps([
+        _normalize(ticket.get("subject", "")),
+        _normalize(ticket.get("body", "")),
+        HF_MODEL,
+        CLASSIFY_PROMPT_VERSION,
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+async def _cache_get_many(keys: list) -> dict:
+    """{key: category} for the cached keys. LRU hits are served inline; the SQLite tier is read in a worker thread."""
+    found, missed = {}, []
+    for key in keys:
+        value = classification_cache.memory.get(key)
+        if value is MISSING:
+            missed.append(key)
+        else:
+            found[key] = value
+    disk = classification_cache.disk
+    if missed and disk is not None:
+        def read():
+            values = ((key, disk.get(key)) for key in missed)
+            return {key: value for key, value in values if value is not MISSING}
+
+        promoted = await run_in_thread("classify_cache_read", read)
+        for key, value in promoted.items():
+            classification_cache.memory.set(key, value)
+        found.update(promoted)
+    return found
+
+
+async def _cache_set_many(items: dict):
+    """Store {key: category} in the LRU, and in the SQLite tier from a worker thread."""
+    for key, value in items.items():
+        classification_cache.memory.set(key, value)
+    disk = classification_cache.disk
+    if items and disk is not None:
+        def write():
+            for key, value in items.items():
+                disk.set(key, value)
 
+        await run_in_thread("classify_cache_write", write)
 
-def classify_ticket(ticket: dict) -> dict:
+
+async def _chat_json(prompt: str) -> dict:
+    """Send a single-message prompt and parse the JSON object the model returns."""
+    category = await get_llm_client().chat(
+        [{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"},
+    )
+    with span("json_parse"):
+        return json.loads(category.strip())
+
+
+async def classify_ticket(ticket: dict, use_cache: bool = True, use_fast: bool = True) -> dict:
     """
     Classify a single ticket into categories.
+    Confident tickets are answered by the embedding fast path (see fast_classifier.py),
+    the rest by the LLM.
 
     Args:
         ticket (dict): {
@@ -25,12 +108,26 @@ def classify_ticket(ticket: dict) -> dict:
             "subject": str,
             "body": str
         }
+        use_cache (bool): set False to neither read nor write the classification cache
+        use_fast (bool): set False to always ask the LLM
     Returns:
         dict: {
             "id": str,
             "category": dict
         }
     """
+    cache_key = classification_cache_key(ticket)
+    if use_cache:
+        cached = (await _cache_get_many([cache_key])).get(cache_key, MISSING)
+        if cached is not MISSING:
+            return {"id": ticket["id"], "category": copy.deepcopy(cached)}
+
+    if use_fast and get_fast_classifier() is not None:
+        # Not cached: the cache holds LLM labels only
+        fast = (await run_in_thread("fast_classify", fast_classify_batch, [ticket]))[0]
+        if fast is not None:
+            return {"id": ticket["id"], "category": fast}
+
     prompt = f"""
     You are an AI agent for a helpdesk application. 
     Given a ticket (subject and body), analyze it and return ONLY a JSON object with:
@@ -50,24 +147,138 @@ def classify_ticket(ticket: dict) -> dict:
     - Priority reflects urgency implied in the ticket.
     """
 
-    payload = {
-        "messages": [{"role": "user", "content": prompt}],
-        "model": HF_MODEL,
-        "response_format": {"type": "json_object"},
-    }
+    with span("classify_llm"):
+        parsed = await _chat_json(prompt)
+    if use_cache:
+        await _cache_set_many({cache_key: parsed})
+
+    return {"id": ticket["id"], "category": copy.deepcopy(parsed)}
+
+
+async def _classify_packed(tickets: list) -> list:
+    """
+    Classify several tickets with one LLM request.
+    Returns categories in input order; raises ValueError if the response
+    does not contain exactly one well-formed result per ticket.
+    Tickets are sent as t0..tN rather than their own ids, which may repeat.
+    """
+    packed = json.dumps(
+        [{"id": f"t{i}", "subject": t.get("subject", ""), "body": t.get("body", "")} for i, t in enumerate(tickets)],
+        ensure_ascii=False,
+        indent=1,
+    )
+    prompt = f"""
+    You are an AI agent for a helpdesk application.
+    Below is a JSON array of {len(tickets)} tickets, each with an id, subject and body.
+    Classify EACH ticket independently and return ONLY a JSON object of the form:
+
+    {{
+      "results": [
+        {{
+          "id": "...",             // the ticket id, copied exactly
+          "topic_tags": [ ... ],   // choose from: How-to, Product, API/SDK, Connector, Lineage, SSO, Glossary, Best practices, Sensitive data.
+          "sentiment": "...",      // choose from: Frustrated, Curious, Angry, Neutral
+          "priority": "..."        // choose from: P0 (High), P1 (Medium), P2 (Low)
+        }}
+      ]
+    }}
+
+    Tickets:
+    {packed}
+
+    Rules:
+    - Output valid JSON only (no text around it).
+    - Return exactly one result per ticket, in the same order.
+    - Choose 1 or 2 most relevant topic tags.
+    - Priority reflects urgency implied in the ticket.
+    """
+
+    parsed = await _chat_json(prompt)
+    results = parsed.get("results") if isinstance(parsed, dict) else None
+    if not isinstance(results, list):
+        raise ValueError("Batch response has no 'results' array")
+
+    if len(results) != len(tickets):
+        raise ValueError(f"Batch returned {len(results)} results for {len(tickets)} tickets")
+    by_id = {}
+    for item in results:
+        if not isinstance(item, dict) or any(k not in item for k in CATEGORY_KEYS + ("id",)):
+            raise ValueError(f"Malformed batch result: {item}")
+        by_id[str(item["id"])] = {k: item[k] for k in CATEGORY_KEYS}
+
+    expected = [f"t{i}" for i in range(len(tickets))]
+    if set(by_id) != set(expected):
+        raise ValueError(f"Batch ids mismatch: expected {expected}, got {sorted(by_id)}")
+    return [by_id[i] for i in expected]
+
+
+async def _classify_with_split(tickets: list) -> list:
+    """Classify a packed batch, halving it whenever the response cannot be parsed."""
+    if len(tickets) == 1:
+        return [(await classify_ticket(tickets[0], use_cache=False, use_fast=False))["category"]]
+    try:
+        return await _classify_packed(tickets)
+    except ValueError as e:  # includes json.JSONDecodeError
+        print(f"[classify_batch] splitting batch of {len(tickets)}: {e}")
+        mid = len(tickets) // 2
+        left, right = await asyncio.gather(
+            _classify_with_split(tickets[:mid]), _classify_with_split(tickets[mid:])
+        )
+        return left + right
+
+
+async def classify_batch(tickets: list, batch_size: int = CLASSIFY_BATCH_SIZE, use_cache: bool = True,
+                         use_fast: bool = True) -> list:
+    """
+    Classify many tickets, packing `batch_size` tickets into each LLM request.
+    Cached tickets and duplicates (same content address) are sent to the LLM once at most,
+    and tickets the fast path is confident about not at all.
+
+    Args:
+        tickets (list): [{"id": str, "subject": str, "body": str}, ...]
+        use_cache (bool): set False to neither read nor write the classification cache
+        use_fast (bool): set False to send every uncached ticket to the LLM
+    Returns:
+        list: [{"id": str, "category": dict}, ...] in input order
+    """
+    keys = [classification_cache_key(t) for t in tickets]
+    by_key = await _cache_get_many(list(dict.fromkeys(keys))) if use_cache else {}
+    pending = {}  # cache key -> representative ticket
+    for ticket, key in zip(tickets, keys):
+        if key not in by_key and key not in pending:
+            pending[key] = ticket
+
+    if use_fast and pending and get_fast_classifier() is not None:
+        # One embedding pass for every uncached ticket
+        fast = await run_in_thread("fast_classify", fast_classify_batch, list(pending.values()))
+        for key, category in zip(list(pending), fast):
+            if category is not None:
+                by_key[key] = category
+                del pending[key]
+
+    batch_size = max(1, batch_size)
+    todo = list(pending.items())
+    chunks = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+
+    semaphore = asyncio.Semaphore(CLASSIFY_BATCH_CONCURRENCY)
 
-    response = requests.post(API_URL, headers=headers, json=payload)
-    if response.status_code != 200:
-        raise Exception(f"HF API Error: {response.status_code}, {response.text}")
+    async def run_chunk(chunk):
+        async with semaphore:
+            categories = await _classify_with_split([ticket for _, ticket in chunk])
+        return [(key, category) for (key, _), category in zip(chunk, categories)]
 
-    output = response.json()
-    category = output["choices"][0]["message"]["content"].strip()
-    parsed = json.loads(category)
+    labelled = {}
+    for chunk_result in await asyncio.gather(*(run_chunk(chunk) for chunk in chunks)):
+        labelled.update(chunk_result)
+    if use_cache:
+        await _cache_set_many(labelled)
+    by_key.update(labelled)
 
-    return {"id": ticket["id"], "category": parsed}
+    return [{"id": t["id"], "category": copy.deepcopy(by_key[key])} for t, key in zip(tickets, keys)]
 
 
-def classify_from_file(file_path: str, output_file: str = None):
+def classify_from_file(file_path: str, output_file: str = None, batch_size: int = CLASSIFY_BATCH_SIZE,
+                       use_fast: bool = True):
     """
     Classify all tickets in a JSON file.
     """
@@ -75,7 +286,7 @@ def classify_from_file(file_path: str, output_file: str = None):
     with open(path, "r", encoding="utf-8") as f:
         tickets = json.load(f)
 
-    results = [classify_ticket(ticket) for ticket in tickets]
+    results = asyncio.run(classify_batch(tickets, batch_size=batch_size, use_fast=use_fast))
 
     if output_file:
         with open(output_file, "w", encoding="utf-8") as f:
@@ -92,11 +303,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Ticket classification agent")
     parser.add_argument("--file", type=str, help="Path to JSON file with tickets")
     parser.add_argument("--output", type=str, help="Where to save classified results")
+    parser.add_argument("--batch-size", type=int, default=CLASSIFY_BATCH_SIZE, help="Tickets packed per LLM request")
+    parser.add_argument("--llm-only", action="store_true", help="Skip the fast path (e.g. to label training data)")
     args = parser.parse_args()
 
     if args.file:
         # Batch mode
-        classify_from_file(args.file, args.output)
+        classify_from_file(args.file, args.output, batch_size=args.batch_size, use_fast=not args.llm_only)
+        print("Cache stats:", json.dumps(classification_cache.stats()))
     else:
         # Single ticket mode
         sample_ticket = {
@@ -104,7 +318,7 @@ if __name__ == "__main__":
             "subject": "help in deploying Atlan agent in secure VPC",
             "body": "Our primary data lake is hosted on-premise within a secure VPC and is not exposed to the internet. We understand we need to use the Atlan agent for this, but the setup instructions are a bit confusing for our security team. This is a critical source for us, and we can't proceed with our rollout until we get this connected. Can you provide a detailed deployment guide so we know how to do this."
         }
-        print(json.dumps(classify_ticket(sample_ticket), indent=2))
+        print(json.dumps(asyncio.run(classify_ticket(sample_ticket)), indent=2))
 
 
 
@@ -0,0 +1,63 @@
+# embedder.py
+"""
+Process-wide SentenceTransformer shared by every agent that embeds text.
+
+The model is loaded on first use (or by `warm_up_in_background()` at server
+start), never at import time, and exactly once per process.
+"""
+import os
+import threading
+import time
+import numpy as np
+
+# The one definition, shared by ingest (knowledge_base/atlan_info.py, chunker.py, embedding_engine.py) and queries
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L12-v2")
+
+_model = None
+_lock = threading.Lock()
+
+load_metrics = {
+    "model": EMBEDDING_MODEL_NAME,
+    "load_seconds": None,
+    "loaded_at": None,
+}
+
+
+def get_embedder():
+    """Return the shared SentenceTransformer, loading it on first call."""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+
+                start = time.perf_counter()
+                _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                load_metrics["load_seconds"] = round(time.perf_counter() - start, 3)
+                load_metrics["loaded_at"] = time.time()
+                print(f"[embedder] loaded {EMBEDDING_MODEL_NAME} in {load_metrics['load_seconds']}s")
+    return _model
+
+
+def is_loaded() -> bool:
+    return _model is not None
+
+
+def embed(texts) -> np.ndarray:
+    """Embed a list of texts into a float32 array of shape (len(texts), dim)."""
+    return get_embedder().encode(list(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+def warm_up_in_background(*extra_steps) -> threading.Thread:
+    """Load the model (then run any extra warm-up callables) on a daemon thread."""
+    def run():
+        try:
+            get_embedder()
+            for step in extra_steps:
+                step()
+        except Exception as e:
+            print(f"[embedder] warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name="embedder-warmup", daemon=True)
+    thread.start()
+    return thread
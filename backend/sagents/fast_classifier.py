@@ -0,0 +1,292 @@
+# fast_classifier.py
+"""
+Embedding-based fast path for ticket classification (FAST_CLASSIFY=1).
+
+Tickets are embedded with the shared MiniLM model (the one RAG already
+loads). Each ticket is scored against one centroid per label, for three
+heads: topic_tags, sentiment and priority. The heads are trained from tickets
+the LLM has already labelled. Cosine similarities go through a softmax whose
+temperature is fitted per head on the training set, so head probabilities
+are roughly calibrated. A ticket's confidence is the lowest probability of
+a chosen label across the heads (for topics, of the one or two chosen tags).
+
+classify_ticket / classify_batch use the fast path for tickets at or above
+FAST_CLASSIFY_THRESHOLD, and send the rest to the LLM. If no model has been
+trained, or a head had no labels to train on, every ticket goes to the LLM.
+
+Train (labels as written by `classification_agent.py --file ... --output ... --llm-only`),
+then measure agreement with the LLM on held-out tickets:
+  python backend/sagents/fast_classifier.py --train tickets.json labels.json
+  python backend/sagents/fast_classifier.py --eval tickets.json labels.json
+"""
+import os
+import sys
+import json
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.embedder import embed, EMBEDDING_MODEL_NAME
+
+FAST_CLASSIFY = os.getenv("FAST_CLASSIFY", "1") == "1"   # used only once a model is trained
+FAST_CLASSIFY_THRESHOLD = float(os.getenv("FAST_CLASSIFY_THRESHOLD", 0.8))
+FAST_CLASSIFIER_PATH = os.getenv("FAST_CLASSIFIER_PATH", os.path.join("backend", "fast_classifier.npz"))
+
+HEADS = ("topic_tags", "sentiment", "priority")
+SECOND_TAG_RATIO = 0.6     # a second topic tag is kept if its probability is >= this fraction of the first
+TEMPERATURES = (0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2)
+EVAL_THRESHOLDS = (0.0, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+fast_classify_stats = {"fast": 0, "llm": 0, "total_ms": 0.0}
+
+
+def ticket_text(ticket: dict) -> str:
+    """
+    The text embedded for a ticket, at training and at serving time alike.
+    The tools receive one ticket_text (the UI joins subject and body with a
+    space) and pass it as both subject and body; that collapses to the same
+    single string a labelled {"subject", "body"} ticket gives here.
+    """
+    subject = (ticket.get("subject") or "").strip()
+    body = (ticket.get("body") or "").strip()
+    if not subject or subject == body:
+        return body
+    return f"{subject} {body}".strip()
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def _softmax(scores: np.ndarray, temperature: float) -> np.ndarray:
+    z = scores / temperature
+    z = np.exp(z - z.max(axis=1, keepdims=True))
+    return z / z.sum(axis=1, keepdims=True)
+
+
+def _label_lists(category: dict, head: str) -> list:
+    value = category.get(head)
+    if value is None:
+        return []
+    return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+
+
+# -----------------------------
+# Model
+# -----------------------------
+class FastClassifier:
+    def __init__(self, heads: dict, model_name: str = EMBEDDING_MODEL_NAME):
+        # head -> (labels, centroids float32[L, D], temperature)
+        self.heads = heads
+        self.model_name = model_name
+
+    @classmethod
+    def fit(cls, embeddings, categories: list):
+        """Centroid heads from embeddings and the LLM categories of the same tickets."""
+        X = _normalize(np.asarray(embeddings, dtype=np.float32))
+        heads = {}
+        for head in HEADS:
+            labels = sorted({l for c in categories for l in _label_lists(c, head)})
+            if not labels:
+                continue
+            index = {l: i for i, l in enumerate(labels)}
+            targets = np.zeros((len(X), len(labels)), dtype=np.float32)
+            for row, category in enumerate(categories):
+                for l in _label_lists(category, head):
+                    targets[row, index[l]] = 1.0
+            counts = targets.sum(axis=0)
+            centroids = _normalize((targets.T @ X) / np.maximum(counts, 1.0)[:, None])
+            heads[head] = (labels, centroids, _fit_temperature(X @ centroids.T, targets))
+        return cls(heads)
+
+    def predict(self, embeddings):
+        """[(category, confidence)] per embedding."""
+        X = _normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        results = [({}, 1.0) for _ in range(len(X))]
+        for head, (labels, centroids, temperature) in self.heads.items():
+            probs = _softmax(X @ centroids.T, temperature)
+            order = np.argsort(-probs, axis=1)
+            for row, (category, confidence) in enumerate(results):
+                first = order[row, 0]
+                chosen = [first]
+                if head == "topic_tags":
+                    if len(labels) > 1 and probs[row, order[row, 1]] >= SECOND_TAG_RATIO * probs[row, first]:
+                        chosen.append(order[row, 1])
+                    category[head] = [labels[i] for i in chosen]
+                else:
+                    category[head] = labels[first]
+                # two topic tags split the probability mass between them
+                results[row] = (category, min(confidence, float(probs[row, chosen].sum())))
+        if set(self.heads) != set(HEADS):
+            # a head without training labels can't be answered, so the LLM has to
+            results = [(category, 0.0) for category, _ in results]
+        return results
+
+    def save(self, path=FAST_CLASSIFIER_PATH):
+        arrays = {"model_name": np.array(self.model_name)}
+        for head, (labels, centroids, temperature) in self.heads.items():
+            arrays[f"{head}.labels"] = np.array(labels)
+            arrays[f"{head}.centroids"] = centroids
+            arrays[f"{head}.temperature"] = np.array(temperature)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=FAST_CLASSIFIER_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            heads = {
+                head: ([str(l) for l in data[f"{head}.labels"]],
+                       data[f"{head}.centroids"].astype(np.float32),
+                       float(data[f"{head}.temperature"]))
+                for head in HEADS if f"{head}.labels" in data
+            }
+            return cls(heads, str(data["model_name"]))
+
+
+def _fit_temperature(scores: np.ndarray, targets: np.ndarray) -> float:
+    """The softmax temperature with the lowest negative log-likelihood of the training labels."""
+    targets = targets / np.maximum(targets.sum(axis=1, keepdims=True), 1.0)
+    best, best_nll = TEMPERATURES[0], None
+    for t in TEMPERATURES:
+        nll = -float((targets * np.log(_softmax(scores, t) + 1e-9)).sum(axis=1).mean())
+        if best_nll is None or nll < best_nll:
+            best, best_nll = t, nll
+    return best
+
+
+_model = None
+_model_loaded = False
+_lock = threading.Lock()
+
+
+def get_fast_classifier():
+    """The trained classifier, loaded on first use; None if disabled, untrained or for another embedder."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _lock:
+            if not _model_loaded:
+                if FAST_CLASSIFY and os.path.exists(FAST_CLASSIFIER_PATH):
+                    model = FastClassifier.load(FAST_CLASSIFIER_PATH)
+                    if model.model_name != EMBEDDING_MODEL_NAME:
+                        print(f"[fast_classify] {FAST_CLASSIFIER_PATH} was trained on {model.model_name}, "
+                              f"not {EMBEDDING_MODEL_NAME}; disabled")
+                    else:
+                        _model = model
+                        print(f"[fast_classify] loaded {FAST_CLASSIFIER_PATH} "
+                              f"(threshold {FAST_CLASSIFY_THRESHOLD})")
+                _model_loaded = True
+    return _model
+
+
+def fast_classify_batch(tickets: list, threshold: float = FAST_CLASSIFY_THRESHOLD) -> list:
+    """Category per ticket from the fast path, or None where it isn't confident enough (or untrained)."""
+    model = get_fast_classifier()
+    if model is None or not tickets:
+        return [None] * len(tickets)
+    start = time.perf_counter()
+    results = []
+    for category, confidence in model.predict(embed([ticket_text(t) for t in tickets])):
+        results.append(category if confidence >= threshold else None)
+    fast = sum(r is not None for r in results)
+    fast_classify_stats["fast"] += fast
+    fast_classify_stats["llm"] += len(results) - fast
+    fast_classify_stats["total_ms"] += (time.perf_counter() - start) * 1000
+    return results
+
+
+def stats() -> dict:
+    total = fast_classify_stats["fast"] + fast_classify_stats["llm"]
+    return {
+        **fast_classify_stats,
+        "enabled": _model is not None,
+        "threshold": FAST_CLASSIFY_THRESHOLD,
+        "fast_rate": round(fast_classify_stats["fast"] / total, 4) if total else None,
+    }
+
+
+# -----------------------------
+# Offline training / evaluation
+# -----------------------------
+def load_labelled(tickets_file: str, labels_file: str = None):
+    """(tickets, categories) for tickets that have an LLM label; labels are joined by ticket id."""
+    with open(tickets_file, "r", encoding="utf-8") as f:
+        tickets = json.load(f)
+    if labels_file:
+        with open(labels_file, "r", encoding="utf-8") as f:
+            labels = {str(r["id"]): r["category"] for r in json.load(f)}
+    else:
+        labels = {str(t["id"]): t["category"] for t in tickets if "category" in t}
+    labelled = [t for t in tickets if str(t["id"]) in labels]
+    return labelled, [labels[str(t["id"])] for t in labelled]
+
+
+# evaluate() column -> (head, does the prediction agree with the LLM category)
+EVAL_AGREEMENT = {
+    "topic_primary": ("topic_tags", lambda p, c: p["topic_tags"][:1] == _label_lists(c, "topic_tags")[:1]),
+    "topic_exact": ("topic_tags", lambda p, c: set(p["topic_tags"]) == set(_label_lists(c, "topic_tags"))),
+    "sentiment": ("sentiment", lambda p, c: p["sentiment"] == c.get("sentiment")),
+    "priority": ("priority", lambda p, c: p["priority"] == c.get("priority")),
+}
+
+
+def evaluate(model: FastClassifier, embeddings, categories: list, thresholds=EVAL_THRESHOLDS) -> list:
+    """
+    Coverage and agreement with the LLM labels of the tickets the fast path would answer, per threshold.
+    Agreement is None for heads the model has no labels for.
+    """
+    predictions = model.predict(embeddings)
+    rows = []
+    for threshold in thresholds:
+        covered = [(p, c) for (p, confidence), c in zip(predictions, categories) if confidence >= threshold]
+        row = {"threshold": threshold, "coverage": round(len(covered) / max(1, len(categories)), 4)}
+        for column, (head, agrees) in EVAL_AGREEMENT.items():
+            if covered and head in model.heads:
+                row[column] = round(sum(agrees(p, c) for p, c in covered) / len(covered), 4)
+            else:
+                row[column] = None
+        rows.append(row)
+    return rows
+
+
+def _print_eval(rows):
+    print(f"{'threshold':>9} {'coverage':>8} {'topic1':>7} {'topics':>7} {'sentim':>7} {'prio':>7}")
+    for r in rows:
+        cells = [r[k] for k in EVAL_AGREEMENT]
+        print(f"{r['threshold']:>9} {r['coverage']:>8} " + " ".join(f"{'-' if c is None else c:>7}" for c in cells))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train or evaluate the fast-path ticket classifier")
+    parser.add_argument("--train", nargs="+", metavar="FILE", help="Tickets JSON [labels JSON]")
+    parser.add_argument("--eval", nargs="+", metavar="FILE", help="Tickets JSON [labels JSON]")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction held out to report agreement when training")
+    parser.add_argument("--model", default=FAST_CLASSIFIER_PATH, help="Classifier file to write (--train) or read (--eval)")
+    args = parser.parse_args()
+
+    if args.train:
+        tickets, categories = load_labelled(*args.train)
+        embeddings = embed([ticket_text(t) for t in tickets])
+        n_test = int(len(tickets) * args.holdout)
+        if n_test:
+            order = np.random.default_rng(0).permutation(len(tickets))
+            test, train = order[:n_test], order[n_test:]
+            held_out = FastClassifier.fit(embeddings[train], [categories[i] for i in train])
+            print(f"Agreement with the LLM on {n_test} held-out tickets:")
+            _print_eval(evaluate(held_out, embeddings[test], [categories[i] for i in test]))
+        model = FastClassifier.fit(embeddings, categories)
+        model.save(args.model)
+        print(f"Saved {args.model} ({len(tickets)} tickets; temperatures: "
+              f"{ {h: t for h, (_, _, t) in model.heads.items()} })")
+    elif args.eval:
+        tickets, categories = load_labelled(*args.eval)
+        model = FastClassifier.load(args.model)
+        print(f"Agreement with the LLM on {len(tickets)} tickets:")
+        _print_eval(evaluate(model, embed([ticket_text(t) for t in tickets]), categories))
+    else:
+        parser.print_help()
@@ -1,20 +1,47 @@
 import os
+import sys
 import json
-import requests
+import asyncio
 from dotenv import load_dotenv
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.chat_history import HistoryManager, HISTORY_TOKEN_BUDGET
+from sagents.llm_client import get_llm_client
+
 # Load env variables
 load_dotenv()
 
-HF_TOKEN = os.getenv("HF_TOKEN")
-HF_MODEL = os.getenv("HF_MODEL")
-API_URL = os.getenv("HF_API_URL")
-HEADERS = {"Authorization": f"Bearer {HF_TOKEN}"}
+SUMMARY_PROMPT = (
+    "Update the running summary of a helpdesk conversation. Keep every detail needed "
+    "to file a ticket: the product/feature, error messages, environment, steps already "
+    "tried and what the user wants. Reply with the updated summary only, in under 150 words."
+)
+
+
+async def _chat(messages: list, temperature: float, max_tokens: int = None, on_token=None) -> str:
+    llm = get_llm_client()
+    if on_token is None:
+        reply = await llm.chat(messages, temperature=temperature, max_tokens=max_tokens)
+        return reply.strip()
+
+    parts = []
+    async for delta in llm.chat_stream(messages, temperature=temperature, max_tokens=max_tokens):
+        parts.append(delta)
+        await on_token(delta)
+    return "".join(parts).strip()
+
+
+async def summarize_turns(summary: str, messages: list) -> str:
+    """Fold `messages` into the running conversation `summary`."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    return await _chat([
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ], temperature=0.2, max_tokens=256)
 
 
 class TicketExtractionAgent:
-    def __init__(self):
-        self.chat_history = []
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, max_turns: int = 0):
         # System prompt to enforce guardrails
         self.system_prompt = (
             "You are a helpdesk ticket extraction assistant. "
@@ -23,17 +50,41 @@ class TicketExtractionAgent:
             "If the user types 'done', you acknowledge and prepare a ticket summary. "
             "Always keep responses short and focused on understanding the issue."
         )
-        self.chat_history.append({"role": "system", "content": self.system_prompt})
+        # System prompt + running summary + recent turns, within token_budget and max_turns
+        self.history = HistoryManager(self.system_prompt, token_budget, summarize=summarize_turns,
+                                      max_turns=max_turns)
+
+    @property
+    def chat_history(self) -> list:
+        """Messages sent to the model on the next turn."""
+        return self.history.messages()
+
+    def to_state(self) -> dict:
+        """JSON-serializable state, for the session store."""
+        return {"history": self.history.to_state()}
+
+    @classmethod
+    def from_state(cls, state: dict, **kwargs) -> "TicketExtractionAgent":
+        agent = cls(**kwargs)
+        if "history" in state:
+            agent.history.load_state(state["history"])
+        else:
+            # sessions saved before history compaction
+            agent.history.turns = [m for m in state.get("chat_history", []) if m["role"] != "system"]
+        return agent
 
     def add_user_message(self, message: str):
-        self.chat_history.append({"role": "user", "content": message})
+        self.history.add("user", message)
 
     def add_assistant_message(self, message: str):
-        self.chat_history.append({"role": "assistant", "content": message})
+        self.history.add("assistant", message)
 
-    def converse(self, user_input: str) -> str:
+    async def converse(self, user_input: str, on_token=None) -> str:
         """
         Converse but never answer general questions.
+        With `on_token` (an async callable), the reply is streamed to it as it
+        is generated; the returned reply is authoritative (the guardrail may
+        replace it).
         """
         self.add_user_message(user_input)
 
@@ -41,17 +92,8 @@ class TicketExtractionAgent:
         if user_input.lower() in ["done", "exit", "quit"]:
             return "Preparing ticket summary..."
 
-        payload = {
-            "model": HF_MODEL,
-            "messages": self.chat_history,
-            "temperature": 0.5,
-        }
-
-        response = requests.post(API_URL, headers=HEADERS, json=payload)
-        if response.status_code != 200:
-            raise Exception(f"HF API Error: {response.status_code}, {response.text}")
-
-        reply = response.json()["choices"][0]["message"]["content"].strip()
+        await self.history.compact()
+        reply = await _chat(self.chat_history, temperature=0.5, on_token=on_token)
 
         # Enforce guardrail: do not let the assistant answer questions
         if any(word in reply.lower() for word in ["i can tell you", "here's how", "you should", "the answer is"]):
@@ -60,7 +102,7 @@ class TicketExtractionAgent:
         self.add_assistant_message(reply)
         return reply
 
-    def extract_ticket(self) -> dict:
+    async def extract_ticket(self) -> dict:
         """
         Generate the ticket subject and body from the conversation.
         """
@@ -73,19 +115,10 @@ class TicketExtractionAgent:
             "}\n"
             "Do NOT answer any questions from the conversation, only summarize into a ticket."
         )
-        self.add_user_message(prompt)
-
-        payload = {
-            "model": HF_MODEL,
-            "messages": self.chat_history,
-            "temperature": 0.2,
-        }
-
-        response = requests.post(API_URL, headers=HEADERS, json=payload)
-        if response.status_code != 200:
-            raise Exception(f"HF API Error: {response.status_code}, {response.text}")
-
-        raw_text = response.json()["choices"][0]["message"]["content"].strip()
+        await self.history.compact()
+        # The extraction prompt is sent once, not stored in the history
+        messages = self.history.messages(extra=[{"role": "user", "content": prompt}])
+        raw_text = await _chat(messages, temperature=0.2)
         try:
             ticket = json.loads(raw_text)
             return ticket
@@ -102,10 +135,10 @@ if __name__ == "__main__":
         if user_input.lower() in ["done", "exit", "quit"]:
             print("Assistant: Preparing ticket summary...\n")
             break
-        reply = agent.converse(user_input)
+        reply = asyncio.run(agent.converse(user_input))
         print(f"Assistant: {reply}")
 
-    ticket = agent.extract_ticket()
+    ticket = asyncio.run(agent.extract_ticket())
     print("\n✅ Extracted Ticket:")
     print(json.dumps(ticket, indent=2))
     print("\n✅ Extracted Ticket:")
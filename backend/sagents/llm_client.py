@@ -0,0 +1,242 @@
+# llm_client.py
+"""
+Shared async HTTP client for every agent that calls the HF router (or any
+OpenAI-compatible endpoint set via HF_API_URL, e.g. a local mock router).
+
+- one httpx.AsyncClient per event loop, with keep-alive pooling, closed on
+  that loop when it shuts down
+- connect/read timeouts on every call
+- retries with jittered exponential backoff on 429/5xx and transport
+  errors, honouring Retry-After
+- a semaphore capping requests in flight (LLM_MAX_CONCURRENCY)
+- llm_total / llm_ttfb stage timings and token counts (see metrics.py)
+
+Agents `await` it directly; nothing is pushed onto worker threads.
+"""
+import asyncio
+import json
+import os
+import random
+from typing import AsyncIterator, Optional
+
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+from sagents import metrics
+from sagents.chat_history import estimate_tokens
+
+load_dotenv()
+HF_TOKEN = os.getenv("HF_TOKEN")
+HF_MODEL = os.getenv("HF_MODEL")
+HF_API_URL = os.getenv("HF_API_URL", "https://router.huggingface.co/v1/chat/completions")
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))                # read/write/pool timeout, seconds
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 10))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))      # first retry waits up to this long
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8.0))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))   # requests in flight per process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 32))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def aiter_sse_deltas(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Yield `choices[0].delta.content` from OpenAI-style SSE lines until `data: [DONE]`."""
+    async for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        choices = chunk.get("choices") or []
+        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+        if delta:
+            yield delta
+
+
+class LLMClient:
+    def __init__(
+        self,
+        api_url: str = HF_API_URL,
+        token: Optional[str] = HF_TOKEN,
+        model: Optional[str] = HF_MODEL,
+        timeout: float = LLM_TIMEOUT,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+    ):
+        self.api_url = api_url
+        self.model = model
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._per_loop = {}  # event loop -> (AsyncClient, Semaphore, closer task)
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "in_flight": 0}
+
+    def _state(self):
+        # httpx clients and asyncio semaphores are bound to the loop that first uses them
+        loop = asyncio.get_running_loop()
+        state = self._per_loop.get(loop)
+        if state is None:
+            for old in [l for l in self._per_loop if l.is_closed()]:
+                del self._per_loop[old]  # closed without cancelling its tasks; nothing left to await on
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, headers=self.headers)
+            closer = loop.create_task(self._close_on_shutdown(loop, client))
+            state = self._per_loop[loop] = (client, asyncio.Semaphore(self.max_concurrency), closer)
+        return state[:2]
+
+    async def _close_on_shutdown(self, loop, client: httpx.AsyncClient):
+        """
+        Waits until `client`'s loop shuts down, then closes it on that loop.
+        asyncio.run (the server, a CLI entry point, a Streamlit rerun) cancels
+        pending tasks before closing its loop, which lands here.
+        """
+        try:
+            await loop.create_future()
+        finally:
+            state = self._per_loop.get(loop)
+            if state is not None and state[0] is client:
+                del self._per_loop[loop]
+            await client.aclose()
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after and retry_after.replace(".", "", 1).isdigit():
+                return min(float(retry_after), LLM_BACKOFF_MAX)
+        # full jitter: spreads retries from concurrent callers apart
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+    async def post(self, url: Optional[str] = None, content=None, **kwargs) -> httpx.Response:
+        """
+        POST with retries; returns the 2xx response or raises LLMError.
+        `content` may be a zero-argument callable returning a fresh (async)
+        byte iterator, so a streamed upload can be replayed on retry.
+        """
+        client, semaphore = self._state()
+        url = url or self.api_url
+        for attempt in range(self.max_retries + 1):
+            response, error = None, None
+            body = content() if callable(content) else content
+            async with semaphore:
+                self.stats["requests"] += 1
+                self.stats["in_flight"] += 1
+                try:
+                    response = await client.post(url, content=body, **kwargs)
+                except httpx.TransportError as e:  # includes timeouts
+                    error = e
+                finally:
+                    self.stats["in_flight"] -= 1
+
+            if response is not None and response.status_code < 400:
+                return response
+            retryable = error is not None or response.status_code in RETRY_STATUS
+            if not retryable or attempt >= self.max_retries:
+                self.stats["failures"] += 1
+                if error is not None:
+                    raise LLMError(f"HF API request failed: {type(error).__name__}: {error}") from error
+                raise LLMError(f"HF API Error: {response.status_code}, {response.text}", response.status_code)
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    def _chat_payload(self, messages, **options) -> dict:
+        payload = {"model": options.pop("model", None) or self.model, "messages": messages}
+        payload.update({k: v for k, v in options.items() if v is not None})
+        return payload
+
+    async def chat(self, messages: list, **options) -> str:
+        """Chat completion; options (temperature, max_tokens, response_format, ...) go into the payload."""
+        with metrics.span("llm_total"):
+            response = await self.post(json=self._chat_payload(messages, **options))
+        data = response.json()
+        content = data["choices"][0]["message"]["content"]
+        _count_tokens(messages, content, data.get("usage"))
+        return content
+
+    async def chat_stream(self, messages: list, **options) -> AsyncIterator[str]:
+        """Streaming chat completion yielding content deltas; retried only before the first delta."""
+        client, semaphore = self._state()
+        payload = self._chat_payload(messages, stream=True, **options)
+        start = time.perf_counter()
+        parts = []
+        for attempt in range(self.max_retries + 1):
+            started = False
+            retry_response = None
+            try:
+                async with semaphore:
+                    self.stats["requests"] += 1
+                    self.stats["in_flight"] += 1
+                    try:
+                        async with client.stream("POST", self.api_url, json=payload) as response:
+                            if response.status_code >= 400:
+                                await response.aread()
+                                if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                                    self.stats["failures"] += 1
+                                    raise LLMError(f"HF API Error: {response.status_code}, {response.text}",
+                                                   response.status_code)
+                                retry_response = response
+                            else:
+                                async for delta in aiter_sse_deltas(response.aiter_lines()):
+                                    if not started:
+                                        metrics.record_stage("llm_ttfb", time.perf_counter() - start)
+                                        started = True
+                                    parts.append(delta)
+                                    yield delta
+                                metrics.record_stage("llm_total", time.perf_counter() - start)
+                                _count_tokens(messages, "".join(parts))
+                                return
+                    finally:
+                        self.stats["in_flight"] -= 1
+            except httpx.TransportError as e:
+                if started or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise LLMError(f"HF API request failed: {type(e).__name__}: {e}") from e
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt, retry_response))
+
+    async def aclose(self):
+        """Close this loop's client now rather than at loop shutdown."""
+        state = self._per_loop.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            state[2].cancel()
+            await asyncio.gather(state[2], return_exceptions=True)
+
+
+def _count_tokens(messages: list, completion: str, usage: Optional[dict] = None):
+    """Token counters, from the response's usage when the endpoint reports it, else estimated."""
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    if prompt_tokens is None:
+        prompt_tokens = sum(estimate_tokens(m.get("content")) for m in messages)
+    completion_tokens = usage.get("completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(completion)
+    metrics.inc("llm_tokens_total", prompt_tokens, kind="prompt")
+    metrics.inc("llm_tokens_total", completion_tokens, kind="completion")
+
+
+_client = None
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide client used by the agents."""
+    global _client
+    if _client is None:
+        _client = LLMClient()
+    return _client
@@ -0,0 +1,176 @@
+# metrics.py
+"""
+In-process latency tracing and metrics, served in Prometheus text format at /metrics.
+
+- `span(stage)` times a block into support_stage_seconds{stage=...}
+  (embed, vector_search, prompt_build, llm_ttfb, llm_total, json_parse, ...)
+- `run_in_thread(stage, fn, ...)` is asyncio.to_thread that also records how
+  long the call waited for a worker thread (stage "queue_wait")
+- `trace(name, trace_id)` wraps one request. The MCP server opens one per
+  tool call, with the id from the request's _meta.trace_id when the client
+  sends one. Spans inside it are kept per trace, and traces slower than
+  TRACE_SLOW_SECONDS are logged with their per-stage breakdown.
+- `register_collector(fn)` adds values read at scrape time (cache hit
+  rates, LLM client counters, ...); names ending in _total are counters,
+  the rest gauges.
+"""
+import os
+import time
+import uuid
+import asyncio
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_PREFIX = "support"
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", 5.0))
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> [per-bucket counts..., +Inf count, sum]
+_collectors = []
+
+trace_id_var = ContextVar("trace_id", default=None)
+_trace_spans = ContextVar("trace_spans", default=None)  # [(stage, seconds)] of the current trace
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def inc(metric: str, value: float = 1.0, **labels):
+    key = (metric, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(metric: str, seconds: float, **labels):
+    key = (metric, _labels(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        hist[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        hist[-1] += seconds
+
+
+def record_stage(stage: str, seconds: float, **labels):
+    """Add a measured stage to support_stage_seconds and to the current trace."""
+    observe("stage_seconds", seconds, stage=stage, **labels)
+    spans = _trace_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))  # may come from a worker thread; list.append is atomic
+
+
+@contextmanager
+def span(stage: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, **labels)
+
+
+async def run_in_thread(stage: str, fn, *args, **kwargs):
+    """asyncio.to_thread(fn, ...) timed as `stage`, plus the wait for a free worker as "queue_wait"."""
+    submitted = time.perf_counter()
+
+    def run():
+        record_stage("queue_wait", time.perf_counter() - submitted, op=stage)
+        with span(stage):
+            return fn(*args, **kwargs)
+
+    return await asyncio.to_thread(run)  # copies the context, so the trace follows
+
+
+def current_trace_id():
+    return trace_id_var.get()
+
+
+@contextmanager
+def trace(name: str, trace_id: str = None):
+    """One traced request; yields its trace id (generated unless given)."""
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    id_token = trace_id_var.set(trace_id)
+    spans_token = _trace_spans.set([])
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield trace_id
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        spans = _trace_spans.get()
+        _trace_spans.reset(spans_token)
+        trace_id_var.reset(id_token)
+        observe("request_seconds", elapsed, request=name)
+        inc("requests_total", request=name, status=status)
+        if elapsed >= TRACE_SLOW_SECONDS:
+            breakdown = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in spans)
+            print(f"[trace] {trace_id} {name} {status} took {elapsed:.2f}s: {breakdown}")
+
+
+def register_collector(fn):
+    """`fn()` returns [(name, labels dict, value)], read on every scrape."""
+    _collectors.append(fn)
+    return fn
+
+
+# -----------------------------
+# Prometheus text format
+# -----------------------------
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _series(name, labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return f"{METRICS_PREFIX}_{name}"
+    return f"{METRICS_PREFIX}_{name}{{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(hist)) for key, hist in _histograms.items())
+
+    collected = []
+    for collector in _collectors:
+        try:
+            collected.extend((name, _labels(labels), value) for name, labels, value in collector()
+                             if value is not None)
+        except Exception as e:
+            print(f"[metrics] collector {getattr(collector, '__name__', collector)} failed: {e}")
+    gauges = sorted(collected, key=lambda item: (item[0], item[1]))
+
+    typed = set()
+    for name, labels, value, kind in ([(n, l, v, "counter") for (n, l), v in counters] +
+                                      [(n, l, v, "counter" if n.endswith("_total") else "gauge")
+                                       for n, l, v in gauges]):
+        if name not in typed:
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} {kind}")
+            typed.add(name)
+        lines.append(f"{_series(name, labels)} {_number(value)}")
+
+    for (name, labels), hist in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), hist[:-1]):
+            cumulative += count
+            le = bound if isinstance(bound, str) else _number(bound)
+            lines.append(f"{_series(name + '_bucket', labels, [('le', le)])} {cumulative}")
+        lines.append(f"{_series(name + '_sum', labels)} {_number(round(hist[-1], 6))}")
+        lines.append(f"{_series(name + '_count', labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,82 @@
+# orchestrator.py
+"""
+Server-side ticket pipeline: classify, then answer with RAG or route.
+
+Retrieval (query embedding + Chroma lookup) does not depend on the topic,
+so it starts speculatively alongside classification. If the ticket routes
+away from RAG, the retrieval result is dropped.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.classification_agent import classify_ticket
+from sagents.rag_qna_agent import generate_answer, retrieve
+from sagents.routing_agent import is_rag_topic, route_ticket
+from sagents.metrics import span
+
+# Start Chroma retrieval before the topic is known (set to 0 to disable)
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "1") == "1"
+
+speculation_stats = {"started": 0, "used": 0, "discarded": 0}
+
+
+def primary_topic(classification: dict) -> str:
+    topic_tags = classification.get("category", {}).get("topic_tags", [])
+    return topic_tags[0] if topic_tags else ""
+
+
+async def process_ticket(ticket_id: str, ticket_text: str, use_cache: bool = True, on_token=None) -> dict:
+    """
+    Classify a ticket and answer it (RAG) or route it, in one call.
+
+    Returns:
+        dict: {
+            "ticket_id": str,
+            "classification": {"id", "category"},
+            "final_response": {"type": "rag", "response", "sources", "cached"}
+                              or {"type": "routing", "message"}
+        }
+    """
+    ticket = {"id": ticket_id, "subject": ticket_text, "body": ticket_text}
+
+    retrieval = None
+    if SPECULATIVE_RETRIEVAL:
+        retrieval = asyncio.create_task(retrieve(ticket_text))
+        speculation_stats["started"] += 1
+
+    used = False
+    try:
+        with span("classify"):
+            classification = await classify_ticket(ticket, use_cache)
+        topic = primary_topic(classification)
+
+        if is_rag_topic(topic):
+            used = True
+            with span("rag_answer"):
+                answer = await generate_answer(
+                    ticket_id, topic, ticket_text, use_cache=use_cache, on_token=on_token, retrieval=retrieval
+                )
+            final_response = {
+                "type": "rag",
+                "response": answer.get("response", ""),
+                "sources": answer.get("sources", []),
+                "cached": answer.get("cached", False),
+            }
+        else:
+            routing = route_ticket(ticket_id, topic)
+            final_response = {"type": "routing", "message": routing.get("routing_message", "")}
+    finally:
+        if retrieval is not None:
+            speculation_stats["used" if used else "discarded"] += 1
+            if not used:
+                # Routed away (or classification failed): drop the speculative work.
+                # A retrieval already in its worker thread finishes there, unobserved.
+                if retrieval.done():
+                    if not retrieval.cancelled():
+                        retrieval.exception()  # mark any error as retrieved
+                else:
+                    retrieval.cancel()
+
+    return {"ticket_id": ticket_id, "classification": classification, "final_response": final_response}
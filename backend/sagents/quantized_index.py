@@ -0,0 +1,244 @@
+# quantized_index.py
+"""
+Read-only int8 vector index exported from the Chroma collection (RAG_INDEX=int8).
+
+Chroma keeps float32 vectors in an HNSW index that every server process
+loads privately. This index stores the same chunks compactly:
+
+  vectors.npy      int8[N, D]     per-dimension symmetric quantization of the unit-normalised embeddings
+  scales.npy       float32[D]     dequantization scale per dimension
+  docs.bin         UTF-8 chunk texts, back to back; docs_offsets.npy int64[N + 1]
+  meta.bin         one JSON object per chunk ({"id", "metadata"}); meta_offsets.npy int64[N + 1]
+
+Everything is memory-mapped, so replicas on one host share a single copy
+through the page cache and RSS doesn't grow with the index. Search is an
+exact (brute-force) inner product in numpy, a block of rows at a time;
+only the hits' texts and metadata are decoded.
+
+It is exported at the end of every ingest (see atlan_info.py), or from an
+existing store with:
+  python backend/sagents/quantized_index.py --export
+"""
+import os
+import sys
+import json
+import shutil
+import time
+
+import numpy as np
+
+INT8_DIR = os.path.join("backend/knowledge_base", "int8_index")
+EXPORT_READ_BATCH = 1000   # chunks read from Chroma per call
+SEARCH_BLOCK_ROWS = 4096   # rows dequantized at a time (bounds search and export scratch memory)
+RECALL_SAMPLE = 200        # stored vectors used as queries to report recall@10 at export
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors: np.ndarray, scales: np.ndarray = None):
+    """int8 codes and per-dimension scales such that vectors ~= codes * scales."""
+    if scales is None:
+        scales = _scales(np.abs(vectors).max(axis=0))
+    codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def _scales(max_abs: np.ndarray) -> np.ndarray:
+    scales = max_abs / 127.0
+    return np.where(scales > 0, scales, 1.0).astype(np.float32)
+
+
+def _top_k(weights: np.ndarray, vectors, k: int):
+    """Rows and scores (Q, k) of the largest `weights @ vectors.T` per query, best first.
+
+    Scores a block of SEARCH_BLOCK_ROWS vectors at a time and keeps only the
+    running top k, so scratch memory is O(Q * (k + block)) whatever the index size.
+    """
+    q = len(weights)
+    best_rows = np.empty((q, 0), dtype=np.int64)
+    best_scores = np.empty((q, 0), dtype=np.float32)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        block = vectors[start:start + SEARCH_BLOCK_ROWS]
+        scores = np.concatenate([best_scores, weights @ block.astype(np.float32).T], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + len(block)), (q, len(block)))],
+                              axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores, rows = np.take_along_axis(scores, keep, 1), np.take_along_axis(rows, keep, 1)
+        best_scores, best_rows = scores, rows
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, 1), np.take_along_axis(best_scores, order, 1)
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def export_int8_index(pages, count: int, out_dir=INT8_DIR):
+    """Write the index for up to `count` chunks and publish it atomically at `out_dir`.
+
+    `pages` yields (ids, embeddings, documents, metadatas) batches. Texts and
+    metadata are appended to disk as they arrive and the normalised float32
+    vectors go to a scratch memmap, so only one page is held in memory; the
+    int8 codes are then quantized from the scratch file a block at a time.
+    """
+    start = time.time()
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    scratch_path = os.path.join(tmp_dir, "float32.npy")
+
+    raw, max_abs, row = None, None, 0
+    docs_offsets = np.zeros(count + 1, dtype=np.int64)
+    meta_offsets = np.zeros(count + 1, dtype=np.int64)
+    with open(os.path.join(tmp_dir, "docs.bin"), "wb") as docs_f, \
+            open(os.path.join(tmp_dir, "meta.bin"), "wb") as meta_f:
+        for ids, embeddings, documents, metadatas in pages:
+            take = min(len(ids), count - row)   # the collection may have grown since count()
+            if take <= 0:
+                break
+            vectors = _normalize(np.asarray(embeddings[:take], dtype=np.float32).reshape(take, -1))
+            if raw is None:
+                raw = np.lib.format.open_memmap(scratch_path, mode="w+", dtype=np.float32,
+                                                shape=(count, vectors.shape[1]))
+                max_abs = np.zeros(vectors.shape[1], dtype=np.float32)
+            raw[row:row + take] = vectors
+            np.maximum(max_abs, np.abs(vectors).max(axis=0), out=max_abs)
+            for i in range(take):
+                doc = documents[i].encode("utf-8")
+                meta = json.dumps({"id": ids[i], "metadata": metadatas[i] or {}}).encode("utf-8")
+                docs_f.write(doc)
+                meta_f.write(meta)
+                docs_offsets[row + i + 1] = docs_offsets[row + i] + len(doc)
+                meta_offsets[row + i + 1] = meta_offsets[row + i] + len(meta)
+            row += take
+
+    np.save(os.path.join(tmp_dir, "docs_offsets.npy"), docs_offsets[:row + 1])
+    np.save(os.path.join(tmp_dir, "meta_offsets.npy"), meta_offsets[:row + 1])
+    dim = raw.shape[1] if raw is not None else 0
+    scales = _scales(max_abs) if raw is not None else np.ones(0, dtype=np.float32)
+    np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+    codes = np.lib.format.open_memmap(os.path.join(tmp_dir, "vectors.npy"), mode="w+", dtype=np.int8,
+                                      shape=(row, dim))
+    for block in range(0, row, SEARCH_BLOCK_ROWS):
+        codes[block:block + SEARCH_BLOCK_ROWS] = quantize(raw[block:min(block + SEARCH_BLOCK_ROWS, row)], scales)[0]
+    codes.flush()
+
+    recall = _recall_at_10(raw[:row], codes, scales) if row else None
+    del raw, codes  # close the memmaps before the scratch file goes
+    if os.path.exists(scratch_path):
+        os.remove(scratch_path)
+
+    old_dir = f"{out_dir}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    print(f"[int8] exported {row} chunks ({row * dim / 1e6:.1f} MB int8 vs "
+          f"{row * dim * 4 / 1e6:.1f} MB float32) in {time.time() - start:.1f}s, "
+          f"recall@10 vs float32: {recall} -> {out_dir}")
+
+
+def _recall_at_10(vectors, codes, scales, k=10):
+    rng = np.random.default_rng(0)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(RECALL_SAMPLE, len(vectors)), replace=False))])
+    k = min(k, len(vectors))
+    exact, _ = _top_k(sample, vectors, k)
+    approx, _ = _top_k(sample * scales, codes, k)
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+    return round(hits / exact.size, 4)
+
+
+def _collection_pages(collection):
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"],
+                              limit=EXPORT_READ_BATCH, offset=offset)
+        if not page["ids"]:
+            return
+        yield page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+        offset += len(page["ids"])
+
+
+def export_from_collection(collection, out_dir=INT8_DIR):
+    """Export every chunk currently in the Chroma collection, one page at a time."""
+    export_int8_index(_collection_pages(collection), collection.count(), out_dir)
+
+
+# -----------------------------
+# Query
+# -----------------------------
+class Int8Index:
+    def __init__(self, index_dir=INT8_DIR):
+        load = lambda name: np.load(os.path.join(index_dir, name), mmap_mode="r")
+        self.vectors = load("vectors.npy")
+        self.scales = np.array(load("scales.npy"))
+        self.docs_offsets = load("docs_offsets.npy")
+        self.meta_offsets = load("meta_offsets.npy")
+        self.docs = np.memmap(os.path.join(index_dir, "docs.bin"), dtype=np.uint8, mode="r") \
+            if self.docs_offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self.meta = np.memmap(os.path.join(index_dir, "meta.bin"), dtype=np.uint8, mode="r") \
+            if self.meta_offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self._rows = None  # chunk id -> row, built on first get()
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _doc(self, row):
+        return bytes(self.docs[self.docs_offsets[row]:self.docs_offsets[row + 1]]).decode("utf-8")
+
+    def _meta(self, row):
+        return json.loads(bytes(self.meta[self.meta_offsets[row]:self.meta_offsets[row + 1]]))
+
+    def search(self, query_embedding, top_k: int = 5):
+        """(ids, documents, metadatas) of the `top_k` chunks by cosine similarity."""
+        return self.search_batch([query_embedding], top_k)[0]
+
+    def search_batch(self, query_embeddings, top_k: int = 5):
+        """search() for many queries with one pass over the vectors; a list of (ids, documents, metadatas)."""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        n = len(self.vectors)
+        if n == 0:
+            return [([], [], []) for _ in queries]
+        rows, _ = _top_k(_normalize(queries) * self.scales, self.vectors, min(top_k, n))
+        results = []
+        for query_rows in rows:
+            metas = [self._meta(r) for r in query_rows]
+            results.append(([m["id"] for m in metas], [self._doc(r) for r in query_rows],
+                            [m["metadata"] for m in metas]))
+        return results
+
+    def get(self, ids):
+        """(ids, documents, metadatas) for the chunk ids present in the index."""
+        if self._rows is None:
+            self._rows = {self._meta(r)["id"]: r for r in range(len(self.vectors))}
+        rows = [self._rows[i] for i in ids if i in self._rows]
+        metas = [self._meta(r) for r in rows]
+        return [m["id"] for m in metas], [self._doc(r) for r in rows], [m["metadata"] for m in metas]
+
+
+def load_int8_index(index_dir=INT8_DIR):
+    """The index at `index_dir`, or None if it hasn't been exported yet."""
+    if not os.path.exists(os.path.join(index_dir, "vectors.npy")):
+        return None
+    return Int8Index(index_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the int8 index from Chroma")
+    parser.add_argument("--export", action="store_true", help="Export from the Chroma collection")
+    args = parser.parse_args()
+
+    if args.export:
+        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+        from sagents.rag_qna_agent import get_collection
+        export_from_collection(get_collection())
+    else:
+        index = load_int8_index()
+        print(f"{INT8_DIR}: {len(index) if index else 'not exported'} chunks")
@@ -1,40 +1,319 @@
 import os
-import requests
-import chromadb
-from chromadb.utils import embedding_functions
+import sys
+import asyncio
+import threading
+import numpy as np
 from dotenv import load_dotenv
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sagents.embedder import embed, EMBEDDING_MODEL_NAME
+from sagents.cache import LRUCache, SemanticCache, MISSING
+from sagents.llm_client import get_llm_client
+from sagents.bm25_index import load_bm25_index, reciprocal_rank_fusion
+from sagents.quantized_index import load_int8_index, INT8_DIR
+from sagents.reranker import rerank, RERANK_CANDIDATES
+from sagents.metrics import span, run_in_thread
+
 # Load ENV vars
 load_dotenv()
-HF_TOKEN = os.getenv("HF_TOKEN")
-HF_MODEL = os.getenv("HF_MODEL")  # llama-v3p1-8b-instruct
-HF_API_URL = os.getenv("HF_API_URL")
 PERSIST_DIR = os.path.join("backend/knowledge_base", "vectorstore_chroma")
 
-# Initialize Chroma client
-client = chromadb.PersistentClient(path=PERSIST_DIR)
-collection = client.get_collection("atlan_docs")
+CHROMA_COLLECTION_NAME = "atlan_docs"
+# Rewritten by knowledge_base/atlan_info.py after every ingest
+KB_VERSION_FILE = os.path.join(PERSIST_DIR, "kb_version.txt")
+
+# Level 1: exact query text -> embedding
+RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", 2048))
+# Level 2: semantically similar query (same topic) -> previous answer + sources
+RAG_ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", 512))
+RAG_ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", 0.95))
+RAG_ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", 24 * 3600))
 
-# Embedding function (must match what we used for DB creation)
-embed_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="sentence-transformers/all-MiniLM-L12-v2"
+query_embedding_cache = LRUCache(maxsize=RAG_QUERY_CACHE_SIZE)
+answer_cache = SemanticCache(
+    maxsize=RAG_ANSWER_CACHE_SIZE,
+    threshold=RAG_ANSWER_CACHE_THRESHOLD,
+    ttl=RAG_ANSWER_CACHE_TTL,
 )
+_answer_cache_kb_version = None
+
+# Hybrid retrieval: dense and BM25 candidates fused by reciprocal rank
+RAG_HYBRID = os.getenv("RAG_HYBRID", "1") == "1"       # used only once the BM25 index is built
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", 20))  # per retriever, before fusion
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", 60))
+DEFAULT_RETRIEVAL_WEIGHTS = {
+    "dense": float(os.getenv("RAG_DENSE_WEIGHT", 1.0)),
+    "bm25": float(os.getenv("RAG_BM25_WEIGHT", 1.0)),
+}
+# Dense index: "chroma" (HNSW, float32) or "int8" (memory-mapped export, see quantized_index.py)
+RAG_INDEX = os.getenv("RAG_INDEX", "chroma")
+# Cross-encoder rerank of a wider candidate set, trimmed to a prompt token budget (see reranker.py)
+RAG_RERANK = os.getenv("RAG_RERANK", "0") == "1"
+# Concurrent LLM calls in generate_answers_batch
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", 8))
+
+# Chroma is opened on first use (or by warm_up), not at import time
+_collection = None
+_collection_lock = threading.Lock()
+
+
+
+class _KBIndex:
+    """A memory-mapped index exported at ingest; reloaded when the knowledge base is re-ingested."""
+
+    def __init__(self, load):
+        self.load = load
+        self.value = MISSING
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = kb_version()
+        if self.value is MISSING or version != self.version:
+            with self.lock:
+                if self.value is MISSING or version != self.version:
+                    self.value = self.load()
+                    self.version = version
+        return self.value
+
+
+_bm25 = _KBIndex(load_bm25_index)
+_int8 = _KBIndex(load_int8_index)
+
+
+def get_collection():
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                import chromadb  # not needed at all by RAG_INDEX=int8 replicas
+                client = chromadb.PersistentClient(path=PERSIST_DIR)
+                _collection = client.get_collection(CHROMA_COLLECTION_NAME)
+    return _collection
+
+
+def get_bm25():
+    """The BM25 index, or None if it hasn't been built."""
+    return _bm25.get()
+
+
+def get_int8_index():
+    index = _int8.get()
+    if index is None:
+        raise RuntimeError(f"RAG_INDEX=int8 but nothing is exported at {INT8_DIR}; "
+                           "run backend/sagents/quantized_index.py --export")
+    return index
+
+
+def warm_up():
+    """Open the collection and run one query so the first real ticket doesn't stall."""
+    search_context("warm up", top_k=1)
+
+
+def kb_version():
+    """Changes whenever the knowledge base is re-ingested."""
+    try:
+        return os.stat(KB_VERSION_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+def invalidate_answer_cache():
+    """Drop every cached answer (e.g. after the knowledge base is re-ingested)."""
+    answer_cache.clear()
+
+
+def _check_kb_version():
+    global _answer_cache_kb_version
+    version = kb_version()
+    if version != _answer_cache_kb_version:
+        if _answer_cache_kb_version is not None:
+            print("[rag] knowledge base changed; clearing answer cache")
+        invalidate_answer_cache()
+        _answer_cache_kb_version = version
+
+
+def _answer_cache_tag(topic, top_k, weights):
+    """Answers are only reused for the same topic and retrieval settings (top_k, fusion weights)."""
+    weights = {**DEFAULT_RETRIEVAL_WEIGHTS, **(weights or {})}
+    return topic, top_k, weights["dense"], weights["bm25"]
+
+
+def embed_query(query):
+    """Embed a query, memoized on the exact (whitespace-normalized) text."""
+    return embed_queries([query])[0]
+
+
+def embed_queries(queries):
+    """Embed many queries in one forward pass (only those not already memoized)."""
+    keys = [(EMBEDDING_MODEL_NAME, " ".join(q.split())) for q in queries]
+    embeddings = [query_embedding_cache.get(key) for key in keys]
+    misses = {}  # key -> query, deduplicated
+    for key, query, embedding in zip(keys, queries, embeddings):
+        if embedding is MISSING:
+            misses.setdefault(key, query)
+    if misses:
+        with span("embed"):
+            new_embeddings = embed(list(misses.values()))
+        computed = dict(zip(misses, new_embeddings))
+        for key, embedding in computed.items():
+            query_embedding_cache.set(key, embedding)
+        # fill from what was just computed: re-reading the LRU would count extra hits,
+        # and a batch larger than the cache would find its own early entries evicted
+        embeddings = [computed[key] if e is MISSING else e for key, e in zip(keys, embeddings)]
+    return np.asarray(embeddings)
+
+
+def cache_stats():
+    return {
+        "query_embedding": query_embedding_cache.stats(),
+        "answer": answer_cache.stats(),
+    }
+
+
+def _dense_search_batch(query_embeddings, n_results):
+    """One kNN call for all queries; [(ids, documents, metadatas)] per query."""
+    if RAG_INDEX == "int8":
+        index = get_int8_index()
+        with span("vector_search", index="int8"):
+            return index.search_batch(query_embeddings, n_results)
+    collection = get_collection()
+    with span("vector_search", index="chroma"):
+        results = collection.query(
+            query_embeddings=np.asarray(query_embeddings).tolist(),
+            n_results=n_results
+        )
+    return list(zip(results["ids"], results["documents"], results["metadatas"]))
+
 
-def query_chroma(query, top_k=3):
-    results = collection.query(
-        query_texts=[query],   # <- only this
-        n_results=top_k
-    )
-    docs = results["documents"][0]
-    sources = results["metadatas"][0]
-    return docs, sources
-
-def generate_answer(ticket_id: str, topic: str, query: str, top_k: int = 5):
-    """RAG pipeline: retrieve + synthesize answer."""
-    docs, sources = query_chroma(query, top_k=top_k)
-    context_text = "\n\n".join(docs)
-
-    prompt = f"""
+def _get_chunks(ids):
+    """(ids, documents, metadatas) for chunk ids, from the configured dense index."""
+    if RAG_INDEX == "int8":
+        return get_int8_index().get(ids)
+    found = get_collection().get(ids=ids, include=["documents", "metadatas"])
+    return found["ids"], found["documents"], found["metadatas"]
+
+
+def query_chroma(query, top_k=3, query_embedding=None):
+    return query_chroma_batch([query], top_k, None if query_embedding is None else [query_embedding])[0]
+
+
+def query_chroma_batch(queries, top_k=3, query_embeddings=None):
+    # Dense search over RAG_INDEX. Embed with the shared MiniLM-L12 model the
+    # store was built with, rather than letting Chroma fall back to its
+    # default embedding function.
+    if query_embeddings is None:
+        query_embeddings = embed_queries(queries)
+    return [(docs, sources) for _, docs, sources in _dense_search_batch(query_embeddings, top_k)]
+
+
+def hybrid_search(query, top_k=3, query_embedding=None, weights=None):
+    """
+    Dense + BM25 retrieval fused by reciprocal rank; returns (docs, sources).
+    `weights` ({"dense": w, "bm25": w}) override DEFAULT_RETRIEVAL_WEIGHTS for
+    this request. Dense only if RAG_HYBRID is off or no BM25 index is built.
+    """
+    return hybrid_search_batch([query], top_k, None if query_embedding is None else [query_embedding], weights)[0]
+
+
+def hybrid_search_batch(queries, top_k=3, query_embeddings=None, weights=None):
+    """hybrid_search for many queries, with one dense kNN call and one chunk lookup."""
+    weights = {**DEFAULT_RETRIEVAL_WEIGHTS, **(weights or {})}
+    bm25 = get_bm25() if RAG_HYBRID and weights["bm25"] > 0 else None
+    if bm25 is None:
+        return query_chroma_batch(queries, top_k, query_embeddings)
+
+    depth = max(top_k, RAG_CANDIDATES)
+    chunks = {}
+    dense = [([], [], [])] * len(queries)
+    if weights["dense"] > 0:
+        if query_embeddings is None:
+            query_embeddings = embed_queries(queries)
+        dense = _dense_search_batch(query_embeddings, depth)
+
+    rankings = []
+    for query, (dense_ids, docs, metas) in zip(queries, dense):
+        chunks.update(zip(dense_ids, zip(docs, metas)))
+        with span("bm25_search"):
+            lexical_ids = [chunk_id for chunk_id, _ in bm25.search(query, depth)]
+        rankings.append(reciprocal_rank_fusion(
+            {"dense": dense_ids, "bm25": lexical_ids}, weights, RAG_RRF_K)[:top_k])
+
+    missing = list(dict.fromkeys(i for fused in rankings for i in fused if i not in chunks))
+    if missing:
+        found_ids, found_docs, found_metas = _get_chunks(missing)
+        chunks.update(zip(found_ids, zip(found_docs, found_metas)))
+    results = []
+    for fused in rankings:
+        fused = [chunk_id for chunk_id in fused if chunk_id in chunks]  # skip ids deleted since the index was built
+        results.append(([chunks[i][0] for i in fused], [chunks[i][1] for i in fused]))
+    return results
+
+
+def search_context(query, top_k=3, query_embedding=None, weights=None):
+    """Passages for the prompt: hybrid retrieval, then the rerank stage if RAG_RERANK is on."""
+    return search_context_batch([query], top_k, None if query_embedding is None else [query_embedding], weights)[0]
+
+
+def search_context_batch(queries, top_k=3, query_embeddings=None, weights=None):
+    if not RAG_RERANK:
+        return hybrid_search_batch(queries, top_k, query_embeddings, weights)
+    candidates = hybrid_search_batch(queries, max(top_k, RERANK_CANDIDATES), query_embeddings, weights)
+    with span("rerank"):
+        return [rerank(query, docs, sources, top_k) for query, (docs, sources) in zip(queries, candidates)]
+
+
+async def retrieve(query: str, top_k: int = 5, weights=None):
+    """Embed the query and fetch context; returns (query_embedding, docs, sources)."""
+    return (await retrieve_batch([query], top_k, weights))[0]
+
+
+async def retrieve_batch(queries: list, top_k: int = 5, weights=None):
+    """retrieve() for many queries: one embedding forward pass and one kNN search for all of them."""
+    # Embedding and Chroma are CPU/disk bound; keep them off the event loop
+    query_embeddings = await run_in_thread("embed_queries", embed_queries, queries)
+    contexts = await run_in_thread("search_context", search_context_batch, queries, top_k, query_embeddings, weights)
+    return [(embedding, docs, sources) for embedding, (docs, sources) in zip(query_embeddings, contexts)]
+
+
+async def generate_answer(ticket_id: str, topic: str, query: str, top_k: int = 5, use_cache: bool = True,
+                          on_token=None, retrieval=None, weights=None):
+    """
+    RAG pipeline: retrieve + synthesize answer.
+    With `on_token` (an async callable), the answer is streamed to it chunk by
+    chunk (a cached answer arrives as a single chunk).
+    `retrieval` is an optional awaitable of retrieve(query, top_k) that was
+    started earlier (e.g. speculatively, while the ticket was being classified).
+    `weights` set the dense/BM25 fusion weights for this request (see hybrid_search).
+    """
+    if retrieval is not None:
+        query_embedding, docs, sources = await retrieval
+    else:
+        query_embedding = await run_in_thread("embed_queries", embed_query, query)
+        docs = sources = None
+
+    cache_tag = _answer_cache_tag(topic, top_k, weights)
+    if use_cache:
+        _check_kb_version()
+        hit = answer_cache.lookup(query_embedding, tag=cache_tag)
+        if hit is not None:
+            cached, similarity = hit
+            if on_token is not None:
+                await on_token(cached["response"])
+            return {
+                "ticket_id": ticket_id,
+                "response": cached["response"],
+                "sources": list(cached["sources"]),
+                "cached": True,
+                "similarity": round(similarity, 4),
+            }
+
+    if docs is None:
+        docs, sources = await run_in_thread("search_context", search_context, query, top_k, query_embedding, weights)
+
+    with span("prompt_build"):
+        context_text = "\n\n".join(docs)
+        prompt = f"""
 You are an AI support assistant for Atlan. 
 A customer asked the following question:
 
@@ -49,37 +328,69 @@ Always cite the most relevant sources.
 
 Answer:
 """
-
-    headers = {"Authorization": f"Bearer {HF_TOKEN}"}
-    payload = {
-        "model": HF_MODEL,   # e.g. meta-llama/Llama-3.1-8B-Instruct:cerebras
-        "messages": [
+        messages = [
             {"role": "system", "content": "You are a helpful support assistant for Atlan."},
             {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 300,
-    }
-
-    response = requests.post(
-        HF_API_URL,   # should be: https://router.huggingface.co/v1/chat/completions
-        headers=headers,
-        json=payload
-    )
-
-    if response.status_code != 200:
-        raise RuntimeError(f"HuggingFace API error: {response.text}")
-
-    generated = response.json()["choices"][0]["message"]["content"].strip()
+        ]
 
+    llm = get_llm_client()
+    if on_token is not None:
+        parts = []
+        async for delta in llm.chat_stream(messages, max_tokens=300):
+            parts.append(delta)
+            await on_token(delta)
+        generated = "".join(parts).strip()
+    else:
+        generated = (await llm.chat(messages, max_tokens=300)).strip()
 
     source_urls = [s["source"] for s in sources if "source" in s]
+    unique_sources = list(dict.fromkeys(source_urls))[:3]  # unique, preserve order
+
+    if use_cache:
+        answer_cache.add(query_embedding, {"response": generated, "sources": unique_sources}, tag=cache_tag)
 
     return {
         "ticket_id": ticket_id,
         "response": generated,
-        "sources": list(dict.fromkeys(source_urls))[:3]  # unique, preserve order
+        "sources": unique_sources,
+        "cached": False,
     }
 
+async def _resolved(value):
+    return value
+
+
+async def generate_answers_batch(tickets: list, top_k: int = 5, use_cache: bool = True, generate: bool = True,
+                                 concurrency: int = RAG_BATCH_CONCURRENCY, weights=None) -> list:
+    """
+    RAG for many tickets ({"ticket_id", "topic", "query"}) at once.
+    All queries are embedded in one forward pass and searched with one kNN call;
+    then up to `concurrency` answers are generated at a time (generate_answer per
+    ticket, so the answer cache applies). With generate=False, only the
+    per-ticket context is returned: {"ticket_id", "context", "sources"}.
+    Results are in input order; a failed ticket gets {"ticket_id", "error"}.
+    """
+    if not tickets:
+        return []
+    retrievals = await retrieve_batch([t["query"] for t in tickets], top_k, weights)
+    if not generate:
+        return [{"ticket_id": t["ticket_id"], "context": docs, "sources": sources}
+                for t, (_, docs, sources) in zip(tickets, retrievals)]
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(ticket, retrieval):
+        async with semaphore:
+            try:
+                return await generate_answer(ticket["ticket_id"], ticket.get("topic", ""), ticket["query"],
+                                             top_k=top_k, use_cache=use_cache,
+                                             retrieval=_resolved(retrieval), weights=weights)
+            except Exception as e:
+                return {"ticket_id": ticket["ticket_id"], "error": f"{type(e).__name__}: {e}"}
+
+    return await asyncio.gather(*(one(t, r) for t, r in zip(tickets, retrievals)))
+
+
 # Quick test
 if __name__ == "__main__":
     test_ticket = {
@@ -87,5 +398,5 @@ if __name__ == "__main__":
         "topic": "Lineage",
         "query": "Which connectors automatically capture lineage?"
     }
-    result = generate_answer(**test_ticket)
+    result = asyncio.run(generate_answer(**test_ticket))
     print(result)
@@ -0,0 +1,110 @@
+# reranker.py
+"""
+Optional second retrieval stage (RAG_RERANK=1).
+
+First-stage retrieval returns a wide candidate set (RERANK_CANDIDATES). A
+small CPU cross-encoder scores (query, passage) pairs in batches, and the best
+passages are kept up to RAG_CONTEXT_TOKEN_BUDGET prompt tokens, so the LLM
+sees a couple of relevant chunks instead of five raw ones.
+
+Scoring has a hard latency budget (RERANK_LATENCY_BUDGET_MS). A batch can't be
+interrupted once the model is running, so after the first one each batch is
+cut to the pairs that fit in the time left, at the slowest per-pair rate seen so
+far. When the budget runs out, the candidates keep their first-stage order and
+only the token budget is applied.
+"""
+import os
+import threading
+import time
+
+from sagents.chat_history import estimate_tokens
+
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 8))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", 256))           # tokens per (query, passage) pair
+RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", 250))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", 1200))
+
+_model = None
+_lock = threading.Lock()
+
+rerank_stats = {"calls": 0, "fallbacks": 0, "scored": 0, "total_ms": 0.0}
+
+
+def get_reranker():
+    """The shared CrossEncoder, loaded on first use."""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+
+                start = time.perf_counter()
+                _model = CrossEncoder(RERANK_MODEL_NAME, max_length=RERANK_MAX_LENGTH, device="cpu")
+                print(f"[rerank] loaded {RERANK_MODEL_NAME} in {time.perf_counter() - start:.2f}s")
+    return _model
+
+
+def score_passages(query: str, docs: list, latency_budget_ms: float = RERANK_LATENCY_BUDGET_MS,
+                   batch_size: int = RERANK_BATCH_SIZE):
+    """Cross-encoder scores for `docs`, or None if they couldn't all be scored within the budget."""
+    model = get_reranker()  # loading doesn't count against the budget
+    deadline = time.perf_counter() + latency_budget_ms / 1000.0
+    scores, per_pair = [], 0.0
+    while len(scores) < len(docs):
+        now = time.perf_counter()
+        size = batch_size
+        if per_pair:
+            size = min(size, int((deadline - now) / per_pair))  # what still fits in the budget
+        if size <= 0:
+            return None
+        pairs = [(query, doc) for doc in docs[len(scores):len(scores) + size]]
+        scores.extend(float(s) for s in model.predict(pairs, batch_size=batch_size, show_progress_bar=False))
+        per_pair = max(per_pair, (time.perf_counter() - now) / len(pairs))
+    return None if time.perf_counter() > deadline else scores
+
+
+def pack_passages(order: list, docs: list, top_k: int, token_budget: int) -> list:
+    """Indices from `order` that fit in `token_budget` (at most `top_k`; always at least one)."""
+    kept, used = [], 0
+    for i in order:
+        cost = estimate_tokens(docs[i])
+        if kept and used + cost > token_budget:
+            continue  # a shorter passage further down may still fit
+        kept.append(i)
+        used += cost
+        if len(kept) >= top_k:
+            break
+    return kept
+
+
+def rerank(query: str, docs: list, sources: list, top_k: int = 5,
+           token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+           latency_budget_ms: float = RERANK_LATENCY_BUDGET_MS):
+    """Reorder first-stage (docs, sources) by cross-encoder score and trim them to the token budget."""
+    if not docs:
+        return docs, sources
+    start = time.perf_counter()
+    try:
+        scores = score_passages(query, docs, latency_budget_ms)
+    except Exception as e:
+        print(f"[rerank] scoring failed, keeping retrieval order: {e}")
+        scores = None
+
+    if scores is None:
+        rerank_stats["fallbacks"] += 1
+        order = list(range(len(docs)))
+    else:
+        rerank_stats["scored"] += len(docs)
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+    kept = pack_passages(order, docs, top_k, token_budget)
+
+    rerank_stats["calls"] += 1
+    rerank_stats["total_ms"] += (time.perf_counter() - start) * 1000
+    return [docs[i] for i in kept], [sources[i] for i in kept]
+
+
+def stats() -> dict:
+    calls = rerank_stats["calls"]
+    return {**rerank_stats, "avg_ms": round(rerank_stats["total_ms"] / calls, 1) if calls else None}
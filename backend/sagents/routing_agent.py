@@ -1,11 +1,17 @@
 # routing_agent.py
+
+# Topics RAG agent handles; everything else is routed to a team
+RAG_TOPICS = frozenset({"How-to", "Product", "Best practices", "API/SDK", "SSO"})
+
+
+def is_rag_topic(topic: str) -> bool:
+    return topic in RAG_TOPICS
+
+
 def route_ticket(ticket_id: str, topic: str) -> dict:
     """Route tickets that are outside the RAG scope."""
 
-    # Topics RAG agent handles
-    rag_topics = {"How-to", "Product", "Best practices", "API/SDK", "SSO"}
-
-    if topic not in rag_topics:
+    if not is_rag_topic(topic):
         routing_message = (
             f"This ticket has been classified as a '{topic}' issue "
             f"and routed to the appropriate team."
@@ -0,0 +1,208 @@
+# session_store.py
+"""
+Bounded store for Live QnA sessions.
+
+Sessions are stored as JSON-serializable state dicts (see
+TicketExtractionAgent.to_state / from_state), so the same code works with:
+
+- MemorySessionBackend: in-process, LRU ordered
+- SQLiteSessionBackend: on-disk (WAL), survives restarts and is shared by
+  every worker process pointing at the same file
+
+SessionStore adds the policies on top of a backend: idle TTL (sessions not
+saved for `ttl` seconds are dropped), a maximum session count with LRU
+eviction, and counters reported through `stats()`.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # memory | sqlite
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "backend/sessions.sqlite")
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", 30 * 60))
+SESSION_MAX = int(os.getenv("SESSION_MAX", 1000))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", 40))  # verbatim turns per session; older ones are summarized
+SESSION_SWEEP_INTERVAL = 60.0  # seconds between idle sweeps
+
+
+class MemorySessionBackend:
+    def __init__(self):
+        self._data = OrderedDict()  # session_id -> (updated_at, state, size_bytes)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            self._data.move_to_end(session_id)
+            return entry[0], entry[1]
+
+    def put(self, session_id, state: dict, updated_at: float):
+        size = len(json.dumps(state))
+        with self._lock:
+            self._data[session_id] = (updated_at, state, size)
+            self._data.move_to_end(session_id)
+
+    def delete(self, session_id) -> bool:
+        with self._lock:
+            return self._data.pop(session_id, None) is not None
+
+    def expire(self, before: float) -> int:
+        """Drop sessions last saved before `before`."""
+        with self._lock:
+            expired = [sid for sid, (updated_at, _, _) in self._data.items() if updated_at < before]
+            for sid in expired:
+                del self._data[sid]
+            return len(expired)
+
+    def evict_lru(self, keep: int) -> int:
+        """Drop least-recently-used sessions until at most `keep` remain."""
+        evicted = 0
+        with self._lock:
+            while len(self._data) > keep:
+                self._data.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def count(self) -> int:
+        return len(self._data)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(size for _, _, size in self._data.values())
+
+
+class SQLiteSessionBackend:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._conn.commit()
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at, state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, session_id, state: dict, updated_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), updated_at),
+            )
+            self._conn.commit()
+
+    def delete(self, session_id) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+            return cur.rowcount > 0
+
+    def expire(self, before: float) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (before,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def evict_lru(self, keep: int) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (keep,),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(LENGTH(state)), 0) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    def __init__(self, backend, ttl: Optional[float] = SESSION_TTL_SECONDS,
+                 max_sessions: int = SESSION_MAX, max_messages: int = SESSION_MAX_MESSAGES):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._last_sweep = 0.0
+        self.counters = {"created": 0, "saved": 0, "completed": 0, "expired": 0, "evicted": 0,
+                         "hits": 0, "misses": 0}
+
+    def _is_expired(self, updated_at: float, now: float) -> bool:
+        return bool(self.ttl) and updated_at < now - self.ttl
+
+    def sweep(self, force: bool = False) -> int:
+        """Drop idle sessions; runs at most every SESSION_SWEEP_INTERVAL unless forced."""
+        now = time.time()
+        if not self.ttl or (not force and now - self._last_sweep < SESSION_SWEEP_INTERVAL):
+            return 0
+        self._last_sweep = now
+        expired = self.backend.expire(now - self.ttl)
+        self.counters["expired"] += expired
+        return expired
+
+    def get(self, session_id) -> Optional[dict]:
+        """Return the session's state, or None if it is unknown or has expired."""
+        self.sweep()
+        entry = self.backend.get(session_id)
+        if entry is not None:
+            updated_at, state = entry
+            if not self._is_expired(updated_at, time.time()):
+                self.counters["hits"] += 1
+                return state
+            self.backend.delete(session_id)
+            self.counters["expired"] += 1
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, session_id, state: dict, new: bool = False):
+        self.backend.put(session_id, state, time.time())
+        self.counters["saved"] += 1
+        if new:
+            self.counters["created"] += 1
+            self.counters["evicted"] += self.backend.evict_lru(self.max_sessions)
+
+    def delete(self, session_id):
+        if self.backend.delete(session_id):
+            self.counters["completed"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "active_sessions": self.backend.count(),
+            "state_bytes": self.backend.size_bytes(),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl,
+            "max_messages": self.max_messages,
+            **self.counters,
+        }
+
+
+def create_session_store(backend: str = SESSION_BACKEND, db_path: str = SESSION_DB_PATH) -> SessionStore:
+    """Build the store configured by SESSION_BACKEND / SESSION_DB_PATH."""
+    if backend == "sqlite":
+        return SessionStore(SQLiteSessionBackend(db_path))
+    if backend == "memory":
+        return SessionStore(MemorySessionBackend())
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
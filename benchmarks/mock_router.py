@@ -0,0 +1,143 @@
+# mock_router.py
+"""
+Local OpenAI-compatible chat-completions server for offline benchmarks.
+
+Point the backend at it with HF_API_URL=http://127.0.0.1:8199/v1/chat/completions.
+Every response waits --ttfb-ms (plus up to --jitter of it) before the first
+token, then produces words at --tokens-per-second, streamed (SSE) or not.
+The content is shaped by the prompt, so the real agents parse it:
+
+- classification (single or packed "results" batches): JSON labels picked
+  from keywords in the ticket, so they are stable across runs
+- Live QnA ticket extraction: {"subject", "body"} JSON
+- anything else: filler text of max_tokens words (default --answer-tokens)
+
+--error-rate answers that fraction of requests with a 503 to exercise retries.
+
+  python benchmarks/mock_router.py --port 8199 --ttfb-ms 300 --tokens-per-second 80
+"""
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+TOPIC_KEYWORDS = [
+    ("Lineage", ("lineage", "upstream", "downstream")),
+    ("SSO", ("sso", "saml", "okta", "login")),
+    ("API/SDK", ("api", "sdk", "python client", "endpoint")),
+    ("Glossary", ("glossary", "term", "business definition")),
+    ("Sensitive data", ("pii", "sensitive", "masking", "gdpr")),
+    ("Connector", ("snowflake", "connector", "crawler", "fivetran", "databricks")),
+    ("Best practices", ("best practice", "recommend", "governance model")),
+    ("How-to", ("how do i", "how to", "steps")),
+]
+FILLER = ("Atlan supports this through the connector settings and the documentation describes "
+          "each step in detail including permissions lineage and troubleshooting").split()
+
+stats = {"requests": 0, "streamed": 0, "errors_injected": 0, "completion_tokens": 0}
+
+
+def label_ticket(text: str) -> dict:
+    lowered = text.lower()
+    topics = [topic for topic, words in TOPIC_KEYWORDS if any(w in lowered for w in words)][:2] or ["Product"]
+    if any(w in lowered for w in ("urgent", "blocked", "critical", "asap")):
+        sentiment, priority = "Frustrated", "P0 (High)"
+    elif "?" in text:
+        sentiment, priority = "Curious", "P1 (Medium)"
+    else:
+        sentiment, priority = "Neutral", "P2 (Low)"
+    return {"topic_tags": topics, "sentiment": sentiment, "priority": priority}
+
+
+def reply_for(body: dict, answer_tokens: int) -> str:
+    messages = body.get("messages") or []
+    prompt = messages[-1].get("content", "") if messages else ""
+    if body.get("response_format", {}).get("type") == "json_object":
+        if "Tickets:" in prompt and '"results"' in prompt:
+            packed = prompt.split("Tickets:", 1)[1].rsplit("Rules:", 1)[0]
+            tickets = json.loads(packed)
+            return json.dumps({"results": [
+                {"id": t["id"], **label_ticket(f"{t.get('subject', '')} {t.get('body', '')}")} for t in tickets
+            ]})
+        match = re.search(r"Ticket Subject:(.*)Ticket Body:(.*?)Rules:", prompt, re.S)
+        return json.dumps(label_ticket(" ".join(match.groups()) if match else prompt))
+    if "extracts ticket info" in prompt:
+        users = [m["content"] for m in messages if m.get("role") == "user"][:-1]
+        return json.dumps({"subject": (users[0] if users else "Support request")[:60],
+                           "body": " ".join(users) or "No details provided."})
+    n = int(body.get("max_tokens") or answer_tokens)
+    return " ".join(FILLER[i % len(FILLER)] for i in range(n))
+
+
+def make_app(ttfb_ms: float, tokens_per_second: float, jitter: float, error_rate: float,
+             answer_tokens: int, seed: int) -> Starlette:
+    rng = random.Random(seed)
+
+    async def completions(request):
+        body = await request.json()
+        stats["requests"] += 1
+        if error_rate and rng.random() < error_rate:
+            stats["errors_injected"] += 1
+            return JSONResponse({"error": "injected"}, status_code=503)
+
+        words = reply_for(body, answer_tokens).split(" ")
+        stats["completion_tokens"] += len(words)
+        usage = {"prompt_tokens": sum(len(m.get("content") or "") // 4 for m in body.get("messages") or []),
+                 "completion_tokens": len(words)}
+        ttfb = ttfb_ms / 1000.0 * (1 + rng.uniform(0, jitter))
+        per_token = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttfb + per_token * len(words))
+            return JSONResponse({"object": "chat.completion", "model": body.get("model"),
+                                 "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                                              "finish_reason": "stop"}],
+                                 "usage": usage})
+
+        stats["streamed"] += 1
+
+        async def events():
+            await asyncio.sleep(ttfb)
+            for i, word in enumerate(words):
+                delta = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+                yield f"data: {json.dumps(delta)}\n\n"
+                await asyncio.sleep(per_token)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "started_at": started_at, **stats})
+
+    started_at = time.time()
+    return Starlette(routes=[
+        Route("/v1/chat/completions", completions, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+    ])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8199)
+    parser.add_argument("--ttfb-ms", type=float, default=300.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Generation speed (0 = instant)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Extra TTFB of up to this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="Answer length when max_tokens is unset")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = make_app(args.ttfb_ms, args.tokens_per_second, args.jitter, args.error_rate, args.answer_tokens, args.seed)
+    print(f"[mock_router] http://{args.host}:{args.port}/v1/chat/completions "
+          f"(ttfb {args.ttfb_ms}ms, {args.tokens_per_second} tok/s)", file=sys.stderr)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
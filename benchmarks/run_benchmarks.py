@@ -0,0 +1,487 @@
+# run_benchmarks.py
+"""
+End-to-end benchmarks: the real MCP server, driven over SSE, against the
+local mock LLM router (mock_router.py), with synthetic tickets.
+
+Scenarios:
+  single  process_ticket_tool, one ticket at a time
+  bulk    process_ticket_tool, --concurrency tickets in flight (like the Bulk Tickets page)
+  live    Live QnA sessions: --turns streamed turns each, then "done" (ticket extraction)
+  rag     rag_tool only, streamed, --concurrency in flight
+
+Each scenario reports throughput, p50/p95/p99 latency, time to first token
+for streamed calls, and the server's RSS. It also reports the mean time
+per pipeline stage, read from the server's /metrics before and after.
+
+  python benchmarks/run_benchmarks.py                      # all scenarios, fresh server + router
+  python benchmarks/run_benchmarks.py --save-baseline      # write benchmarks/baseline.json
+  python benchmarks/run_benchmarks.py --compare            # exit 1 on a regression vs the baseline
+
+The server needs a built knowledge base (backend/knowledge_base/atlan_info.py)
+for the RAG scenarios. Run from the repository root.
+"""
+import os
+import re
+import sys
+import json
+import time
+import math
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from common.mcp_client import SupportMCPPool
+from synthetic_tickets import generate_tickets
+
+SCENARIOS = ("single", "bulk", "live", "rag")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+RSS_SAMPLE_SECONDS = 0.2
+FOLLOW_UPS = [
+    "It started after we rotated the service account credentials.",
+    "We are on the enterprise plan, in the EU region.",
+    "The error mentions insufficient privileges on the schema.",
+]
+# (metric path, True if higher is better) compared against the baseline
+CHECKS = [
+    ("throughput_rps", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("ttft_ms.p95", False),
+    ("server_rss_mb.peak", False),
+]
+
+
+# -----------------------------
+# Processes
+# -----------------------------
+def start_process(cmd, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_http(url, timeout, proc=None, log_path=None):
+    """GET `url` until it answers 200; returns the JSON body."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            tail = open(log_path).read()[-2000:] if log_path else ""
+            raise RuntimeError(f"{' '.join(proc.args)} exited with {proc.returncode}:\n{tail}")
+        try:
+            response = httpx.get(url, timeout=2)
+            if response.status_code == 200:
+                return response.json()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def stop_process(proc):
+    if proc is not None and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def rss_mb(pid):
+    """Current resident set size of `pid` in MB (Linux /proc), or None."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, TypeError):
+        return None
+    return None
+
+
+class RSSSampler:
+    """Samples a process's RSS on a background thread while a scenario runs."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            value = rss_mb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            self._stop.wait(RSS_SAMPLE_SECONDS)
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return None
+        return {"start": round(self.samples[0], 1), "end": round(self.samples[-1], 1),
+                "peak": round(max(self.samples), 1)}
+
+
+# -----------------------------
+# Server-side stage timings (/metrics)
+# -----------------------------
+STAGE_RE = re.compile(r'^support_stage_seconds_(sum|count)\{(.*)\} (\S+)$')
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def scrape_stages(base_url):
+    """{stage: [sum_seconds, count]} from the server's /metrics ({} if unavailable)."""
+    try:
+        text = httpx.get(f"{base_url}/metrics", timeout=5).text
+    except httpx.HTTPError:
+        return {}
+    stages = {}
+    for line in text.splitlines():
+        m = STAGE_RE.match(line)
+        if not m:
+            continue
+        labels = dict(LABEL_RE.findall(m.group(2)))
+        key = labels.get("stage", "?") + (f":{labels['op']}" if "op" in labels else "")
+        if "index" in labels:
+            key += f":{labels['index']}"
+        stages.setdefault(key, [0.0, 0])[0 if m.group(1) == "sum" else 1] += float(m.group(3))
+    return stages
+
+
+def stage_deltas(before, after):
+    deltas = {}
+    for stage, (total, count) in after.items():
+        prev_total, prev_count = before.get(stage, (0.0, 0))
+        if count > prev_count:
+            deltas[stage] = {"count": int(count - prev_count),
+                             "mean_ms": round((total - prev_total) / (count - prev_count) * 1000, 2)}
+    return dict(sorted(deltas.items(), key=lambda item: -item[1]["mean_ms"] * item[1]["count"]))
+
+
+# -----------------------------
+# Scenarios (run on the pool's event loop)
+# -----------------------------
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.ttfts = []
+        self.errors = []
+
+    async def call(self, pool, tool, payload, trace_id, timeout, stream=False):
+        start = time.perf_counter()
+        ttft, result = None, None
+        try:
+            if stream:
+                async def consume():
+                    nonlocal ttft, result
+                    async for kind, value in pool.stream_tool(tool, {**payload, "stream": True}, trace_id):
+                        if kind == "token" and ttft is None:
+                            ttft = time.perf_counter() - start
+                        elif kind == "result":
+                            result = value
+                await asyncio.wait_for(consume(), timeout)
+            else:
+                result = await asyncio.wait_for(pool.call_tool(tool, payload, trace_id), timeout)
+        except Exception as e:
+            self.errors.append(f"{tool}: {type(e).__name__}: {e}")
+            return None
+        if result is None or result.isError:
+            text = result.content[0].text if result is not None and result.content else ""
+            self.errors.append(f"{tool}: {text[:200]}")
+            return None
+        self.latencies.append(time.perf_counter() - start)
+        if ttft is not None:
+            self.ttfts.append(ttft)
+        return result
+
+
+async def _bounded(items, concurrency, fn):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(i, item):
+        async with semaphore:
+            await fn(i, item)
+
+    await asyncio.gather(*(one(i, item) for i, item in enumerate(items)))
+
+
+def _ticket_text(ticket):
+    return f"{ticket['subject']}\n\n{ticket['body']}"
+
+
+async def scenario_single(pool, rec, tickets, args):
+    for i, ticket in enumerate(tickets):
+        await rec.call(pool, "process_ticket_tool",
+                       {"ticket_id": ticket["id"], "ticket_text": _ticket_text(ticket), "use_cache": args.use_cache},
+                       f"bench-single-{i}", args.timeout)
+
+
+async def scenario_bulk(pool, rec, tickets, args):
+    async def one(i, ticket):
+        await rec.call(pool, "process_ticket_tool",
+                       {"ticket_id": ticket["id"], "ticket_text": _ticket_text(ticket), "use_cache": args.use_cache},
+                       f"bench-bulk-{i}", args.timeout)
+
+    await _bounded(tickets, args.concurrency, one)
+
+
+async def scenario_live(pool, rec, tickets, args):
+    sessions = tickets[:args.sessions]
+
+    async def one(i, ticket):
+        session_id = f"bench-live-{args.seed}-{i}-{time.time_ns()}"
+        inputs = [ticket["body"]] + FOLLOW_UPS[:max(0, args.turns - 1)]
+        for turn, text in enumerate(inputs):
+            if await rec.call(pool, "live_qna_tool", {"session_id": session_id, "user_input": text},
+                              f"{session_id}-{turn}", args.timeout, stream=True) is None:
+                return
+        await rec.call(pool, "live_qna_tool", {"session_id": session_id, "user_input": "done"},
+                       f"{session_id}-done", args.timeout)
+
+    await _bounded(sessions, args.concurrency, one)
+
+
+async def scenario_rag(pool, rec, tickets, args):
+    async def one(i, ticket):
+        await rec.call(pool, "rag_tool",
+                       {"ticket_id": ticket["id"], "topic": ticket.get("topic") or "Product",
+                        "query": _ticket_text(ticket), "use_cache": args.use_cache},
+                       f"bench-rag-{i}", args.timeout, stream=True)
+
+    await _bounded(tickets, args.concurrency, one)
+
+
+SCENARIO_FUNCS = {"single": scenario_single, "bulk": scenario_bulk, "live": scenario_live, "rag": scenario_rag}
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def distribution_ms(values):
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50) * 1000, 1),
+        "p95": round(percentile(values, 95) * 1000, 1),
+        "p99": round(percentile(values, 99) * 1000, 1),
+        "mean": round(sum(values) / len(values) * 1000, 1),
+        "max": round(max(values) * 1000, 1),
+    }
+
+
+def summarize(rec, wall_seconds, rss, stages):
+    return {
+        "requests": len(rec.latencies) + len(rec.errors),
+        "errors": len(rec.errors),
+        "error_samples": rec.errors[:5],
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(rec.latencies) / wall_seconds, 3) if wall_seconds > 0 else None,
+        "latency_ms": distribution_ms(rec.latencies),
+        "ttft_ms": distribution_ms(rec.ttfts),
+        "server_rss_mb": rss,
+        "stages": stages,
+    }
+
+
+def print_summary(name, s):
+    lat = s["latency_ms"] or {}
+    ttft = s["ttft_ms"] or {}
+    rss = s["server_rss_mb"] or {}
+    print(f"\n== {name}: {s['requests']} requests, {s['errors']} errors, {s['wall_seconds']}s, "
+          f"{s['throughput_rps']} req/s")
+    print(f"   latency ms  p50 {lat.get('p50')}  p95 {lat.get('p95')}  p99 {lat.get('p99')}  max {lat.get('max')}")
+    if ttft:
+        print(f"   first token p50 {ttft.get('p50')}  p95 {ttft.get('p95')}  p99 {ttft.get('p99')}")
+    if rss:
+        print(f"   server RSS MB start {rss['start']}  peak {rss['peak']}  end {rss['end']}")
+    for stage, d in list(s["stages"].items())[:8]:
+        print(f"   {stage:<32} {d['count']:>6} x {d['mean_ms']:>9.2f} ms")
+    for error in s["error_samples"]:
+        print(f"   ! {error}")
+
+
+def _lookup(summary, path):
+    value = summary
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(results, baseline, tolerance):
+    """Print current vs baseline per scenario; returns the regressions beyond `tolerance`."""
+    regressions = []
+    if baseline.get("config") != results.get("config"):
+        print("\n[compare] warning: baseline was recorded with a different config:")
+        print(f"   baseline {json.dumps(baseline.get('config'), sort_keys=True)}")
+        print(f"   current  {json.dumps(results.get('config'), sort_keys=True)}")
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        print(f"\n[compare] {name}")
+        for path, higher_is_better in CHECKS:
+            old, new = _lookup(base, path), _lookup(current, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            print(f"   {path:<20} {old:>10} -> {new:<10} {change * 100:+7.1f}%  {flag}")
+            if flag:
+                regressions.append(f"{name} {path}: {old} -> {new}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -----------------------------
+# Main
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against the MCP server")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--tickets", type=int, default=40, help="Tickets per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight (bulk, live, rag)")
+    parser.add_argument("--sessions", type=int, default=8, help="Live QnA sessions")
+    parser.add_argument("--turns", type=int, default=3, help="Streamed turns per Live QnA session before 'done'")
+    parser.add_argument("--pool-size", type=int, default=4, help="MCP sessions in the client pool")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout, seconds")
+    parser.add_argument("--use-cache", action="store_true", help="Let the server answer from its caches")
+    parser.add_argument("--server-url", help="Benchmark an already running server (its /sse URL) instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of that server, to sample its RSS")
+    parser.add_argument("--server-port", type=int, default=8765)
+    parser.add_argument("--router-port", type=int, default=8199)
+    parser.add_argument("--router-ttfb-ms", type=float, default=300.0)
+    parser.add_argument("--router-tps", type=float, default=80.0, help="Mock router tokens per second")
+    parser.add_argument("--router-jitter", type=float, default=0.2)
+    parser.add_argument("--router-error-rate", type=float, default=0.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Write the full results JSON here")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare with the baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative change before a regression")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    config = {k: getattr(args, k) for k in ("tickets", "seed", "concurrency", "sessions", "turns", "pool_size",
+                                            "use_cache", "router_ttfb_ms", "router_tps", "router_jitter",
+                                            "router_error_rate")}
+    log_dir = tempfile.mkdtemp(prefix="support-bench-")
+    router = server = None
+    server_pid = args.server_pid
+    try:
+        if args.server_url:
+            server_url = args.server_url
+        else:
+            env = dict(os.environ, PYTHONUNBUFFERED="1")
+            router_log = os.path.join(log_dir, "router.log")
+            router = start_process([sys.executable, "benchmarks/mock_router.py", "--port", str(args.router_port),
+                                    "--ttfb-ms", str(args.router_ttfb_ms), "--tokens-per-second", str(args.router_tps),
+                                    "--jitter", str(args.router_jitter), "--error-rate", str(args.router_error_rate),
+                                    "--seed", str(args.seed)], env, router_log)
+            wait_http(f"http://127.0.0.1:{args.router_port}/health", 30, router, router_log)
+
+            env.update(HF_API_URL=f"http://127.0.0.1:{args.router_port}/v1/chat/completions",
+                       HF_MODEL=os.getenv("HF_MODEL") or "mock-model", HF_TOKEN="mock", PORT=str(args.server_port))
+            server_log = os.path.join(log_dir, "server.log")
+            print(f"[bench] starting server (logs in {log_dir})")
+            server = start_process([sys.executable, "backend/main_mcp_server.py"], env, server_log)
+            server_pid = server.pid
+            server_url = f"http://127.0.0.1:{args.server_port}/sse"
+
+        base_url = server_url.rsplit("/sse", 1)[0]
+        health = wait_http(f"{base_url}/health", args.startup_timeout, server,
+                           os.path.join(log_dir, "server.log"))
+        deadline = time.time() + args.startup_timeout
+        while not health.get("embedder_loaded") and time.time() < deadline:
+            time.sleep(1)  # don't measure the embedding model load as request latency
+            health = wait_http(f"{base_url}/health", args.startup_timeout)
+        print(f"[bench] server ready: startup {health.get('startup')}")
+
+        pool = SupportMCPPool(server_url, size=args.pool_size)
+        results = {
+            "meta": {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                     "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")},
+            "config": config,
+            "scenarios": {},
+        }
+        try:
+            pool.run(pool.connect(), timeout=60)
+            # one untimed call so lazily loaded state (BM25/int8 index, reranker) is in place
+            pool.run(Recorder().call(pool, "rag_tool", {"ticket_id": "warmup", "topic": "Product",
+                                                        "query": "warm up", "use_cache": False},
+                                     "bench-warmup", args.timeout))
+            for name in scenarios:
+                tickets = generate_tickets(args.tickets, seed=args.seed)
+                rec = Recorder()
+                before = scrape_stages(base_url)
+                with RSSSampler(server_pid) as sampler:
+                    start = time.perf_counter()
+                    pool.run(SCENARIO_FUNCS[name](pool, rec, tickets, args))
+                    wall = time.perf_counter() - start
+                summary = summarize(rec, wall, sampler.summary(), stage_deltas(before, scrape_stages(base_url)))
+                results["scenarios"][name] = summary
+                print_summary(name, summary)
+        finally:
+            pool.close()
+    finally:
+        stop_process(server)
+        stop_process(router)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[bench] results written to {args.output}")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[bench] baseline saved to {args.baseline}")
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline}; run with --save-baseline first")
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n[compare] {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\n[compare] no regressions")
+
+
+if __name__ == "__main__":
+    main()
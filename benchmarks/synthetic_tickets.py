@@ -0,0 +1,108 @@
+# synthetic_tickets.py
+"""
+Seeded synthetic support tickets for benchmarks.
+
+Tickets are built from per-topic templates, with varied products, tones
+and lengths. The three real tickets in data/sample_ticket.json are
+included, so the same seed and count always give the same set.
+
+  python benchmarks/synthetic_tickets.py -n 200 -o /tmp/tickets.json
+"""
+import os
+import json
+import random
+import argparse
+
+SAMPLE_TICKETS = os.path.join(os.path.dirname(__file__), "..", "data", "sample_ticket.json")
+
+SOURCES = ["Snowflake", "Databricks", "BigQuery", "Redshift", "Postgres", "Tableau", "Looker", "Power BI", "dbt", "Fivetran"]
+TEMPLATES = {
+    "How-to": [
+        ("How do I {action} in Atlan?", "I'm trying to {action} for our {source} assets but can't find where to start. What are the steps?"),
+        ("Steps to {action}", "Could you walk me through how to {action}? We have a few hundred {source} tables."),
+    ],
+    "Connector": [
+        ("{source} connector failing", "Our {source} crawler keeps failing with a permissions error after the last credential rotation. {urgency}"),
+        ("Which permissions does the {source} connector need?", "We are setting up {source} as a new source. What grants does the service account need?"),
+    ],
+    "Lineage": [
+        ("Missing lineage from {source}", "Upstream lineage for our {source} models stops at the staging layer. Is column-level lineage supported? {urgency}"),
+        ("Does {source} lineage work automatically?", "Which of our connectors capture lineage out of the box? We mostly use {source}."),
+    ],
+    "SSO": [
+        ("SSO login loop with Okta", "After enabling SAML SSO, users are redirected back to the login page. {urgency}"),
+        ("Setting up SSO groups", "How do SSO group mappings translate into Atlan personas?"),
+    ],
+    "API/SDK": [
+        ("Bulk update via the Python SDK", "What is the recommended way to update descriptions for thousands of {source} assets with the SDK or API?"),
+        ("API returns 401", "Our integration calling the REST API endpoint started returning 401 today. {urgency}"),
+    ],
+    "Glossary": [
+        ("Importing glossary terms", "We have 800 business glossary terms in a spreadsheet. Can we bulk import them and link them to {source} columns?"),
+    ],
+    "Sensitive data": [
+        ("Tagging PII columns", "How can we automatically tag PII and apply masking policies on {source}? Compliance needs this for GDPR."),
+    ],
+    "Best practices": [
+        ("Best practices for ownership", "What governance model do you recommend for assigning owners across {source} and {source2}?"),
+    ],
+    "Product": [
+        ("Search results look stale", "Assets we deleted in {source} last week still show up in search."),
+        ("Feature question about {source} previews", "Is there a way to disable data previews for a single {source} schema?"),
+    ],
+}
+ACTIONS = ["certify assets", "add a custom metadata field", "set up a persona", "export asset lists", "announce a deprecation"]
+URGENCY = ["", "", "This is blocking our rollout, quite urgent.", "Our BI team is blocked, please help ASAP.", "Not critical, whenever you can."]
+PADDING = [
+    "We are on the enterprise plan.",
+    "This worked fine until last Tuesday.",
+    "I checked the documentation but couldn't find a clear answer.",
+    "Our security team needs to review any changes first.",
+    "Happy to share screenshots if useful.",
+]
+
+
+def load_sample_tickets(path: str = SAMPLE_TICKETS) -> list:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return []
+
+
+def generate_tickets(n: int, seed: int = 0, include_samples: bool = True) -> list:
+    """`n` tickets {"id", "subject", "body", "topic"}; deterministic for a given seed."""
+    rng = random.Random(seed)
+    tickets = [{**t, "topic": None} for t in load_sample_tickets()][:n] if include_samples else []
+    topics = sorted(TEMPLATES)
+    while len(tickets) < n:
+        topic = rng.choice(topics)
+        subject, body = rng.choice(TEMPLATES[topic])
+        source, source2 = rng.sample(SOURCES, 2)
+        fields = {"action": rng.choice(ACTIONS), "source": source, "source2": source2, "urgency": rng.choice(URGENCY)}
+        body = body.format(**fields).strip()
+        # vary length: some one-liners, some with a paragraph of context
+        body = " ".join([body] + rng.sample(PADDING, rng.randint(0, 3)))
+        tickets.append({
+            "id": f"BENCH-{seed}-{len(tickets):05d}",
+            "subject": subject.format(**fields),
+            "body": body,
+            "topic": topic,
+        })
+    return tickets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic support tickets")
+    parser.add_argument("-n", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    tickets = generate_tickets(args.n, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(tickets, f, indent=2)
+        print(f"Wrote {len(tickets)} tickets to {args.output}")
+    else:
+        print(json.dumps(tickets, indent=2))
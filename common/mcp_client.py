@@ -1,9 +1,21 @@
 # mcp_client.py (moved to common)
 import asyncio
+import itertools
+import json
+import queue
+import threading
 from contextlib import AsyncExitStack
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Iterable, Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
 from mcp import ClientSession
 from mcp.client.sse import sse_client
+from mcp.shared.exceptions import McpError
+
+def _trace_meta(trace_id: Optional[str]) -> Optional[dict]:
+    return {"trace_id": trace_id} if trace_id else None
+
 
 class SupportMCPClient:
     def __init__(self, server_url: str = "http://localhost:8000/sse"):
@@ -12,23 +24,54 @@ class SupportMCPClient:
         self.exit_stack = AsyncExitStack()
         self.tools = {}
 
-    async def connect(self):
+    async def connect(self, list_tools: bool = True):
         self._streams_context = sse_client(url=self.server_url)
         streams = await self._streams_context.__aenter__()
         self._session_context = ClientSession(*streams)
         self.session = await self._session_context.__aenter__()
         await self.session.initialize()
 
-        tools = await self.session.list_tools()
-        self.tools = {tool.name: tool for tool in tools.tools}
+        # Pooled connections reuse the tool list fetched by the first one
+        if list_tools:
+            tools = await self.session.list_tools()
+            self.tools = {tool.name: tool for tool in tools.tools}
         print("✅ Connected. Tools:", list(self.tools.keys()))
 
-    async def run_tool(self, tool_name: str, input_dict: dict[str, Any]):
+    async def run_tool(self, tool_name: str, input_dict: dict[str, Any], trace_id: Optional[str] = None):
+        """Run a tool; `trace_id` is sent as _meta.trace_id and tags the server's metrics trace and slow-call log."""
         if not self.session:
             raise RuntimeError("Not connected to MCP session.")
-        response = await self.session.call_tool(tool_name, input_dict)
+        response = await self.session.call_tool(tool_name, input_dict, meta=_trace_meta(trace_id))
         return response
 
+    async def stream_tool(self, tool_name: str, input_dict: dict[str, Any],
+                          trace_id: Optional[str] = None) -> AsyncIterator[tuple[str, Any]]:
+        """
+        Run a tool, yielding ("token", text) for each progress message the
+        server sends while it runs, then ("result", CallToolResult).
+        Tools stream only when asked to (e.g. {"stream": True} in input_dict).
+        """
+        if not self.session:
+            raise RuntimeError("Not connected to MCP session.")
+        events = asyncio.Queue()
+
+        async def on_progress(progress, total, message):
+            if message:
+                events.put_nowait(("token", message))
+
+        call = asyncio.create_task(
+            self.session.call_tool(tool_name, input_dict, progress_callback=on_progress,
+                                   meta=_trace_meta(trace_id))
+        )
+        # Progress notifications are handled before the response, so this lands last
+        call.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            yield ("result", call.result())
+        finally:
+            call.cancel()
+
     async def list_resources(self):
         resources = await self.session.list_resources()
         return resources.resources
@@ -38,3 +81,224 @@ class SupportMCPClient:
             await self._session_context.__aexit__(None, None, None)
         if hasattr(self, "_streams_context"):
             await self._streams_context.__aexit__(None, None, None)
+
+
+class _PooledConnection:
+    """A SupportMCPClient kept open by its own task until `stop` is set."""
+
+    def __init__(self, index: int, client: SupportMCPClient):
+        self.index = index
+        self.client = client
+        self.stop = asyncio.Event()
+        self.alive = False
+        self.task: Optional[asyncio.Task] = None
+
+
+class SupportMCPPool:
+    """
+    Long-lived, reconnecting pool of MCP sessions.
+
+    The pool owns a background event loop, so sessions outlive any single
+    `asyncio.run` call (e.g. a Streamlit rerun). Tool calls are spread
+    round-robin over `size` sessions; each session multiplexes concurrent
+    requests, so callers may run several tools at once. A session that fails
+    mid-call is dropped, reopened and the call retried `max_retries` times.
+    """
+
+    def __init__(
+        self,
+        server_url: str = "http://localhost:8000/sse",
+        size: int = 2,
+        max_retries: int = 1,
+        connect_timeout: float = 15.0,
+    ):
+        self.server_url = server_url
+        self.size = max(1, size)
+        self.max_retries = max_retries
+        self.connect_timeout = connect_timeout
+        self.tools = {}
+
+        self._slots: list[Optional[_PooledConnection]] = [None] * self.size
+        self._slot_locks = [asyncio.Lock() for _ in range(self.size)]
+        self._next_slot = itertools.count()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="mcp-pool", daemon=True
+        )
+        self._thread.start()
+
+    # -----------------------------
+    # Connection management (runs on the pool loop)
+    # -----------------------------
+    async def _open(self, index: int) -> _PooledConnection:
+        conn = _PooledConnection(index, SupportMCPClient(server_url=self.server_url))
+        ready = asyncio.get_running_loop().create_future()
+
+        # anyio requires the SSE/session contexts to be entered and exited in
+        # the same task, so each connection lives inside one holder task.
+        async def hold():
+            try:
+                await conn.client.connect(list_tools=not self.tools)
+                if conn.client.tools:
+                    self.tools = conn.client.tools
+                conn.alive = True
+                ready.set_result(conn)
+                await conn.stop.wait()
+            except BaseException as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                raise
+            finally:
+                conn.alive = False
+                try:
+                    await conn.client.cleanup()
+                except BaseException:
+                    pass
+
+        conn.task = asyncio.create_task(hold())
+        # Failures after start-up surface through `alive`; don't log them twice
+        conn.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        try:
+            return await asyncio.wait_for(asyncio.shield(ready), self.connect_timeout)
+        except BaseException:
+            conn.stop.set()
+            raise
+
+    async def _acquire(self, fresh: bool = False) -> _PooledConnection:
+        index = next(self._next_slot) % self.size
+        async with self._slot_locks[index]:
+            conn = self._slots[index]
+            if fresh and conn is not None:
+                self._discard(conn)
+                conn = None
+            if conn is None or not conn.alive:
+                conn = await self._open(index)
+                self._slots[index] = conn
+            return conn
+
+    def _discard(self, conn: _PooledConnection):
+        if self._slots[conn.index] is conn:
+            self._slots[conn.index] = None
+        conn.stop.set()
+
+    async def connect(self):
+        """Open every slot up front (optional; slots also open lazily)."""
+        await asyncio.gather(*(self._acquire() for _ in range(self.size)))
+
+    async def call_tool(self, tool_name: str, input_dict: dict[str, Any], trace_id: Optional[str] = None):
+        """Run a tool on a pooled session, reconnecting if the session has failed."""
+        for attempt in range(self.max_retries + 1):
+            # Retries always get a new session: when the server restarts every
+            # pooled session is dead, not just the one that failed first.
+            conn = await self._acquire(fresh=attempt > 0)
+            try:
+                return await conn.client.run_tool(tool_name, input_dict, trace_id)
+            except McpError:
+                # The server answered; the session itself is fine.
+                raise
+            except Exception:
+                self._discard(conn)
+                if attempt >= self.max_retries:
+                    raise
+
+    async def stream_tool(self, tool_name: str, input_dict: dict[str, Any],
+                          trace_id: Optional[str] = None) -> AsyncIterator[tuple[str, Any]]:
+        """Streaming call_tool (see SupportMCPClient.stream_tool); retried only before the first event."""
+        for attempt in range(self.max_retries + 1):
+            conn = await self._acquire(fresh=attempt > 0)
+            started = False
+            try:
+                async for event in conn.client.stream_tool(tool_name, input_dict, trace_id):
+                    started = True
+                    yield event
+                return
+            except McpError:
+                raise
+            except Exception:
+                self._discard(conn)
+                if started or attempt >= self.max_retries:
+                    raise
+
+    async def list_tools(self) -> dict:
+        if not self.tools:
+            await self._acquire()
+        return self.tools
+
+    async def aclose(self):
+        conns = [c for c in self._slots if c is not None]
+        for conn in conns:
+            self._discard(conn)
+        await asyncio.gather(*(c.task for c in conns if c.task), return_exceptions=True)
+
+    # -----------------------------
+    # Sync helpers for callers without a running loop (Streamlit)
+    # -----------------------------
+    def submit(self, coro):
+        """Schedule a coroutine on the pool loop; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the pool loop and block for its result."""
+        return self.submit(coro).result(timeout)
+
+    def call_tool_sync(self, tool_name: str, input_dict: dict[str, Any], trace_id: Optional[str] = None):
+        return self.run(self.call_tool(tool_name, input_dict, trace_id))
+
+    def stream_tool_sync(self, tool_name: str, input_dict: dict[str, Any],
+                         timeout: Optional[float] = None, trace_id: Optional[str] = None) -> Iterator[tuple[str, Any]]:
+        """Blocking generator over stream_tool events; `timeout` bounds the wait for each event."""
+        events = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for event in self.stream_tool(tool_name, input_dict, trace_id):
+                    events.put(event)
+            except Exception as e:
+                events.put(("error", e))
+            finally:
+                events.put(done)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"{tool_name}: no event for {timeout}s")
+                if event is done:
+                    return
+                if event[0] == "error":
+                    raise event[1]
+                yield event
+        finally:
+            future.cancel()
+
+    def transcribe_upload_sync(self, chunks: Iterable[bytes], filename: str,
+                               content_type: Optional[str] = None,
+                               timeout: Optional[float] = 300.0) -> Iterator[dict]:
+        """
+        Stream audio bytes to the backend's /stt/upload route (no shared
+        filesystem needed) and yield its NDJSON lines: transcript segments,
+        then {"done": True, "text" | "error"}.
+        """
+        scheme, netloc, _, _, _ = urlsplit(self.server_url)
+        url = urlunsplit((scheme, netloc, "/stt/upload", "", ""))
+        headers = {"Content-Type": content_type} if content_type else {}
+        with httpx.Client(timeout=httpx.Timeout(timeout, connect=self.connect_timeout)) as client:
+            with client.stream("POST", url, params={"filename": filename},
+                               content=chunks, headers=headers) as response:
+                if response.status_code >= 400:
+                    response.read()
+                    yield {"done": True, "error": f"{response.status_code}: {response.text}"}
+                    return
+                for line in response.iter_lines():
+                    if line.strip():
+                        yield json.loads(line)
+
+    def close(self):
+        try:
+            self.run(self.aclose(), timeout=self.connect_timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
@@ -1,5 +1,7 @@
 import asyncio,os,sys
 import json
+import hashlib
+from concurrent.futures import as_completed
 import uuid
 from pathlib import Path
 import streamlit as st
@@ -9,71 +11,168 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Load env variables
 load_dotenv()
-from common.mcp_client import SupportMCPClient
+from common.mcp_client import SupportMCPPool
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000/sse")
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", 4))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 8))
+BULK_TICKET_TIMEOUT = float(os.getenv("BULK_TICKET_TIMEOUT", 120))
+AUDIO_UPLOAD_CHUNK_BYTES = 64 * 1024
 #correct one
-# -----------------------------
-# Async helper wrapper (unchanged)
-# -----------------------------
-async def process_ticket(ticket_id, ticket_text):
-    client = SupportMCPClient(server_url=BACKEND_URL)
-    await client.connect()
 
-    # Step 1: Classification
-    result = await client.run_tool("classification_tool", {"ticket_text": ticket_text})
-    raw_output = result.content[0].text if getattr(result, "content", None) else ""
+
+@st.cache_resource
+def get_mcp_pool():
+    """One MCP connection pool per Streamlit server, shared across reruns and tabs."""
+    return SupportMCPPool(server_url=BACKEND_URL, size=MCP_POOL_SIZE)
+
+
+def tool_text(result):
+    return result.content[0].text if getattr(result, "content", None) else ""
+
+
+def parse_process_result(result):
+    """Split a process_ticket_tool result into (classification, final_response)."""
+    raw_text = tool_text(result)
     try:
-        classification = json.loads(raw_output)
+        parsed = json.loads(raw_text)
     except Exception:
-        classification = {"error": f"Parse error: {raw_output}"}
+        return {"error": f"Parse error: {raw_text}"}, {"type": "error", "error": f"Parse error: {raw_text}"}
+    final_response = {**parsed.get("final_response", {}), "raw": raw_text}
+    return parsed.get("classification", {}), final_response
 
-    category_json = classification.get("category", {})
-    topic_tags = category_json.get("topic_tags", [])
-    topic = topic_tags[0] if topic_tags else ""
 
-    # Step 2: RAG or Routing
-    if topic in ["How-to", "Product", "Best practices", "API/SDK", "SSO"]:
-        result2 = await client.run_tool(
-            "rag_tool", {"ticket_id": ticket_id, "topic": topic, "query": ticket_text}
-        )
-        raw_text2 = result2.content[0].text if getattr(result2, "content", None) else ""
-        try:
-            rag_answer = json.loads(raw_text2)
-            final_response = {
-                "type": "rag",
-                "response": rag_answer.get("response", ""),
-                "sources": rag_answer.get("sources", []),
-                "raw": raw_text2
-            }
-        except Exception:
-            final_response = {"type": "rag", "error": f"Parse error: {raw_text2}"}
-    else:
-        result3 = await client.run_tool(
-            "routing_tool", {"ticket_id": ticket_id, "topic": topic}
-        )
-        raw_text3 = result3.content[0].text if getattr(result3, "content", None) else ""
-        try:
-            routing = json.loads(raw_text3)
-            final_response = {
-                "type": "routing",
-                "message": routing.get("routing_message", ""),
-                "raw": raw_text3
-            }
-        except Exception:
-            final_response = {"type": "routing", "error": f"Parse error: {raw_text3}"}
-
-    await client.cleanup()
+# -----------------------------
+# Async helper wrapper (runs on the pool's event loop)
+# -----------------------------
+async def process_ticket(ticket_id, ticket_text, pool):
+    # Classification, then RAG or routing, run server-side in one round-trip
+    result = await pool.call_tool(
+        "process_ticket_tool", {"ticket_id": ticket_id, "ticket_text": ticket_text}
+    )
+    return parse_process_result(result)
+
+
+# -----------------------------
+# Streaming: render tokens as they arrive
+# -----------------------------
+def stream_into(placeholder, events):
+    """Render ("token", text) events into `placeholder`; returns the final tool result."""
+    text, result = "", None
+    for kind, value in events:
+        if kind == "token":
+            text += value
+            placeholder.markdown(text + "▌")
+        else:
+            result = value
+    placeholder.markdown(text)
+    return result
+
+
+def process_ticket_streaming(ticket_id, ticket_text, pool):
+    """Like render_ticket_result(*process_ticket(...)), but streams the RAG answer."""
+    st.subheader("🔍 Internal Analysis")
+    analysis = st.empty()
+    st.subheader("✅ Final Response")
+    placeholder = st.empty()
+
+    result = stream_into(placeholder, pool.stream_tool_sync(
+        "process_ticket_tool", {"ticket_id": ticket_id, "ticket_text": ticket_text, "stream": True}
+    ))
+    classification, final_response = parse_process_result(result)
+    analysis.json(classification)
+
+    # the streamed text is replaced by the authoritative (stripped) answer
+    if final_response["type"] == "rag":
+        placeholder.write(final_response.get("response", ""))
+        st.write("📚 Sources:", final_response.get("sources", []))
+    elif final_response["type"] == "routing":
+        placeholder.write(final_response.get("message", ""))
     return classification, final_response
 
 
+def audio_chunks(data, chunk_size=AUDIO_UPLOAD_CHUNK_BYTES):
+    """Slice the uploaded bytes for a chunked upload without copying them."""
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+def transcribe_streaming(audio, pool):
+    """Upload a recording to the backend and render the transcript as segments arrive."""
+    placeholder = st.empty()
+    text = ""
+    for event in pool.transcribe_upload_sync(audio_chunks(audio.getvalue()), audio.name, audio.type):
+        if event.get("done"):
+            if "error" in event:
+                placeholder.error(f"Transcription failed: {event['error']}")
+                return None
+            placeholder.markdown(event["text"])
+            return event["text"]
+        text += event["text"] + " "
+        placeholder.markdown(text + "▌")
+    return None
+
+
+# -----------------------------
+# Bulk engine: bounded fan-out over the shared pool
+# -----------------------------
+async def process_ticket_bounded(index, ticket, pool, semaphore, timeout):
+    """Run process_ticket for one bulk ticket; failures are returned, not raised."""
+    ticket_id, ticket_text = ticket["id"], ticket["subject"] + " " + ticket["body"]
+    async with semaphore:
+        try:
+            classification, final_response = await asyncio.wait_for(
+                process_ticket(ticket_id, ticket_text, pool), timeout
+            )
+            return {"index": index, "ticket": ticket, "classification": classification,
+                    "final_response": final_response}
+        except asyncio.TimeoutError:
+            return {"index": index, "ticket": ticket, "error": f"Timed out after {timeout:.0f}s"}
+        except Exception as e:
+            return {"index": index, "ticket": ticket, "error": f"{type(e).__name__}: {e}"}
+
+
+def run_bulk(tickets, pool, concurrency=BULK_CONCURRENCY, timeout=BULK_TICKET_TIMEOUT):
+    """
+    Process (index, ticket) pairs with at most `concurrency` in flight at once.
+    Yields one result dict per ticket, carrying its index, in completion order.
+    Results are keyed by position because uploaded ticket ids may repeat.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    futures = [pool.submit(process_ticket_bounded(i, t, pool, semaphore, timeout)) for i, t in tickets]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Streamlit stops the script on rerun/navigation; drop unfinished work
+        for future in futures:
+            future.cancel()
+
+
+def render_ticket_result(classification, final_response):
+    st.subheader("🔍 Internal Analysis")
+    st.json(classification)
+
+    st.subheader("✅ Final Response")
+    if final_response["type"] == "rag":
+        st.write(final_response.get("response", ""))
+        st.write("📚 Sources:", final_response.get("sources", []))
+    elif final_response["type"] == "routing":
+        st.write(final_response.get("message", ""))
+
+    # st.caption("Raw outputs for debugging")
+    # st.code(final_response.get("raw", ""), language="json")
+
+
 # -----------------------------
 # Streamlit UI (full file)
 # -----------------------------
 st.set_page_config(page_title="Ticket Dashboard", layout="wide")
 st.title("Ticket Classification Dashboard")
 
-mode = st.sidebar.radio("Select Mode", ["Bulk Tickets", "Single Ticket", "Live Chat"])
+mode = st.sidebar.radio("Select Mode", ["Bulk Tickets", "Single Ticket", "Voice Ticket", "Live Chat"])
+pool = get_mcp_pool()
 
 # -----------------------------
 # Bulk Tickets
@@ -82,28 +181,47 @@ if mode == "Bulk Tickets":
     st.header("📂 Bulk Ticket Classification")
     uploaded_file = st.file_uploader("Upload a JSON file of tickets", type=["json"])
 
+    concurrency = st.sidebar.slider("Parallel tickets", 1, 32, BULK_CONCURRENCY)
+    timeout = st.sidebar.number_input("Per-ticket timeout (s)", 10, 600, int(BULK_TICKET_TIMEOUT))
+
     if uploaded_file is not None:
         try:
             tickets = json.load(uploaded_file)
-            for t in tickets:
-                ticket_id, ticket_text = t["id"], t["subject"] + " " + t["body"]
-                with st.expander(f"{ticket_id} - {t['subject']}"):
-                    classification, final_response = asyncio.run(process_ticket(ticket_id, ticket_text))
-
-                    st.subheader("🔍 Internal Analysis")
-                    st.json(classification)
-
-                    st.subheader("✅ Final Response")
-                    if final_response["type"] == "rag":
-                        st.write(final_response.get("response", ""))
-                        st.write("📚 Sources:", final_response.get("sources", []))
-                    elif final_response["type"] == "routing":
-                        st.write(final_response.get("message", ""))
-
-                    # st.caption("Raw outputs for debugging")
-                    # st.code(final_response.get("raw", ""), language="json")
         except Exception as e:
             st.error(f"Failed to parse JSON file: {e}")
+            tickets = None
+
+        if tickets is not None:
+            # Keep finished results across reruns so widget changes don't reprocess the file
+            file_key = hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+            if st.session_state.get("bulk_file_key") != file_key:
+                st.session_state.bulk_file_key = file_key
+                st.session_state.bulk_results = {}
+            done = st.session_state.bulk_results
+
+            progress = st.progress(0.0, text=f"0 / {len(tickets)} tickets processed")
+
+            def render_bulk_result(r):
+                t = r["ticket"]
+                with st.expander(f"{t['id']} - {t['subject']}"):
+                    if "error" in r:
+                        st.error(f"Failed to process ticket: {r['error']}")
+                    else:
+                        render_ticket_result(r["classification"], r["final_response"])
+
+            for r in done.values():
+                render_bulk_result(r)
+
+            pending = [(i, t) for i, t in enumerate(tickets) if i not in done]
+            for r in run_bulk(pending, pool, concurrency=concurrency, timeout=timeout):
+                done[r["index"]] = r
+                progress.progress(len(done) / len(tickets), text=f"{len(done)} / {len(tickets)} tickets processed")
+                render_bulk_result(r)
+
+            progress.progress(1.0, text=f"{len(done)} / {len(tickets)} tickets processed")
+            failed = sum(1 for r in done.values() if "error" in r)
+            if failed:
+                st.warning(f"{failed} ticket(s) failed; the rest completed normally.")
     else:
         st.info("Please upload a JSON file to process tickets.")
 
@@ -117,20 +235,27 @@ elif mode == "Single Ticket":
 
     if st.button("Submit Ticket"):
         ticket_text = subject + " " + body
-        classification, final_response = asyncio.run(process_ticket("USER-TICKET", ticket_text))
+        process_ticket_streaming("USER-TICKET", ticket_text, pool)
+
 
-        st.subheader("🔍 Internal Analysis")
-        st.json(classification)
+# -----------------------------
+# Voice Ticket
+# -----------------------------
+elif mode == "Voice Ticket":
+    st.header("🎙️ Voice Ticket")
+    recording = st.audio_input("Record your issue")
+    uploaded_audio = st.file_uploader("...or upload a recording", type=["m4a", "mp3", "wav", "ogg", "webm", "flac"])
+    audio = recording or uploaded_audio
 
-        st.subheader("✅ Final Response")
-        if final_response["type"] == "rag":
-            st.write(final_response.get("response", ""))
-            st.write("📚 Sources:", final_response.get("sources", []))
-        elif final_response["type"] == "routing":
-            st.write(final_response.get("message", ""))
+    if audio is not None and st.button("Transcribe"):
+        st.subheader("📝 Transcript")
+        st.session_state.voice_transcript = transcribe_streaming(audio, pool)
 
-        # st.caption("Raw outputs for debugging")
-        # st.code(final_response.get("raw", ""), language="json")
+    transcript = st.session_state.get("voice_transcript")
+    if transcript:
+        ticket_text = st.text_area("Ticket text (edit before submitting)", transcript)
+        if st.button("Submit Ticket"):
+            process_ticket_streaming("VOICE-TICKET", ticket_text, pool)
 
 
 # ...existing code...
@@ -153,6 +278,15 @@ elif mode == "Live Chat":
 
     user_msg = st.chat_input("Describe your issue... (type 'done' to finish)")
 
+    def render_chat(messages):
+        for msg in messages:
+            with st.chat_message(msg["role"]):
+                st.markdown(msg["content"])
+
+    # Render conversation so far; new messages are rendered as they arrive
+    render_chat(st.session_state.chat_history)
+    shown = len(st.session_state.chat_history)
+
     def normalize_tool_response(result):
         """
         Normalize various MCP response shapes into a python dict.
@@ -200,28 +334,25 @@ elif mode == "Live Chat":
             # Add message to history and accumulated chat text
             st.session_state.chat_history.append({"role": "user", "content": user_msg})
             st.session_state.chat_text += f"\n{user_msg}"
-
-            async def call_live_qna(msg, session_id):
-                client = SupportMCPClient(server_url=BACKEND_URL)
-                await client.connect()
-                try:
-                    result = await client.run_tool(
-                        "live_qna_tool",
-                        {"session_id": session_id, "user_input": msg}
-                    )
-                    return result
-                finally:
-                    await client.cleanup()
-
-            # call the MCP tool and normalize result
-            raw_result = asyncio.run(call_live_qna(user_msg, st.session_state.session_id))
+            render_chat(st.session_state.chat_history[-1:])
+
+            # call the MCP tool on the shared pool, streaming the reply, and normalize result
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                raw_result = stream_into(placeholder, pool.stream_tool_sync(
+                    "live_qna_tool",
+                    {"session_id": st.session_state.session_id, "user_input": user_msg, "stream": True}
+                ))
             result_dict = normalize_tool_response(raw_result)
 
             status = result_dict.get("status", "error")
 
             if status == "in_progress":
                 ai_reply = result_dict.get("reply", "")
+                # the guardrail may have replaced the streamed reply
+                placeholder.markdown(ai_reply)
                 st.session_state.chat_history.append({"role": "assistant", "content": ai_reply})
+                shown = len(st.session_state.chat_history)
 
             elif status == "completed":
                 ticket = result_dict.get("ticket", {})
@@ -253,8 +384,8 @@ elif mode == "Live Chat":
         ticket_text = ticket.get("subject", "") + " " + ticket.get("body", "")
         
         # Run the ticket classification process
-        classification, final_response = asyncio.run(
-            process_ticket("CHAT-TICKET", ticket_text)
+        classification, final_response = pool.run(
+            process_ticket("CHAT-TICKET", ticket_text, pool)
         )
         st.session_state.last_analysis = classification
         st.session_state.last_final_response = final_response
@@ -284,10 +415,8 @@ elif mode == "Live Chat":
                 routing_msg = f"**Routing Message:**\n{final_response.get('message', '')}"
                 st.session_state.chat_history.append({"role": "assistant", "content": routing_msg})
 
-    # Render conversation (use markdown for formatting)
-    for msg in st.session_state.chat_history:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
+    # Render messages added above that weren't streamed (use markdown for formatting)
+    render_chat(st.session_state.chat_history[shown:])
 
     # Debug panel for last ticket
     if st.session_state.last_analysis and st.session_state.last_final_response:
@@ -0,0 +1,14 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Same import roots the entry points use: `sagents.*` from backend/, `chunker`/`crawler` from knowledge_base/,
+# `common.*` from the repo root and the Streamlit app from frontend/
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "frontend"))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "backend", "knowledge_base"))
+
+# Never reach out to the Hugging Face hub from tests; the chunker falls back to estimated token counts
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
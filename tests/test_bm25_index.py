@@ -0,0 +1,62 @@
+from sagents.bm25_index import BM25Index, build_from_collection, load_bm25_index, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    "snowflake": "Snowflake connector permissions: grant USAGE on the warehouse",
+    "okta": "Configure Okta SSO with SAML for Atlan login",
+    "dbt": "dbt lineage is captured from the manifest and run results",
+    "generic": "General notes about the product and its connector catalogue",
+}
+
+
+class FakeCollection:
+    """Pages through documents like chromadb's Collection.get(limit, offset)."""
+
+    def __init__(self, docs):
+        self.ids, self.documents = list(docs), list(docs.values())
+        self.calls = 0
+
+    def get(self, include, limit, offset):
+        self.calls += 1
+        return {"ids": self.ids[offset:offset + limit], "documents": self.documents[offset:offset + limit]}
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("How do I set up the Snowflake connector?") == ["set", "up", "snowflake", "connector"]
+
+
+def test_round_trip_search(tmp_path, monkeypatch):
+    monkeypatch.setattr("sagents.bm25_index.BUILD_READ_BATCH", 3)  # several pages
+    collection = FakeCollection(DOCS)
+    build_from_collection(collection, str(tmp_path / "bm25"))
+    assert collection.calls == 3
+
+    index = load_bm25_index(str(tmp_path / "bm25"))
+    assert len(index) == len(DOCS)
+    hits = index.search("snowflake warehouse grant", top_k=2)
+    assert hits[0][0] == "snowflake"
+    assert index.search("okta sso")[0][0] == "okta"
+    assert index.search("nothing matches xyzzy") == []
+    assert [doc for doc, _ in index.search("connector", top_k=5)] in (["snowflake", "generic"], ["generic", "snowflake"])
+
+
+def test_rebuild_replaces_index(tmp_path):
+    out = str(tmp_path / "bm25")
+    build_from_collection(FakeCollection(DOCS), out)
+    build_from_collection(FakeCollection({"only": "fivetran sync schedules"}), out)
+    index = BM25Index(out)
+    assert index.ids == ["only"]
+    assert index.search("snowflake") == []
+
+
+def test_empty_collection(tmp_path):
+    build_from_collection(FakeCollection({}), str(tmp_path / "bm25"))
+    index = load_bm25_index(str(tmp_path / "bm25"))
+    assert len(index) == 0
+    assert index.search("anything") == []
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion({"dense": ["a", "b", "c"], "bm25": ["c", "a"]}, {"dense": 1.0, "bm25": 1.0})
+    assert fused[0] == "a"
+    assert set(fused) == {"a", "b", "c"}
+    assert reciprocal_rank_fusion({"dense": ["a"], "bm25": ["b"]}, {"dense": 1.0, "bm25": 0.0}) == ["a"]
@@ -0,0 +1,70 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("streamlit")
+import app3  # noqa: E402  (renders nothing without a Streamlit script context)
+
+from common import mcp_client  # noqa: E402
+from common.mcp_client import SupportMCPPool  # noqa: E402
+
+
+class FakeClient:
+    """process_ticket_tool stub: the ticket text says how long to take or whether to fail."""
+
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, server_url):
+        self.tools = {}
+
+    async def connect(self, list_tools=True):
+        pass
+
+    async def run_tool(self, tool_name, input_dict, trace_id=None):
+        FakeClient.in_flight += 1
+        FakeClient.max_in_flight = max(FakeClient.max_in_flight, FakeClient.in_flight)
+        try:
+            text = input_dict["ticket_text"]
+            await asyncio.sleep(5 if "slow" in text else 0.02)
+            if "bad" in text:
+                raise ValueError("bad ticket")
+            reply = {"classification": {"id": input_dict["ticket_id"]},
+                     "final_response": {"type": "routing", "message": text}}
+            return SimpleNamespace(content=[SimpleNamespace(text=json.dumps(reply))])
+        finally:
+            FakeClient.in_flight -= 1
+
+    async def cleanup(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeClient.in_flight = FakeClient.max_in_flight = 0
+    monkeypatch.setattr(mcp_client, "SupportMCPClient", FakeClient)
+    pool = SupportMCPPool(size=2, max_retries=0)
+    yield pool
+    pool.close()
+
+
+def _tickets(*subjects):
+    # the same id twice: results are keyed by position, not id
+    return list(enumerate({"id": "T-1", "subject": s, "body": "body"} for s in subjects))
+
+
+def test_bulk_is_bounded_and_covers_every_ticket(pool):
+    results = list(app3.run_bulk(_tickets(*"abcdef"), pool, concurrency=2, timeout=5))
+    assert sorted(r["index"] for r in results) == list(range(6))
+    assert all("error" not in r for r in results)
+    assert results[0]["final_response"]["message"] in {f"{s} body" for s in "ab"}
+    assert FakeClient.max_in_flight == 2
+
+
+def test_bulk_failures_stay_per_ticket(pool):
+    results = {r["index"]: r for r in app3.run_bulk(_tickets("ok", "bad", "slow"), pool, concurrency=3, timeout=1)}
+    assert results[0]["classification"] == {"id": "T-1"}
+    assert results[1]["error"] == "ValueError: bad ticket"
+    assert results[2]["error"] == "Timed out after 1s"
@@ -0,0 +1,110 @@
+import time
+
+from sagents.cache import MISSING, LRUCache, SemanticCache, SQLiteCache, TieredCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "evictions": 1, "hit_rate": 0.75}
+
+
+def test_lru_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set("a", 1)
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a", None) is None
+    assert len(cache) == 0
+
+
+def test_sqlite_round_trip_and_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    path = str(tmp_path / "cache.sqlite")
+    cache = SQLiteCache(path, ttl=10)
+    cache.set("k", {"topic": ["SSO"], "priority": "P1"})
+    assert cache.get("k") == {"topic": ["SSO"], "priority": "P1"}
+    assert SQLiteCache(path).get("k") == {"topic": ["SSO"], "priority": "P1"}  # shared through the file
+
+    now[0] += 11
+    assert cache.get("k") is MISSING
+    assert cache.purge_expired() == 1
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_sqlite_delete_and_clear(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    assert cache.get("a") is MISSING and cache.get("b") == 2
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_tiered_promotes_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    TieredCache(LRUCache(), SQLiteCache(path)).set("k", "v")
+
+    cache = TieredCache(LRUCache(), SQLiteCache(path))  # a fresh process: empty memory tier
+    assert cache.get("k") == "v"
+    assert cache.memory.get("k") == "v"
+    assert cache.get("k") == "v"
+    stats = cache.stats()
+    assert stats["disk"]["hits"] == 1  # the second read never reached SQLite
+    assert cache.get("missing", None) is None
+
+    cache.delete("k")
+    assert cache.get("k") is MISSING
+
+
+def test_tiered_without_disk():
+    cache = TieredCache(LRUCache(maxsize=1))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") is MISSING and cache.get("b") == 2
+    assert "disk" not in cache.stats()
+
+
+def test_semantic_cache_threshold_and_tag():
+    cache = SemanticCache(maxsize=4, threshold=0.9)
+    cache.add([1.0, 0.0, 0.0], "snowflake answer", tag="top_k=5")
+    value, similarity = cache.lookup([0.99, 0.05, 0.0], tag="top_k=5")
+    assert value == "snowflake answer" and similarity > 0.99
+    assert cache.lookup([0.99, 0.05, 0.0], tag="top_k=10") is None  # stored under another tag
+    assert cache.lookup([0.0, 1.0, 0.0], tag="top_k=5") is None      # below the threshold
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_semantic_cache_evicts_least_recently_used(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = SemanticCache(maxsize=2, threshold=0.99)
+    cache.add([1, 0], "a")
+    now[0] += 1
+    cache.add([0, 1], "b")
+    now[0] += 1
+    assert cache.lookup([1, 0])[0] == "a"  # "b" is now the oldest
+    cache.add([1, 1], "c")
+    assert cache.lookup([0, 1]) is None
+    assert cache.lookup([1, 0])[0] == "a" and cache.lookup([1, 1])[0] == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_semantic_cache_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = SemanticCache(ttl=10)
+    cache.add([1, 0], "a")
+    now[0] += 11
+    assert cache.lookup([1, 0]) is None
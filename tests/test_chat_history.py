@@ -0,0 +1,99 @@
+import asyncio
+
+from sagents.chat_history import HISTORY_LOW_WATER, HISTORY_MIN_TURNS, HistoryManager, estimate_tokens
+
+
+def _history(summarize=None, turns=10, budget=100):
+    history = HistoryManager("You are a support agent.", token_budget=budget, summarize=summarize)
+    for i in range(turns):
+        history.add("user" if i % 2 == 0 else "assistant", f"turn {i}: " + "x" * 32)
+    return history
+
+
+def test_under_budget_is_untouched():
+    history = _history(turns=2)
+    asyncio.run(history.compact())
+    assert len(history.turns) == 2 and history.summary == ""
+    assert [m["role"] for m in history.messages(extra=[{"role": "user", "content": "new"}])] == \
+        ["system", "user", "assistant", "user"]
+    assert len(history.turns) == 2  # extra messages are not stored
+
+
+def test_compact_folds_oldest_turns_into_summary():
+    calls = []
+
+    async def summarize(previous, messages):
+        calls.append((previous, [m["content"] for m in messages]))
+        return f"summary of {len(messages)} turns"
+
+    history = _history(summarize)
+    assert history.over_budget()
+    asyncio.run(history.compact())
+
+    assert len(calls) == 1 and calls[0][0] == ""
+    assert calls[0][1][0].startswith("turn 0:")
+    assert history.turns[0]["content"].startswith(f"turn {len(calls[0][1])}:")
+    assert history.summary == f"summary of {len(calls[0][1])} turns"
+    assert history.folded_turns == len(calls[0][1])
+    assert history.token_count() <= history.token_budget
+    # the summary message sits between the system prompt and the recent turns
+    assert history.messages()[1]["content"].endswith(history.summary)
+
+
+def test_compact_stops_at_low_water_mark():
+    history = _history()
+    asyncio.run(history.compact())
+    target = int(history.token_budget * HISTORY_LOW_WATER)
+    kept = estimate_tokens(history.system_prompt) + sum(estimate_tokens(m["content"]) for m in history.turns)
+    assert kept <= target
+    # every turn is the same size, so folding one turn fewer would have stayed above it
+    assert kept + estimate_tokens(history.turns[0]["content"]) > target
+
+
+def test_failed_summarizer_keeps_plain_text():
+    async def summarize(previous, messages):
+        raise RuntimeError("router down")
+
+    history = _history(summarize)
+    asyncio.run(history.compact())
+    assert history.summary.startswith("user: turn 0:")
+    assert "assistant: turn 1:" in history.summary
+
+
+def test_summary_is_clipped_and_latest_turns_kept():
+    history = HistoryManager("system", token_budget=10, summary_max_tokens=5)
+    for i in range(6):
+        history.add("user", f"message {i} " + "y" * 100)
+    asyncio.run(history.compact())
+    assert len(history.turns) == HISTORY_MIN_TURNS
+    assert history.turns[-1]["content"].startswith("message 5")
+    assert history.summary.startswith("...") and len(history.summary) <= 3 + 5 * 4
+
+
+def test_max_turns_folds_overflow_into_summary():
+    folded = []
+
+    async def summarize(previous, messages):
+        folded.extend(m["content"][:6] for m in messages)
+        return " ".join(filter(None, [previous, *(m["content"][:6] for m in messages)]))
+
+    history = HistoryManager("You are a support agent.", token_budget=10_000, summarize=summarize, max_turns=4)
+    for i in range(6):
+        history.add("user", f"turn {i}")
+    assert not history.over_budget()
+    asyncio.run(history.compact())
+    assert [m["content"] for m in history.turns] == ["turn 2", "turn 3", "turn 4", "turn 5"]
+    assert folded == ["turn 0", "turn 1"] and history.summary == "turn 0 turn 1"
+    assert history.folded_turns == 2
+
+    history.add("user", "turn 6")
+    asyncio.run(history.compact())
+    assert history.summary == "turn 0 turn 1 turn 2"  # nothing is dropped without being summarized
+
+
+def test_state_round_trip():
+    history = _history(turns=6)
+    history.summary = "earlier"
+    restored = HistoryManager("You are a support agent.")
+    restored.load_state(history.to_state())
+    assert restored.messages() == history.messages()
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+from chunker import Chunker, parse_blocks, sections
+
+PAGE = """# Snowflake connector
+
+Intro paragraph about the connector.
+
+## Snowflake permissions
+
+Grant USAGE on the warehouse to the role. Then grant SELECT on all tables in the schema. The role also needs access to the information schema. Without it the crawler cannot list objects. Rotate credentials regularly.
+
+```sql
+GRANT USAGE ON WAREHOUSE wh TO ROLE atlan;
+
+GRANT SELECT ON ALL TABLES IN SCHEMA s TO ROLE atlan;
+```
+
+### Key pair auth
+
+Use a private key for the service account."""
+
+
+@pytest.fixture(scope="module")
+def chunker():
+    return Chunker(max_tokens=48, overlap_tokens=8)
+
+
+def test_parse_blocks_keeps_fenced_code_whole():
+    blocks = parse_blocks(PAGE)
+    code = [b for b in blocks if b.startswith("```")]
+    assert len(code) == 1
+    assert "GRANT USAGE" in code[0] and "GRANT SELECT" in code[0]
+
+
+def test_sections_follow_heading_levels():
+    names = [name for name, _ in sections("Snowflake connector", PAGE)]
+    assert names == [
+        "Snowflake connector",  # the h1 repeats the title
+        "Snowflake connector > Snowflake permissions",
+        "Snowflake connector > Snowflake permissions > Key pair auth",
+    ]
+
+
+def test_chunks_fit_the_budget_and_start_with_their_section(chunker):
+    chunks = chunker.chunk_page("Snowflake connector", PAGE)
+    assert len(chunks) > 3
+    for chunk in chunks:
+        assert chunk.n_tokens <= chunker.budget
+        assert chunker.counter.count([chunk.text])[0] <= chunker.budget + 1  # "\n" joins may add one estimated token
+        assert chunk.text.startswith(chunk.section.rsplit(" > ", 1)[-1]) or chunk.text.startswith(chunk.section)
+    assert any("Snowflake permissions" in c.text and "GRANT" in c.text for c in chunks)
+
+
+def test_long_paragraph_is_split_at_sentences_with_overlap():
+    chunker = Chunker(max_tokens=64, overlap_tokens=16)
+    sentences = [f"Sentence number {i} talks about lineage." for i in range(30)]
+    chunks = chunker.chunk_page("Lineage", " ".join(sentences))
+    assert len(chunks) > 1
+    body = [c.text.split("\n", 1)[1].split("\n") for c in chunks]
+    for unit in (u for units in body for u in units):
+        assert unit in sentences  # never cut mid-sentence
+    # the next chunk repeats the previous chunk's last sentence
+    assert body[1][0] == body[0][-1]
+
+
+def test_get_chunker_is_sized_for_the_given_model(monkeypatch):
+    import chunker as chunker_module
+
+    monkeypatch.setattr(chunker_module, "_chunkers", {})
+    monkeypatch.setattr(chunker_module, "TokenCounter", lambda name: SimpleNamespace(model_name=name, tokenizer=None))
+    monkeypatch.setattr(chunker_module, "model_max_tokens", lambda name: {"small-model": 128, "long-model": 512}[name])
+    small, long = chunker_module.get_chunker("small-model"), chunker_module.get_chunker("long-model")
+    assert (small.max_tokens, small.counter.model_name) == (128, "small-model")
+    assert (long.max_tokens, long.counter.model_name) == (512, "long-model")
+    assert chunker_module.get_chunker("small-model") is small
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from sagents import classification_agent
+from sagents.cache import LRUCache, TieredCache
+from sagents.classification_agent import classification_cache_key, classify_batch, classify_ticket
+
+
+class FakeLLM:
+    """Labels each ticket by its subject; `drop` results go missing from packed responses."""
+
+    def __init__(self, drop=0):
+        self.drop = drop
+        self.prompts = []
+
+    async def chat(self, messages, response_format=None):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        packed = re.search(r"Tickets:\n\s*(\[.*\])\n", prompt, re.S)
+        if packed is None:
+            subject = re.search(r"Ticket Subject: (.*)", prompt).group(1)
+            return json.dumps({"topic_tags": [subject], "sentiment": "Neutral", "priority": "P2 (Low)"})
+        tickets = json.loads(packed.group(1))
+        results = [{"id": t["id"], "topic_tags": [t["subject"]], "sentiment": "Neutral", "priority": "P2 (Low)"}
+                   for t in tickets]
+        if self.drop:
+            results, self.drop = results[:-self.drop], 0
+        return json.dumps({"results": results})
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(classification_agent, "get_llm_client", lambda: fake)
+    monkeypatch.setattr(classification_agent, "get_fast_classifier", lambda: None)
+    monkeypatch.setattr(classification_agent, "classification_cache", TieredCache(LRUCache()))
+    return fake
+
+
+def _ticket(id, subject):
+    return {"id": id, "subject": subject, "body": f"body of {subject}"}
+
+
+def test_packed_batch_with_repeated_ids(llm):
+    # ids from different sources can collide; results must still follow input order
+    tickets = [_ticket("TICKET-1", "SSO"), _ticket("TICKET-1", "Lineage"), _ticket("TICKET-2", "Connector")]
+    results = asyncio.run(classify_batch(tickets, use_cache=False))
+    assert [r["id"] for r in results] == ["TICKET-1", "TICKET-1", "TICKET-2"]
+    assert [r["category"]["topic_tags"] for r in results] == [["SSO"], ["Lineage"], ["Connector"]]
+    assert len(llm.prompts) == 1
+    assert '"id": "t0"' in llm.prompts[0] and "TICKET-1" not in llm.prompts[0]
+
+
+def test_short_packed_response_is_split(llm):
+    llm.drop = 1
+    tickets = [_ticket(str(i), f"subject {i}") for i in range(4)]
+    results = asyncio.run(classify_batch(tickets, use_cache=False))
+    assert [r["category"]["topic_tags"] for r in results] == [[f"subject {i}"] for i in range(4)]
+    assert len(llm.prompts) == 3  # the failed batch of 4, then two halves
+
+
+def test_duplicates_and_cache(llm):
+    tickets = [_ticket("1", "SSO"), _ticket("2", "SSO"), _ticket("3", "Glossary")]
+    asyncio.run(classify_batch(tickets))
+    assert len(llm.prompts) == 1 and llm.prompts[0].count('"subject": "SSO"') == 1
+
+    results = asyncio.run(classify_batch(tickets))
+    assert len(llm.prompts) == 1  # every ticket served from the cache
+    assert [r["category"]["topic_tags"] for r in results] == [["SSO"], ["SSO"], ["Glossary"]]
+    assert asyncio.run(classify_ticket(_ticket("4", "Glossary")))["category"]["topic_tags"] == ["Glossary"]
+    assert len(llm.prompts) == 1
+
+
+def test_use_cache_false_neither_reads_nor_writes(llm):
+    ticket = _ticket("1", "SSO")
+    asyncio.run(classify_ticket(ticket, use_cache=False))
+    asyncio.run(classify_batch([_ticket("2", "Lineage")], use_cache=False))
+    assert len(classification_agent.classification_cache.memory) == 0
+
+    classification_agent.classification_cache.set(classification_cache_key(ticket), {"topic_tags": ["stale"]})
+    assert asyncio.run(classify_ticket(ticket, use_cache=False))["category"]["topic_tags"] == ["SSO"]
+    assert len(llm.prompts) == 3
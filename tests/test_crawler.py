@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import AsyncCrawler
+
+WORDS = " ".join(["word"] * 60)
+PAGES = {
+    "/": ["/a", "/b", "/a#section", "/private/secret"],
+    "/a": ["/", "/b", "/c"],
+    "/b": ["/a", "http://elsewhere.example/x"],
+    "/c": [],
+    "/private/secret": [],
+}
+ROBOTS = "User-agent: *\nDisallow: /private/\n"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_GET(self):
+        FixtureHandler.requests.append(self.path)
+        if self.path == "/robots.txt":
+            return self._send(200, ROBOTS, "text/plain")
+        if self.path not in PAGES:
+            return self._send(404, "missing", "text/plain")
+        etag = f'"{self.path}-v1"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        links = "".join(f'<a href="{href}">link</a>' for href in PAGES[self.path])
+        self._send(200, f"<html><title>{self.path}</title><p>{WORDS}</p>{links}</html>", "text/html", etag)
+
+    def _send(self, status, body, content_type, etag=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    FixtureHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def parse_page(html, url):
+    from bs4 import BeautifulSoup
+    from urllib.parse import urljoin
+    soup = BeautifulSoup(html, "html.parser")
+    links = [urljoin(url, a["href"]) for a in soup.find_all("a", href=True)]
+    return soup.title.string, soup.get_text(" ", strip=True), links
+
+
+def crawl(domain, **kwargs):
+    crawler = AsyncCrawler([domain], parse_page, request_interval=0, **kwargs)
+    pages = asyncio.run(crawler.crawl([f"http://{domain}/"]))
+    return crawler, pages
+
+
+def test_crawls_each_page_once(site):
+    crawler, pages = crawl(site)
+    assert sorted(pages) == [f"http://{site}{p}" for p in ("/", "/a", "/b", "/c")]
+    page_requests = [p for p in FixtureHandler.requests if p != "/robots.txt"]
+    assert sorted(page_requests) == ["/", "/a", "/b", "/c"]  # fragments and repeats deduplicated
+    assert pages[f"http://{site}/"]["etag"] == '"/-v1"'
+    assert crawler.stats["saved"] == 4
+
+
+def test_robots_disallowed_urls_are_never_fetched(site):
+    crawler, pages = crawl(site)
+    assert "/private/secret" not in FixtureHandler.requests
+    assert crawler.stats["disallowed"] == 1
+
+    crawler, pages = crawl(site, respect_robots=False)
+    assert f"http://{site}/private/secret" in pages
+
+
+def test_unchanged_pages_come_back_not_modified(site):
+    _, first = crawl(site)
+    known = {url: {"etag": page["etag"], "links": page["links"]} for url, page in first.items()}
+
+    crawler, second = crawl(site, known_pages=known)
+    assert set(second) == set(first)
+    assert all(page == {"not_modified": True} for page in second.values())
+    assert crawler.stats["not_modified"] == 4
+    assert crawler.stats["fetched"] == 0
+
+
+def test_page_cap_and_gone_pages(site):
+    crawler, pages = crawl(site, max_pages_per_domain=2)
+    assert len(pages) == 2
+    assert crawler.domain_exhausted(site)
+
+    crawler = AsyncCrawler([site], parse_page, request_interval=0)
+    asyncio.run(crawler.crawl([f"http://{site}/missing"]))
+    assert crawler.gone == {f"http://{site}/missing"}
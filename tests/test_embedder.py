@@ -0,0 +1,62 @@
+import sys
+import threading
+import time
+from types import ModuleType
+
+import numpy as np
+import pytest
+
+from sagents import embedder
+
+
+class SlowSentenceTransformer:
+    """Takes a while to load, like the real model, and counts how often it is loaded."""
+
+    loads = 0
+
+    def __init__(self, model_name):
+        time.sleep(0.05)
+        SlowSentenceTransformer.loads += 1
+        self.model_name = model_name
+
+    def encode(self, texts, convert_to_numpy=True, show_progress_bar=False):
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    SlowSentenceTransformer.loads = 0
+    module = ModuleType("sentence_transformers")
+    module.SentenceTransformer = SlowSentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    monkeypatch.setattr(embedder, "_model", None)
+    monkeypatch.setitem(embedder.load_metrics, "load_seconds", None)
+
+
+def test_loaded_lazily_and_once(stub_model):
+    assert not embedder.is_loaded()
+    threads = [threading.Thread(target=embedder.get_embedder) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert SlowSentenceTransformer.loads == 1 and embedder.is_loaded()
+    assert embedder.load_metrics["load_seconds"] >= 0.05
+
+    np.testing.assert_array_equal(embedder.embed(["okta", "sso"]), [[4, 1], [3, 1]])
+    assert SlowSentenceTransformer.loads == 1
+
+
+def test_warm_up_in_background(stub_model):
+    steps = []
+    embedder.warm_up_in_background(lambda: steps.append(embedder.is_loaded())).join(timeout=5)
+    assert steps == [True] and SlowSentenceTransformer.loads == 1
+
+
+def test_failed_warm_up_is_not_fatal(stub_model, capsys):
+    def broken():
+        raise RuntimeError("chroma missing")
+
+    embedder.warm_up_in_background(broken).join(timeout=5)
+    assert "warm-up failed: chroma missing" in capsys.readouterr().out
+    assert embedder.is_loaded()
@@ -0,0 +1,65 @@
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+
+import embedding_engine
+from embedding_engine import EmbeddingEngine, synthetic_chunks
+
+STUB_TORCH = "def set_num_threads(n):\n    pass\n"
+STUB_SENTENCE_TRANSFORMERS = textwrap.dedent('''
+    import numpy as np
+
+    class SentenceTransformer:
+        """Embeds a text as features of its own characters, so any worker gives the same vector."""
+
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def encode(self, texts, batch_size=None, show_progress_bar=False, convert_to_numpy=True):
+            return np.array([[len(t), sum(map(ord, t)) % 9973, t.count(" ")] for t in texts], dtype=np.float32)
+''')
+
+
+@pytest.fixture
+def stub_encoder(tmp_path, monkeypatch):
+    """Stub torch and sentence_transformers on sys.path, which spawned workers inherit."""
+    (tmp_path / "torch.py").write_text(STUB_TORCH)
+    (tmp_path / "sentence_transformers.py").write_text(STUB_SENTENCE_TRANSFORMERS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ("torch", "sentence_transformers"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    monkeypatch.setattr(embedding_engine, "_worker_model", None)
+
+
+def _expected(texts):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer("stub").encode(texts)
+
+
+def test_serial_encode_keeps_input_order(stub_encoder):
+    texts = synthetic_chunks(50) + ["short", "short"]
+    engine = EmbeddingEngine("stub", workers=1, tokens_per_batch=512)
+    out = engine.encode(texts)
+    np.testing.assert_array_equal(out, _expected(texts))
+    assert engine.stats["encoded"] == 51 and engine.stats["batches"] > 1  # the duplicate is embedded once
+
+
+def test_sharded_encode_matches_serial(stub_encoder):
+    texts = synthetic_chunks(120, seed=1)
+    texts += texts[:10]  # duplicates spread across shards
+    serial = EmbeddingEngine("stub", workers=1, tokens_per_batch=2048).encode(texts)
+
+    engine = EmbeddingEngine("stub", workers=2, tokens_per_batch=2048)
+    try:
+        sharded = engine.encode(texts)
+    finally:
+        engine.close()
+    assert sharded.shape == (len(texts), 3)
+    np.testing.assert_array_equal(sharded, serial)
+    assert engine.stats["batches"] >= 2
+
+
+def test_empty_input(stub_encoder):
+    assert EmbeddingEngine("stub", workers=1).encode([]).shape == (0, 0)
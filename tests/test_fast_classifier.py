@@ -0,0 +1,99 @@
+import numpy as np
+
+from sagents import fast_classifier
+from sagents.fast_classifier import TEMPERATURES, FastClassifier, evaluate, fast_classify_batch, ticket_text
+
+LABELS = [
+    {"topic_tags": ["SSO"], "sentiment": "Frustrated", "priority": "P0 (High)"},
+    {"topic_tags": ["Lineage"], "sentiment": "Curious", "priority": "P1 (Medium)"},
+    {"topic_tags": ["Connector"], "sentiment": "Neutral", "priority": "P2 (Low)"},
+]
+
+
+def _clusters(spread, per_label=30, dim=16, seed=0):
+    """Embeddings scattered around one random direction per label, and their categories."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(len(LABELS), dim))
+    embeddings = np.concatenate([c + spread * rng.normal(size=(per_label, dim)) for c in centers])
+    categories = [LABELS[i] for i in range(len(LABELS)) for _ in range(per_label)]
+    return embeddings.astype(np.float32), categories, centers
+
+
+def test_ticket_text():
+    assert ticket_text({"subject": "SSO", "body": "Okta login fails"}) == "SSO Okta login fails"
+    assert ticket_text({"subject": "Okta login fails", "body": "Okta login fails"}) == "Okta login fails"
+    assert ticket_text({"subject": "", "body": " Okta login fails "}) == "Okta login fails"
+
+
+def test_predicts_the_nearest_centroid():
+    embeddings, categories, centers = _clusters(spread=0.3)
+    model = FastClassifier.fit(embeddings, categories)
+    predictions = model.predict(centers)
+    assert [category for category, _ in predictions] == LABELS
+    assert all(confidence > 0.9 for _, confidence in predictions)
+
+
+def test_temperature_is_fitted_per_spread():
+    tight = FastClassifier.fit(*_clusters(spread=0.05)[:2])
+    loose = FastClassifier.fit(*_clusters(spread=1.5)[:2])
+    for head in ("topic_tags", "sentiment", "priority"):
+        assert tight.heads[head][2] == TEMPERATURES[0]
+        assert loose.heads[head][2] > tight.heads[head][2]
+
+
+def _between(model, *tags):
+    """A point equally close to the centroids of the given topics."""
+    labels, centroids, _ = model.heads["topic_tags"]
+    return sum(centroids[labels.index(tag)] for tag in tags)
+
+
+def test_second_topic_tag_between_two_centroids():
+    model = FastClassifier.fit(*_clusters(spread=0.3)[:2])
+    category, confidence = model.predict(_between(model, "SSO", "Lineage"))[0]
+    assert set(category["topic_tags"]) == {"SSO", "Lineage"}
+    assert confidence < 0.9  # the other heads can't decide between the two
+
+
+def test_save_load_round_trip(tmp_path):
+    embeddings, categories, centers = _clusters(spread=0.3)
+    model = FastClassifier.fit(embeddings, categories)
+    path = str(tmp_path / "fast.npz")
+    model.save(path)
+    loaded = FastClassifier.load(path)
+    assert loaded.model_name == model.model_name
+    assert loaded.predict(centers) == model.predict(centers)
+
+
+def test_missing_head_defers_to_the_llm():
+    embeddings, categories, _ = _clusters(spread=0.3)
+    model = FastClassifier.fit(embeddings, [{k: v for k, v in c.items() if k != "priority"} for c in categories])
+    assert "priority" not in model.heads
+    assert all(confidence == 0.0 for _, confidence in model.predict(embeddings))
+
+    rows = evaluate(model, embeddings, categories, thresholds=(0.0, 0.5))
+    assert rows[0]["coverage"] == 1.0 and rows[0]["topic_primary"] == 1.0
+    assert rows[0]["priority"] is None
+    assert rows[1]["coverage"] == 0.0 and rows[1]["sentiment"] is None
+
+
+def test_evaluate_agreement():
+    embeddings, categories, _ = _clusters(spread=0.3)
+    model = FastClassifier.fit(embeddings, categories)
+    row = evaluate(model, embeddings, categories, thresholds=(0.0,))[0]
+    assert row == {"threshold": 0.0, "coverage": 1.0, "topic_primary": 1.0, "topic_exact": 1.0,
+                   "sentiment": 1.0, "priority": 1.0}
+
+
+def test_fast_classify_batch_threshold(monkeypatch):
+    embeddings, categories, centers = _clusters(spread=0.3)
+    model = FastClassifier.fit(embeddings, categories)
+    vectors = {"clear": centers[2], "ambiguous": _between(model, "SSO", "Lineage")}
+    monkeypatch.setattr(fast_classifier, "get_fast_classifier", lambda: model)
+    monkeypatch.setattr(fast_classifier, "embed", lambda texts: np.array([vectors[t] for t in texts]))
+    tickets = [{"subject": "", "body": "clear"}, {"subject": "", "body": "ambiguous"}]
+    assert fast_classify_batch(tickets, threshold=0.9) == [LABELS[2], None]
+
+
+def test_untrained_sends_everything_to_the_llm(monkeypatch):
+    monkeypatch.setattr(fast_classifier, "get_fast_classifier", lambda: None)
+    assert fast_classify_batch([{"subject": "a", "body": "b"}]) == [None]
@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+import atlan_info  # noqa: E402
+from atlan_info import canonical_id, ingest, stream_pages  # noqa: E402
+from chunker import Chunk  # noqa: E402
+from manifest import IngestManifest  # noqa: E402
+
+
+class FakeCollection:
+    def __init__(self, log):
+        self.log = log
+        self.chunks = {}
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        self.log.append(("upsert", ids))
+        self.chunks.update(zip(ids, documents))
+
+    def delete(self, ids):
+        self.log.append(("delete", ids))
+        for chunk_id in ids:
+            self.chunks.pop(chunk_id, None)
+
+
+class FakeChromaClient:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def delete_collection(self, name):
+        self.collection.chunks.clear()
+
+    def get_collection(self, name):
+        return self.collection
+
+
+class FakeEngine:
+    def __init__(self, model_name, workers=1):
+        self.stats = {"encoded": 0, "chunks": 0, "seconds": 0.0}
+
+    def encode(self, texts):
+        self.stats["encoded"] += len(texts)
+        self.stats["chunks"] += len(texts)
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    def close(self):
+        pass
+
+
+class RecordingManifest(IngestManifest):
+    def __init__(self, path, log):
+        super().__init__(path)
+        self.log = log
+
+    def set(self, url, entry):
+        self.log.append(("commit", url))
+        super().set(url, entry)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fake Chroma collection; pages are chunked one chunk per paragraph, two chunks per upsert."""
+    log = []
+    collection = FakeCollection(log)
+    opened = []
+
+    def persistent_client(path):
+        opened.append(path)
+        return FakeChromaClient(collection)
+
+    monkeypatch.setattr(atlan_info.chromadb, "PersistentClient", persistent_client)
+    monkeypatch.setattr(atlan_info, "EmbeddingEngine", FakeEngine)
+    monkeypatch.setattr(atlan_info, "EMBED_BATCH_SIZE", 2)
+    monkeypatch.setattr(atlan_info, "chunk_text", lambda text, title, model_name: [
+        Chunk(p, title, len(p.split())) for p in text.split("\n\n")])
+    for name in ("build_from_collection", "export_from_collection", "write_kb_version"):
+        monkeypatch.setattr(atlan_info, name, lambda *args: None)
+
+    collection.opened = opened
+    collection.manifest = lambda: RecordingManifest(str(tmp_path / "manifest.json"), log)
+    return collection
+
+
+def _page(*paragraphs):
+    return {"title": "Docs", "text": "\n\n".join(paragraphs), "links": []}
+
+
+PAGES = {
+    "https://docs.atlan.com/sso": _page("okta", "azure ad", "google"),
+    "https://docs.atlan.com/lineage": _page("column lineage"),
+    "https://docs.atlan.com/snowflake": _page("warehouse", "role"),
+}
+
+
+def test_full_ingest_commits_each_page_after_its_chunks(store):
+    ingest(PAGES.items(), manifest=store.manifest(), workers=1)
+    assert len(store.chunks) == 6
+    assert store.chunks[canonical_id("https://docs.atlan.com/sso", 2)] == "google"
+
+    written = set()
+    for kind, value in store.log:
+        if kind == "upsert":
+            written.update(value)
+        else:
+            n_chunks = len(PAGES[value]["text"].split("\n\n"))
+            assert {canonical_id(value, i) for i in range(n_chunks)} <= written
+    assert sorted(url for kind, url in store.log if kind == "commit") == sorted(PAGES)
+    assert IngestManifest(store.manifest().path).urls()  # flushed to disk
+
+
+def test_incremental_ingest_rewrites_only_what_changed(store):
+    ingest(PAGES.items(), manifest=store.manifest(), workers=1)
+    store.log.clear()
+    changed = {
+        "https://docs.atlan.com/sso": _page("okta", "entra id"),   # one chunk edited, one removed
+        "https://docs.atlan.com/lineage": PAGES["https://docs.atlan.com/lineage"],
+    }
+    ingest(changed.items(), manifest=store.manifest(), workers=1, incremental=True,
+           stale_urls=lambda seen: [u for u in PAGES if u not in seen])
+
+    sso, snowflake = "https://docs.atlan.com/sso", "https://docs.atlan.com/snowflake"
+    assert [ids for kind, ids in store.log if kind == "upsert"] == [[canonical_id(sso, 1)]]
+    assert store.chunks[canonical_id(sso, 1)] == "entra id"
+    assert canonical_id(sso, 2) not in store.chunks
+    assert not any(canonical_id(snowflake, i) in store.chunks for i in range(2))
+    assert IngestManifest(store.manifest().path).urls() == [sso, "https://docs.atlan.com/lineage"]
+
+
+def test_empty_crawl_leaves_the_store_alone(store):
+    ingest(iter([]), manifest=store.manifest())
+    assert store.opened == []
+
+
+class FakeCrawler:
+    def __init__(self, n_pages, error=None):
+        self.n_pages = n_pages
+        self.error = error
+        self.stats = {}
+
+    async def iter_pages(self, seed_urls):
+        for i in range(self.n_pages):
+            yield f"https://docs.atlan.com/{i}", {"title": str(i)}
+        if self.error:
+            raise self.error
+
+
+def test_stream_pages_keeps_crawl_order_through_a_small_queue():
+    urls = [url for url, _ in stream_pages(FakeCrawler(10), [], maxsize=2)]
+    assert urls == [f"https://docs.atlan.com/{i}" for i in range(10)]
+
+
+def test_stream_pages_reraises_crawler_errors():
+    received = []
+    with pytest.raises(ConnectionError):
+        for url, _ in stream_pages(FakeCrawler(3, ConnectionError("dns")), []):
+            received.append(url)
+    assert len(received) == 3
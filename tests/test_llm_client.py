@@ -0,0 +1,174 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sagents import llm_client
+from sagents.llm_client import LLMClient, LLMError
+
+MESSAGES = [{"role": "user", "content": "How do I set up Okta SSO?"}]
+
+
+class RouterHandler(BaseHTTPRequestHandler):
+    """Chat-completions stub: replies follow `script`, then plain 200s."""
+
+    protocol_version = "HTTP/1.1"
+    script = []       # [{"status", "headers", "delay", "deltas", "drop_after"}], one per request
+    requests = 0
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with RouterHandler.lock:
+            RouterHandler.requests += 1
+            RouterHandler.in_flight += 1
+            RouterHandler.max_in_flight = max(RouterHandler.max_in_flight, RouterHandler.in_flight)
+            step = RouterHandler.script.pop(0) if RouterHandler.script else {}
+        time.sleep(step.get("delay", 0))
+        with RouterHandler.lock:  # counted until the reply starts; the client may reuse its slot after that
+            RouterHandler.in_flight -= 1
+        try:
+            status = step.get("status", 200)
+            if status != 200:
+                return self._send(status, b'{"error": "busy"}', "application/json", step.get("headers", {}))
+            if not body.get("stream"):
+                reply = {"choices": [{"message": {"content": "Use SAML."}}]}
+                return self._send(200, json.dumps(reply).encode(), "application/json")
+            deltas = step.get("deltas", ["Use ", "SAML."])
+            events = b"".join(
+                b"data: " + json.dumps({"choices": [{"delta": {"content": d}}]}).encode() + b"\n\n" for d in deltas
+            ) + b"data: [DONE]\n\n"
+            if "drop_after" in step:  # promise the full body, send the first events, hang up
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(events)))
+                self.end_headers()
+                self.wfile.write(events[:step["drop_after"]])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self._send(200, events, "text/event-stream")
+        except (BrokenPipeError, ConnectionResetError):  # the client gave up (timeout tests)
+            pass
+
+    def _send(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def router(monkeypatch):
+    RouterHandler.script, RouterHandler.requests, RouterHandler.max_in_flight = [], 0, 0
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0.01)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RouterHandler)
+    server.daemon_threads = False  # server_close() waits for slow handlers, so none outlives its test
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    server.shutdown()
+    server.server_close()
+
+
+def test_retries_5xx_and_429(router):
+    RouterHandler.script = [{"status": 503}, {"status": 429}]
+    client = LLMClient(api_url=router, max_retries=3)
+    assert asyncio.run(client.chat(MESSAGES)) == "Use SAML."
+    assert RouterHandler.requests == 3
+    assert client.stats["retries"] == 2 and client.stats["failures"] == 0
+
+
+def test_honours_retry_after(router):
+    RouterHandler.script = [{"status": 429, "headers": {"Retry-After": "0.3"}}]
+    client = LLMClient(api_url=router)
+    start = time.perf_counter()
+    asyncio.run(client.chat(MESSAGES))
+    assert time.perf_counter() - start >= 0.3
+
+
+def test_gives_up_after_max_retries(router):
+    RouterHandler.script = [{"status": 503}] * 3
+    client = LLMClient(api_url=router, max_retries=2)
+    with pytest.raises(LLMError) as error:
+        asyncio.run(client.chat(MESSAGES))
+    assert error.value.status_code == 503
+    assert RouterHandler.requests == 3 and client.stats["failures"] == 1
+
+
+def test_client_errors_are_not_retried(router):
+    RouterHandler.script = [{"status": 400}]
+    with pytest.raises(LLMError) as error:
+        asyncio.run(LLMClient(api_url=router).chat(MESSAGES))
+    assert error.value.status_code == 400 and RouterHandler.requests == 1
+
+
+def test_timeout(router):
+    RouterHandler.script = [{"delay": 1.0}]
+    client = LLMClient(api_url=router, timeout=0.2, max_retries=0)
+    start = time.perf_counter()
+    with pytest.raises(LLMError, match="Timeout"):
+        asyncio.run(client.chat(MESSAGES))
+    assert time.perf_counter() - start < 0.9
+
+
+def test_concurrency_limit(router):
+    RouterHandler.script = [{"delay": 0.1}] * 6
+    client = LLMClient(api_url=router, max_concurrency=2)
+
+    async def main():
+        return await asyncio.gather(*(client.chat(MESSAGES) for _ in range(6)))
+
+    assert asyncio.run(main()) == ["Use SAML."] * 6
+    assert RouterHandler.max_in_flight == 2
+
+
+def test_stream_retries_before_first_delta(router):
+    RouterHandler.script = [{"status": 503}]
+    client = LLMClient(api_url=router)
+
+    async def main():
+        return [delta async for delta in client.chat_stream(MESSAGES)]
+
+    assert asyncio.run(main()) == ["Use ", "SAML."]
+    assert RouterHandler.requests == 2
+
+
+def test_stream_is_not_retried_after_first_delta(router):
+    RouterHandler.script = [{"deltas": ["Use ", "SAML."], "drop_after": 60}]
+    client = LLMClient(api_url=router)
+    received = []
+
+    async def main():
+        async for delta in client.chat_stream(MESSAGES):
+            received.append(delta)
+
+    with pytest.raises(LLMError):
+        asyncio.run(main())
+    assert received == ["Use "]
+    assert RouterHandler.requests == 1
+
+
+def test_client_is_closed_with_its_loop(router):
+    client = LLMClient(api_url=router)
+    clients = []
+
+    async def main():
+        await client.chat(MESSAGES)
+        clients.append(client._per_loop[asyncio.get_running_loop()][0])
+
+    asyncio.run(main())
+    asyncio.run(main())
+    assert clients[0] is not clients[1]
+    assert all(c.is_closed for c in clients)
+    assert client._per_loop == {}
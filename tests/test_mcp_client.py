@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from mcp.shared.exceptions import McpError
+from mcp.types import ErrorData
+
+from common import mcp_client
+from common.mcp_client import SupportMCPClient, SupportMCPPool
+
+
+class FakeClient:
+    """Stands in for SupportMCPClient; `fail` holds errors for the next calls, one per call."""
+
+    opened = []
+    fail = []
+
+    def __init__(self, server_url):
+        self.tools = {}
+        self.closed = False
+        FakeClient.opened.append(self)
+
+    async def connect(self, list_tools=True):
+        if list_tools:
+            self.tools = {"rag_tool": "tool"}
+
+    async def run_tool(self, tool_name, input_dict, trace_id=None):
+        if FakeClient.fail:
+            raise FakeClient.fail.pop(0)
+        return FakeClient.opened.index(self), tool_name
+
+    async def stream_tool(self, tool_name, input_dict, trace_id=None):
+        if FakeClient.fail:
+            raise FakeClient.fail.pop(0)
+        for i, token in enumerate(input_dict["tokens"]):
+            if i == input_dict.get("drop_after"):
+                raise ConnectionError("session dropped mid-stream")
+            yield "token", token
+        yield "result", FakeClient.opened.index(self)
+
+    async def cleanup(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeClient.opened, FakeClient.fail = [], []
+    monkeypatch.setattr(mcp_client, "SupportMCPClient", FakeClient)
+    pool = SupportMCPPool(size=2, max_retries=1)
+    yield pool
+    pool.close()
+
+
+def test_sessions_are_reused_round_robin(pool):
+    assert [pool.call_tool_sync("rag_tool", {})[0] for _ in range(4)] == [0, 1, 0, 1]
+    assert len(FakeClient.opened) == 2
+    # only the first session fetches the tool list; the rest share it
+    assert pool.tools == {"rag_tool": "tool"} and FakeClient.opened[1].tools == {}
+
+
+def test_dropped_session_is_reopened(pool):
+    FakeClient.fail = [ConnectionError("session dropped")]
+    assert pool.call_tool_sync("rag_tool", {}) == (1, "rag_tool")
+    pool.run(asyncio.sleep(0.05))  # let the dropped session's holder task clean up
+    assert FakeClient.opened[0].closed
+    assert pool.call_tool_sync("rag_tool", {})[0] == 2  # its slot reconnects on next use
+
+
+def test_server_errors_are_not_retried(pool):
+    FakeClient.fail = [McpError(ErrorData(code=-32602, message="bad arguments"))]
+    with pytest.raises(McpError):
+        pool.call_tool_sync("rag_tool", {})
+    assert len(FakeClient.opened) == 1 and not FakeClient.opened[0].closed
+
+
+def test_gives_up_after_max_retries(pool):
+    FakeClient.fail = [ConnectionError("down"), ConnectionError("still down")]
+    with pytest.raises(ConnectionError, match="still down"):
+        pool.call_tool_sync("rag_tool", {})
+    assert len(FakeClient.opened) == 2
+
+
+class FakeSession:
+    async def call_tool(self, tool_name, input_dict, progress_callback=None, meta=None):
+        for i, message in enumerate(["Use ", "", "SAML."], start=1):
+            await progress_callback(i, None, message)
+        return "result"
+
+
+def test_client_stream_yields_progress_then_result():
+    client = SupportMCPClient()
+    client.session = FakeSession()
+
+    async def main():
+        return [event async for event in client.stream_tool("rag_tool", {"stream": True})]
+
+    assert asyncio.run(main()) == [("token", "Use "), ("token", "SAML."), ("result", "result")]
+
+
+def test_pool_stream_retries_before_first_event(pool):
+    FakeClient.fail = [ConnectionError("session dropped")]
+    events = list(pool.stream_tool_sync("rag_tool", {"tokens": ["Use ", "SAML."]}, timeout=5))
+    assert events == [("token", "Use "), ("token", "SAML."), ("result", 1)]
+
+
+def test_pool_stream_is_not_retried_after_first_event(pool):
+    received = []
+    with pytest.raises(ConnectionError, match="mid-stream"):
+        for event in pool.stream_tool_sync("rag_tool", {"tokens": ["Use ", "SAML."], "drop_after": 1}, timeout=5):
+            received.append(event)
+    assert received == [("token", "Use ")]
+    assert len(FakeClient.opened) == 1
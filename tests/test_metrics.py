@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from sagents import metrics
+from sagents.metrics import current_trace_id, observe, record_stage, render, run_in_thread, span, trace
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(metrics, "_collectors", [])
+
+
+def _lines(text):
+    return set(text.splitlines())
+
+
+def test_histogram_is_cumulative():
+    observe("stage_seconds", 0.003, stage="embed")
+    observe("stage_seconds", 0.02, stage="embed")
+    observe("stage_seconds", 100.0, stage="embed")
+    lines = _lines(render())
+    assert "# TYPE support_stage_seconds histogram" in lines
+    assert 'support_stage_seconds_bucket{stage="embed",le="0.0025"} 0' in lines
+    assert 'support_stage_seconds_bucket{stage="embed",le="0.005"} 1' in lines
+    assert 'support_stage_seconds_bucket{stage="embed",le="60"} 2' in lines
+    assert 'support_stage_seconds_bucket{stage="embed",le="+Inf"} 3' in lines
+    assert 'support_stage_seconds_count{stage="embed"} 3' in lines
+    assert 'support_stage_seconds_sum{stage="embed"} 100.023' in lines
+
+
+def test_trace_counts_requests_by_status():
+    with trace("tool:rag_tool", "abc123") as trace_id:
+        assert trace_id == current_trace_id() == "abc123"
+    with pytest.raises(RuntimeError):
+        with trace("tool:rag_tool"):
+            raise RuntimeError("router down")
+    assert current_trace_id() is None
+    lines = _lines(render())
+    assert 'support_requests_total{request="tool:rag_tool",status="ok"} 1' in lines
+    assert 'support_requests_total{request="tool:rag_tool",status="error"} 1' in lines
+    assert 'support_request_seconds_count{request="tool:rag_tool"} 2' in lines
+
+
+def test_slow_trace_logs_its_stages(monkeypatch, capsys):
+    monkeypatch.setattr(metrics, "TRACE_SLOW_SECONDS", 0.0)
+
+    async def main():
+        with trace("tool:rag_tool", "slow1"):
+            with span("prompt_build"):
+                pass
+            await run_in_thread("embed", lambda: current_trace_id())
+
+    asyncio.run(main())
+    out = capsys.readouterr().out
+    assert out.startswith("[trace] slow1 tool:rag_tool ok took")
+    # spans from the worker thread land in the same trace
+    assert "prompt_build=" in out and "queue_wait=" in out and "embed=" in out
+    assert 'support_stage_seconds_count{op="embed",stage="queue_wait"} 1' in _lines(render())
+
+
+def test_spans_outside_a_trace_are_still_measured():
+    record_stage("llm_ttfb", 0.2, model="small")
+    assert 'support_stage_seconds_count{model="small",stage="llm_ttfb"} 1' in _lines(render())
+
+
+def test_collectors_are_read_at_scrape_time(capsys):
+    hits = {"n": 0}
+    metrics.register_collector(lambda: [("cache_hits_total", {"cache": "answer"}, hits["n"]),
+                                        ("cache_hit_rate", {"cache": 'q"a'}, 0.25),
+                                        ("llm_in_flight", {}, None)])
+
+    @metrics.register_collector
+    def broken():
+        raise KeyError("stats")
+
+    hits["n"] = 3
+    lines = _lines(render())
+    assert "# TYPE support_cache_hits_total counter" in lines
+    assert 'support_cache_hits_total{cache="answer"} 3' in lines
+    assert "# TYPE support_cache_hit_rate gauge" in lines
+    assert 'support_cache_hit_rate{cache="q\\"a"} 0.25' in lines
+    assert not any("llm_in_flight" in line for line in lines)  # None means "not known yet"
+    assert "collector broken failed" in capsys.readouterr().out
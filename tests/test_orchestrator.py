@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from sagents import orchestrator
+from sagents.orchestrator import process_ticket, speculation_stats
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Classification returns `state["topic"]` after the retrieval has started; records what ran."""
+    state = {"topic": "SSO", "retrievals": [], "answered_with": None, "retrieval_cancelled": False}
+
+    async def retrieve(query):
+        state["retrievals"].append(query)
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            state["retrieval_cancelled"] = True
+            raise
+        return [1.0], ["Okta needs a SAML app"], [{"source": "https://docs.atlan.com/sso"}]
+
+    async def classify_ticket(ticket, use_cache):
+        await asyncio.sleep(0)
+        if state["topic"] is None:
+            raise RuntimeError("router down")
+        return {"id": ticket["id"], "category": {"topic_tags": [state["topic"]]}}
+
+    async def generate_answer(ticket_id, topic, query, use_cache, on_token, retrieval):
+        if retrieval is not None:  # otherwise generate_answer retrieves for itself
+            state["answered_with"] = await retrieval
+        return {"response": "Set up a SAML app.", "sources": ["https://docs.atlan.com/sso"], "cached": False}
+
+    monkeypatch.setattr(orchestrator, "retrieve", retrieve)
+    monkeypatch.setattr(orchestrator, "classify_ticket", classify_ticket)
+    monkeypatch.setattr(orchestrator, "generate_answer", generate_answer)
+    monkeypatch.setattr(orchestrator, "SPECULATIVE_RETRIEVAL", True)
+    for key in speculation_stats:
+        monkeypatch.setitem(speculation_stats, key, 0)
+    return state
+
+
+def _process():
+    return asyncio.run(process_ticket("T-1", "Okta SSO login fails"))
+
+
+def test_rag_topic_uses_the_speculative_retrieval(pipeline):
+    result = _process()
+    assert result["final_response"] == {"type": "rag", "response": "Set up a SAML app.",
+                                        "sources": ["https://docs.atlan.com/sso"], "cached": False}
+    assert pipeline["retrievals"] == ["Okta SSO login fails"]
+    assert pipeline["answered_with"][1] == ["Okta needs a SAML app"]
+    assert speculation_stats == {"started": 1, "used": 1, "discarded": 0}
+
+
+def test_routed_ticket_discards_the_retrieval(pipeline):
+    pipeline["topic"] = "Connector"
+    result = _process()
+    assert result["final_response"]["type"] == "routing"
+    assert "'Connector'" in result["final_response"]["message"]
+    assert pipeline["retrieval_cancelled"] and pipeline["answered_with"] is None
+    assert speculation_stats == {"started": 1, "used": 0, "discarded": 1}
+
+
+def test_failed_classification_discards_the_retrieval(pipeline):
+    pipeline["topic"] = None
+    with pytest.raises(RuntimeError, match="router down"):
+        _process()
+    assert pipeline["retrieval_cancelled"]
+    assert speculation_stats["discarded"] == 1
+
+
+def test_without_speculation_retrieval_waits_for_the_topic(pipeline, monkeypatch):
+    monkeypatch.setattr(orchestrator, "SPECULATIVE_RETRIEVAL", False)
+    result = _process()
+    assert result["final_response"]["type"] == "rag"
+    assert pipeline["retrievals"] == [] and pipeline["answered_with"] is None
+    assert speculation_stats["started"] == 0
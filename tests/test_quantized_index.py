@@ -0,0 +1,81 @@
+import numpy as np
+
+from sagents.quantized_index import Int8Index, export_from_collection, load_int8_index, quantize
+
+
+class FakeCollection:
+    """Pages through chunks like chromadb's Collection.get(limit, offset)."""
+
+    def __init__(self, n, dim=16, seed=0):
+        rng = np.random.default_rng(seed)
+        self.ids = [f"chunk-{i}" for i in range(n)]
+        self.embeddings = rng.normal(size=(n, dim)).astype(np.float32)
+        self.documents = [f"document {i} é" for i in range(n)]
+        self.metadatas = [{"source": f"https://docs.atlan.com/{i}"} if i % 2 else None for i in range(n)]
+        self.calls = 0
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include, limit, offset):
+        self.calls += 1
+        page = slice(offset, offset + limit)
+        return {"ids": self.ids[page], "embeddings": self.embeddings[page],
+                "documents": self.documents[page], "metadatas": self.metadatas[page]}
+
+
+def _exact_top_k(collection, query, k):
+    vectors = collection.embeddings / np.linalg.norm(collection.embeddings, axis=1, keepdims=True)
+    return [collection.ids[i] for i in np.argsort(-(vectors @ (query / np.linalg.norm(query))))[:k]]
+
+
+def test_quantize_round_trip():
+    vectors = np.random.default_rng(1).uniform(-1, 1, size=(50, 8)).astype(np.float32)
+    codes, scales = quantize(vectors)
+    assert codes.dtype == np.int8
+    assert np.abs(codes.astype(np.float32) * scales - vectors).max() <= scales.max() / 2 + 1e-6
+
+
+def test_export_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr("sagents.quantized_index.EXPORT_READ_BATCH", 7)   # several pages
+    monkeypatch.setattr("sagents.quantized_index.SEARCH_BLOCK_ROWS", 16)  # several search blocks
+    collection = FakeCollection(100)
+    out = str(tmp_path / "int8")
+    export_from_collection(collection, out)
+    assert collection.calls == 16  # 15 pages and the empty one that ends the export
+
+    index = load_int8_index(out)
+    assert len(index) == 100
+    assert index.vectors.dtype == np.int8
+
+    ids, docs, metas = index.get(["chunk-3", "missing", "chunk-4"])
+    assert ids == ["chunk-3", "chunk-4"]
+    assert docs == ["document 3 é", "document 4 é"]
+    assert metas == [{"source": "https://docs.atlan.com/3"}, {}]
+
+    queries = collection.embeddings[:5] + 0.01
+    for query, (ids, docs, metas) in zip(queries, index.search_batch(queries, top_k=5)):
+        assert ids[0] == _exact_top_k(collection, query, 1)[0]
+        assert len(set(ids) & set(_exact_top_k(collection, query, 5))) >= 4
+        assert docs == [collection.documents[int(i.split("-")[1])] for i in ids]
+    assert index.search(queries[0], top_k=3)[0] == index.search_batch(queries[:1], top_k=3)[0][0]
+
+
+def test_export_stops_at_count(tmp_path):
+    collection = FakeCollection(10)
+    collection.count = lambda: 6  # chunks added after count() was read
+    export_from_collection(collection, str(tmp_path / "int8"))
+    index = Int8Index(str(tmp_path / "int8"))
+    assert len(index) == 6
+    assert index.get(["chunk-7"]) == ([], [], [])
+
+
+def test_empty_collection(tmp_path):
+    export_from_collection(FakeCollection(0), str(tmp_path / "int8"))
+    index = load_int8_index(str(tmp_path / "int8"))
+    assert len(index) == 0
+    assert index.search(np.ones(16), top_k=5) == ([], [], [])
+
+
+def test_missing_index(tmp_path):
+    assert load_int8_index(str(tmp_path / "nowhere")) is None
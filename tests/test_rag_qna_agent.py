@@ -0,0 +1,197 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from sagents import rag_qna_agent
+from sagents.cache import SemanticCache
+from sagents.rag_qna_agent import generate_answer
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, messages, **options):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+    async def chat_stream(self, messages, **options):
+        self.calls += 1
+        for delta in ["Use ", "SAML. "]:
+            yield delta
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(rag_qna_agent, "get_llm_client", lambda: fake)
+    monkeypatch.setattr(rag_qna_agent, "answer_cache", SemanticCache(threshold=0.95))
+    monkeypatch.setattr(rag_qna_agent, "embed", lambda texts: np.ones((len(texts), 4), dtype=np.float32))
+    monkeypatch.setattr(rag_qna_agent, "query_embedding_cache", rag_qna_agent.LRUCache())
+    monkeypatch.setattr(rag_qna_agent, "search_context", lambda query, top_k, embedding, weights: (
+        ["Snowflake needs USAGE on the warehouse"], [{"source": "https://docs.atlan.com/snowflake"}]))
+    return fake
+
+
+def _answer(**kwargs):
+    return asyncio.run(generate_answer("T-1", "Connector", "How do I connect Snowflake?", **kwargs))
+
+
+def test_similar_query_is_answered_from_cache(llm):
+    first = _answer()
+    second = _answer()
+    assert first["cached"] is False and first["sources"] == ["https://docs.atlan.com/snowflake"]
+    assert second["cached"] is True and second["response"] == first["response"]
+    assert llm.calls == 1
+
+
+def test_streamed_answer_is_cached_whole(llm):
+    tokens = []
+
+    async def on_token(delta):
+        tokens.append(delta)
+
+    first = _answer(on_token=on_token)
+    assert tokens == ["Use ", "SAML. "] and first["response"] == "Use SAML."
+    second = _answer(on_token=on_token)
+    assert second["cached"] is True and tokens[2:] == ["Use SAML."]  # a cached answer arrives as one chunk
+    assert llm.calls == 1
+
+
+def test_use_cache_false_does_not_write(llm):
+    _answer(use_cache=False)
+    assert len(rag_qna_agent.answer_cache) == 0
+    assert _answer()["cached"] is False
+    assert llm.calls == 2
+
+
+@pytest.mark.parametrize("settings", [
+    {"top_k": 3},
+    {"weights": {"bm25": 0.0}},
+    {"weights": {"dense": 2.0, "bm25": 0.5}},
+])
+def test_cached_answers_are_scoped_to_retrieval_settings(llm, settings):
+    _answer()
+    assert _answer(**settings)["cached"] is False
+    assert _answer(**settings)["cached"] is True
+    assert llm.calls == 2
+
+
+def test_default_weights_share_the_cache(llm):
+    _answer()
+    assert _answer(weights=dict(rag_qna_agent.DEFAULT_RETRIEVAL_WEIGHTS))["cached"] is True
+
+
+class FakeBM25:
+    def search(self, query, k):
+        return [("c", 3.0), ("a", 2.0), ("d", 1.0), ("gone", 0.5)][:k]
+
+
+@pytest.fixture
+def retrievers(monkeypatch):
+    """Dense ranks a, b, c; BM25 ranks c, a, d (and an id since deleted from the store)."""
+    calls = {"dense": 0, "get": []}
+
+    def dense(query_embeddings, n_results):
+        calls["dense"] += 1
+        return [(["a", "b", "c"], ["doc a", "doc b", "doc c"], [{"source": s} for s in "abc"])
+                for _ in query_embeddings]
+
+    def get_chunks(ids):
+        calls["get"].append(ids)
+        found = [i for i in ids if i != "gone"]
+        return found, [f"doc {i}" for i in found], [{"source": i} for i in found]
+
+    monkeypatch.setattr(rag_qna_agent, "RAG_HYBRID", True)
+    monkeypatch.setattr(rag_qna_agent, "get_bm25", lambda: FakeBM25())
+    monkeypatch.setattr(rag_qna_agent, "_dense_search_batch", dense)
+    monkeypatch.setattr(rag_qna_agent, "_get_chunks", get_chunks)
+    monkeypatch.setattr(rag_qna_agent, "embed_queries", lambda queries: np.ones((len(queries), 4)))
+    return calls
+
+
+def test_hybrid_search_fuses_by_reciprocal_rank(retrievers):
+    results = rag_qna_agent.hybrid_search_batch(["snowflake", "okta"], top_k=5)
+    assert [docs for docs, _ in results] == [["doc a", "doc c", "doc b", "doc d"]] * 2
+    assert results[0][1][-1] == {"source": "d"}
+    # one dense call and one lookup, for the ids only BM25 found, across the batch
+    assert retrievers["dense"] == 1 and retrievers["get"] == [["d", "gone"]]
+
+
+def test_hybrid_search_weights(retrievers):
+    docs, _ = rag_qna_agent.hybrid_search("snowflake", top_k=2, weights={"dense": 0.0})
+    assert docs == ["doc c", "doc a"] and retrievers["dense"] == 0
+    docs, _ = rag_qna_agent.hybrid_search("snowflake", top_k=3, weights={"bm25": 3.0})
+    assert docs == ["doc c", "doc a", "doc d"]  # BM25's order wins once it outweighs dense
+
+
+def test_embed_queries_embeds_each_new_query_once(monkeypatch):
+    batches = []
+
+    def embed(texts):
+        batches.append(list(texts))
+        return np.array([[len(t), t.count(" ")] for t in texts], dtype=np.float32)
+
+    monkeypatch.setattr(rag_qna_agent, "embed", embed)
+    monkeypatch.setattr(rag_qna_agent, "query_embedding_cache", rag_qna_agent.LRUCache())
+    first = rag_qna_agent.embed_queries(["okta sso", "okta  sso ", "lineage"])
+    assert batches == [["okta sso", "lineage"]]
+    np.testing.assert_array_equal(first, [[8, 1], [8, 1], [7, 0]])
+
+    second = rag_qna_agent.embed_queries(["lineage", "snowflake"])
+    assert batches[1] == ["snowflake"]
+    np.testing.assert_array_equal(second, [[7, 0], [9, 0]])
+
+
+@pytest.fixture
+def batch_search(monkeypatch):
+    calls = []
+
+    def search_context_batch(queries, top_k, query_embeddings, weights):
+        calls.append(list(queries))
+        return [([f"doc for {q}"], [{"source": f"https://docs.atlan.com/{q}"}]) for q in queries]
+
+    monkeypatch.setattr(rag_qna_agent, "search_context_batch", search_context_batch)
+    return calls
+
+
+TICKETS = [{"ticket_id": f"T-{i}", "topic": "Connector", "query": q}
+           for i, q in enumerate(["snowflake", "okta", "lineage"])]
+
+
+def test_answers_batch_retrieves_once_and_keeps_order(llm, batch_search):
+    results = asyncio.run(rag_qna_agent.generate_answers_batch(TICKETS, use_cache=False))
+    assert batch_search == [["snowflake", "okta", "lineage"]]
+    assert [r["ticket_id"] for r in results] == ["T-0", "T-1", "T-2"]
+    assert results[1]["sources"] == ["https://docs.atlan.com/okta"]
+    assert llm.calls == 3
+
+
+def test_answers_batch_context_only(llm, batch_search):
+    results = asyncio.run(rag_qna_agent.generate_answers_batch(TICKETS[:2], generate=False))
+    assert results == [
+        {"ticket_id": "T-0", "context": ["doc for snowflake"], "sources": [{"source": "https://docs.atlan.com/snowflake"}]},
+        {"ticket_id": "T-1", "context": ["doc for okta"], "sources": [{"source": "https://docs.atlan.com/okta"}]},
+    ]
+    assert llm.calls == 0
+
+
+def test_answers_batch_reports_failures_per_ticket(llm, batch_search, monkeypatch):
+    active, peak = 0, 0
+
+    async def chat(messages, **options):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if "okta" in messages[-1]["content"]:
+            raise RuntimeError("router down")
+        return "answer"
+
+    monkeypatch.setattr(llm, "chat", chat)
+    results = asyncio.run(rag_qna_agent.generate_answers_batch(TICKETS, use_cache=False, concurrency=2))
+    assert results[1] == {"ticket_id": "T-1", "error": "RuntimeError: router down"}
+    assert results[0]["response"] == results[2]["response"] == "answer"
+    assert peak == 2
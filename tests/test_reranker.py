@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+from sagents import reranker
+from sagents.reranker import pack_passages, rerank, score_passages
+
+
+class FakeCrossEncoder:
+    """Scores a passage by its length; each pair costs `seconds_per_pair` on the fake clock."""
+
+    def __init__(self, clock, seconds_per_pair=0.0):
+        self.clock = clock
+        self.seconds_per_pair = seconds_per_pair
+        self.batches = []
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        self.clock.now += self.seconds_per_pair * len(pairs)
+        return [len(doc) for _, doc in pairs]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(reranker, "time", SimpleNamespace(perf_counter=lambda: clock.now))
+    return clock
+
+
+def _model(monkeypatch, clock, seconds_per_pair=0.0):
+    model = FakeCrossEncoder(clock, seconds_per_pair)
+    monkeypatch.setattr(reranker, "get_reranker", lambda: model)
+    return model
+
+
+def test_scores_every_passage_in_batches(monkeypatch, clock):
+    model = _model(monkeypatch, clock, seconds_per_pair=0.001)
+    docs = ["x" * n for n in range(1, 21)]
+    assert score_passages("q", docs, latency_budget_ms=1000, batch_size=8) == list(range(1, 21))
+    assert model.batches == [8, 8, 4]
+
+
+def test_batches_shrink_to_the_time_left(monkeypatch, clock):
+    model = _model(monkeypatch, clock, seconds_per_pair=0.01)
+    docs = ["passage"] * 20
+    assert score_passages("q", docs, latency_budget_ms=100, batch_size=8) is None
+    # 80ms for the first batch leaves room for two more pairs, not another full batch
+    assert model.batches == [8, 2]
+    assert clock.now == pytest.approx(0.1)
+
+
+def test_pack_passages_skips_what_does_not_fit():
+    docs = ["a" * 400, "b" * 4000, "c" * 400, "d" * 400]
+    assert pack_passages([1, 0, 2, 3], docs, top_k=5, token_budget=300) == [1]  # always at least one
+    assert pack_passages([0, 1, 2, 3], docs, top_k=5, token_budget=250) == [0, 2]
+    assert pack_passages([0, 1, 2, 3], docs, top_k=1, token_budget=10_000) == [0]
+
+
+def test_rerank_orders_by_score(monkeypatch, clock):
+    _model(monkeypatch, clock)
+    docs = ["short", "the longest passage", "medium one"]
+    kept, sources = rerank("q", docs, ["s", "l", "m"], top_k=2)
+    assert kept == ["the longest passage", "medium one"] and sources == ["l", "m"]
+
+
+def test_rerank_falls_back_to_retrieval_order(monkeypatch, clock):
+    _model(monkeypatch, clock, seconds_per_pair=1.0)
+    before = reranker.rerank_stats["fallbacks"]
+    kept, sources = rerank("q", ["short", "the longest passage", "medium one"], ["s", "l", "m"],
+                           top_k=2, latency_budget_ms=10)
+    assert sources == ["s", "l"]
+    assert reranker.rerank_stats["fallbacks"] == before + 1
+
+
+def test_rerank_survives_a_failing_model(monkeypatch):
+    def broken():
+        raise OSError("model not downloaded")
+
+    monkeypatch.setattr(reranker, "get_reranker", broken)
+    assert rerank("q", ["a", "b"], ["s1", "s2"], top_k=1) == (["a"], ["s1"])
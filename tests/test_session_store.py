@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from sagents.session_store import MemorySessionBackend, SessionStore, SQLiteSessionBackend, create_session_store
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteSessionBackend(str(tmp_path / "sessions.sqlite"))
+    return MemorySessionBackend()
+
+
+def test_round_trip(backend, clock):
+    store = SessionStore(backend, ttl=60, max_sessions=10)
+    state = {"messages": [{"role": "user", "content": "Okta SSO fails"}], "done": False}
+    store.put("s1", state, new=True)
+    assert store.get("s1") == state
+    assert store.get("unknown") is None
+
+    store.delete("s1")
+    assert store.get("s1") is None
+    stats = store.stats()
+    assert (stats["created"], stats["saved"], stats["completed"]) == (1, 1, 1)
+    assert (stats["hits"], stats["misses"], stats["active_sessions"]) == (1, 2, 0)
+
+
+def test_idle_sessions_expire(backend, clock):
+    store = SessionStore(backend, ttl=60, max_sessions=10)
+    store.put("idle", {"n": 1}, new=True)
+    store.put("active", {"n": 2}, new=True)
+    clock[0] += 50
+    store.put("active", {"n": 3})  # saving refreshes the idle timer
+    clock[0] += 20
+    assert store.get("idle") is None
+    assert store.get("active") == {"n": 3}
+    assert store.stats()["expired"] == 1
+
+
+def test_sweep_drops_idle_sessions(backend, clock):
+    store = SessionStore(backend, ttl=60, max_sessions=10)
+    for sid in ("a", "b"):
+        store.put(sid, {}, new=True)
+    clock[0] += 61
+    assert store.sweep(force=True) == 2
+    assert store.stats()["active_sessions"] == 0
+
+
+def test_max_sessions_evicts_least_recent(backend, clock):
+    store = SessionStore(backend, ttl=None, max_sessions=2)
+    store.put("a", {"n": 1}, new=True)
+    clock[0] += 1
+    store.put("b", {"n": 2}, new=True)
+    clock[0] += 1
+    store.put("a", {"n": 3})
+    clock[0] += 1
+    store.put("c", {"n": 4}, new=True)
+    assert store.get("b") is None
+    assert store.get("a") == {"n": 3} and store.get("c") == {"n": 4}
+    stats = store.stats()
+    assert stats["evicted"] == 1 and stats["active_sessions"] == 2 and stats["state_bytes"] > 0
+
+
+def test_sqlite_sessions_survive_restart(tmp_path, clock):
+    path = str(tmp_path / "sessions.sqlite")
+    SessionStore(SQLiteSessionBackend(path), ttl=60).put("s1", {"n": 1}, new=True)
+    assert SessionStore(SQLiteSessionBackend(path), ttl=60).get("s1") == {"n": 1}
+
+
+def test_create_session_store(tmp_path):
+    assert isinstance(create_session_store("memory").backend, MemorySessionBackend)
+    assert isinstance(create_session_store("sqlite", str(tmp_path / "s.sqlite")).backend, SQLiteSessionBackend)
+    with pytest.raises(ValueError):
+        create_session_store("redis")
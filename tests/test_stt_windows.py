@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from sagents import STT
+from sagents.STT import SAMPLE_RATE, LocalWhisperSTT, iter_audio_windows
+
+
+def _write_wav(path, seconds):
+    """16 kHz mono ramp, so every sample says where it came from."""
+    pcm = (np.arange(int(seconds * SAMPLE_RATE)) % 30000).astype(np.int16)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+    return pcm.astype(np.float32) / 32768.0
+
+
+@pytest.mark.parametrize("seconds, expected", [
+    (2.5, [(0.0, 2.5)]),                                # shorter than one window
+    (10.0, [(0.0, 4.0), (3.0, 4.0), (6.0, 4.0)]),       # the tail is only overlap: no extra window
+    (11.0, [(0.0, 4.0), (3.0, 4.0), (6.0, 4.0), (9.0, 2.0)]),
+])
+def test_windows_overlap_and_cover_the_audio(tmp_path, seconds, expected):
+    pytest.importorskip("av")  # optional, see requirements-stt-local.txt
+    pcm = _write_wav(tmp_path / "call.wav", seconds)
+    windows = list(iter_audio_windows(str(tmp_path / "call.wav"), window_seconds=4, overlap_seconds=1))
+
+    assert [(start, len(samples) / SAMPLE_RATE) for start, samples, _ in windows] == expected
+    assert [is_last for _, _, is_last in windows] == [False] * (len(expected) - 1) + [True]
+    for start, samples, _ in windows:
+        first = int(start * SAMPLE_RATE)
+        np.testing.assert_array_equal(samples, pcm[first:first + len(samples)])
+
+
+class FakeWhisper:
+    """Transcribes each window as the one-second words of a 60 s recording that fall inside it."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def transcribe(self, samples, initial_prompt=None, **kwargs):
+        self.prompts.append(initial_prompt)
+        start, length = self.window_start, len(samples) / SAMPLE_RATE
+        words = [SimpleNamespace(start=w - start, end=w + 1 - start, text=f" w{w}")
+                 for w in range(60) if start <= w and w + 1 <= start + length]
+        return iter(words), None
+
+
+def test_overlapping_windows_are_not_transcribed_twice(monkeypatch):
+    windows = [(0.0, 30.0, False), (28.0, 30.0, False), (56.0, 4.0, True)]  # 2 s overlap, as by default
+    model = FakeWhisper()
+
+    def fake_windows(source):
+        for start, seconds, is_last in windows:
+            model.window_start = start
+            yield start, np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32), is_last
+
+    monkeypatch.setattr(STT, "iter_audio_windows", fake_windows)
+    monkeypatch.setattr(STT, "STT_OVERLAP_SECONDS", 2.0)
+    stt = object.__new__(LocalWhisperSTT)  # skip loading faster-whisper
+    stt.model = model
+
+    segments = list(stt.iter_segments("call.wav"))
+    assert [s["text"] for s in segments] == [f"w{w}" for w in range(60)]
+    assert [s["start"] for s in segments] == [float(w) for w in range(60)]
+    assert model.prompts[0] is None and model.prompts[1].endswith("w28")
+
+
+def test_abandoned_stream_waits_for_its_thread():
+    release = threading.Event()
+    finished = []
+
+    def blocking_segments():
+        yield {"text": "first"}
+        release.wait(5)  # e.g. blocked reading an upload until the spool is aborted
+        yield {"text": "second"}
+        finished.append(True)
+
+    async def main():
+        received = []
+
+        async def consume():
+            async for segment in STT._iterate_in_thread(blocking_segments):
+                received.append(segment)
+
+        task = asyncio.create_task(consume())
+        while not received:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        asyncio.get_running_loop().call_later(0.2, release.set)
+        await asyncio.gather(task, return_exceptions=True)
+        # by the time the cancelled consumer is done, the thread has stopped touching its source
+        assert release.is_set() and finished == []
+
+    asyncio.run(main())